@@ -23,6 +23,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
     'api.apps.ApiConfig',
@@ -32,13 +33,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.LoadSheddingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -61,6 +66,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+# Serve the read-heavy endpoints with the async views in api.async_views.
+# Only useful under an ASGI server.
+ASYNC_API_VIEWS = os.environ.get('ASYNC_API_VIEWS', 'False') == 'True'
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -76,6 +87,93 @@ DATABASES = {
     }
 }
 
+# Optional read replica: safe requests read from it, see core.routers.
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+# Seconds a client keeps reading from the primary after a write.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+
+# Cache
+# Local memory by default (development and tests), Redis when REDIS_URL is set.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a cached API response lives unless its tags are invalidated.
+CACHE_TTL = int(os.getenv('CACHE_TTL', 300))
+
+# Seconds an expired response may still be served while another request
+# recomputes it.
+CACHE_STALE_TTL = int(os.getenv('CACHE_STALE_TTL', 60))
+
+# Recomputation lock: its lifetime if the holder dies, and how long other
+# requests wait for the result when there is no stale value to serve.
+CACHE_LOCK_TIMEOUT = int(os.getenv('CACHE_LOCK_TIMEOUT', 30))
+CACHE_LOCK_WAIT = float(os.getenv('CACHE_LOCK_WAIT', 5))
+
+
+# Paginated lists: seconds a count is reused for the same filters, and the
+# table size from which unfiltered PostgreSQL counts are estimated.
+COUNT_CACHE_TTL = int(os.getenv('COUNT_CACHE_TTL', 30))
+COUNT_ESTIMATE_THRESHOLD = int(os.getenv('COUNT_ESTIMATE_THRESHOLD', 100000))
+
+# /api/stats/: seconds a response is cached and the longest period it
+# covers, in days.
+STATS_CACHE_TTL = int(os.getenv('STATS_CACHE_TTL', 60))
+STATS_MAX_DAYS = int(os.getenv('STATS_MAX_DAYS', 366))
+
+# Delta sync: changes per /api/sync/ response, and days deleted objects
+# stay in the change log (clients away longer must sync from scratch).
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', 500))
+CHANGELOG_RETENTION_DAYS = int(os.getenv('CHANGELOG_RETENTION_DAYS', 30))
+
+
+# /api/batch/: sub-requests per batch and threads for parallel batches.
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 20))
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', 4))
+
+
+# Seconds between stack samples of a profiled request (see
+# core.middleware.ProfilingMiddleware).
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))
+
+
+# Background jobs (core.jobs): worker threads per run_workers, seconds
+# between polls of an empty queue, base retry delay, seconds before a
+# running job counts as abandoned, and days finished jobs are kept.
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1))
+JOB_RETRY_DELAY = int(os.getenv('JOB_RETRY_DELAY', 10))
+JOB_TIMEOUT = int(os.getenv('JOB_TIMEOUT', 600))
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', 7))
+JOB_RUN_INLINE = os.getenv('JOB_RUN_INLINE', 'False') == 'True'
+
+# Rows deleted per transaction when a hidden user or recipe is purged
+# (recipes.purge).
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', 500))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -119,15 +217,59 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Seconds a recipe image file is protected from deletion after it was
+# written or deduplicated, so uncommitted recipes never lose their image.
+MEDIA_GC_GRACE = int(os.getenv('MEDIA_GC_GRACE', 3600))
+
+# Query budgets of expensive views, keyed by 'ViewClass.action': at most
+# ``queries`` statements and ``sql_ms`` milliseconds of SQL per request
+# (see core.budgets). QUERY_BUDGET_MODE is 'enforce' (answer 503),
+# 'report' (only log what would be cut off) or 'off'.
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'enforce')
+QUERY_BUDGETS = {
+    'RecipeViewSet.list': {
+        'queries': int(os.getenv('RECIPE_LIST_MAX_QUERIES', 20)),
+        'sql_ms': int(os.getenv('RECIPE_LIST_MAX_SQL_MS', 2000)),
+    },
+    'RecipeViewSet.download_shopping_cart': {
+        'queries': int(os.getenv('SHOPPING_CART_MAX_QUERIES', 10)),
+        'sql_ms': int(os.getenv('SHOPPING_CART_MAX_SQL_MS', 5000)),
+    },
+}
+
+# Token bucket throttles (see api.throttles): requests per minute and
+# burst size. Logins are limited per client address and per account
+# and address.
+THROTTLE_BUCKETS = {
+    'login': (int(os.getenv('LOGIN_RATE', 10)),
+              int(os.getenv('LOGIN_BURST', 5))),
+    'recipe_write': (int(os.getenv('RECIPE_WRITE_RATE', 30)),
+                     int(os.getenv('RECIPE_WRITE_BURST', 10))),
+}
+
+# Load shedding: when a request waited in the proxy and worker queues
+# (X-Request-Start set by nginx) longer than this many milliseconds,
+# writes and logins are refused with 503 so reads keep being served.
+OVERLOAD_QUEUE_MS = int(os.getenv('OVERLOAD_QUEUE_MS', 1000))
+
+# Chunked uploads (/api/uploads/): largest file in bytes, and hours before
+# an unused upload is deleted by gc_media.
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 20 * 1024 * 1024))
+UPLOAD_EXPIRY_HOURS = int(os.getenv('UPLOAD_EXPIRY_HOURS', 24))
+
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CountCachingPagination',
     'PAGE_SIZE': 6,
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',),
+    # Proxies in front of the app (nginx): throttles identify clients by
+    # the address the last proxy saw, not by the X-Forwarded-For the
+    # client sent.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
 }
 
 SIMPLE_JWT = {
@@ -143,3 +285,14 @@ SIMPLE_JWT = {
 }
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Recipe popularity: favorites and cart additions decay with this half-life.
+POPULARITY_HALF_LIFE = timedelta(
+    days=int(os.getenv('POPULARITY_HALF_LIFE_DAYS', 7)))
+POPULARITY_WEIGHTS = {
+    'favoriterecipe': 1.0,
+    'shoppinglist': 0.5,
+}
+
+# Seconds before a worker reloads its similar-recipes index from the database.
+SIMILARITY_INDEX_TTL = int(os.getenv('SIMILARITY_INDEX_TTL', 300))
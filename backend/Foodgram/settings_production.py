@@ -0,0 +1,23 @@
+"""Production profile: ``DJANGO_SETTINGS_MODULE=foodgram.settings_production``.
+
+Keeps database connections open between requests (one per gunicorn
+thread, see ``gunicorn.conf.py``) and checks them before reuse, instead
+of paying a Postgres handshake on every request.
+
+Under ASGI (``ASYNC_API_VIEWS=True``, see ``gunicorn.conf.py``) Django
+runs each request's database work in a fresh executor thread, so a
+connection kept open would be left behind, one per request, until the
+server runs out of them; there connections are closed after every request
+and the handshake is the price of the async views.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import ASYNC_API_VIEWS, DATABASES
+
+DEBUG = False
+
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = int(os.getenv(
+        'DB_CONN_MAX_AGE', 0 if ASYNC_API_VIEWS else 600))
+    database['CONN_HEALTH_CHECKS'] = True
@@ -0,0 +1,28 @@
+"""Test profile: ``DJANGO_SETTINGS_MODULE=foodgram.settings_test``.
+
+Runs the tests on SQLite instead of Postgres. The ``replica`` alias is a
+second SQLite database standing in for the read replica; as in
+``settings``, the test database mirrors ``default``, but through its own
+connection, so tests can tell which alias served each query.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        # A file, not the in-memory default: the concurrency tests write
+        # from several threads, each with its own connection.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_REPLICAS = ['replica']
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -0,0 +1,279 @@
+"""Async implementations of the read-heavy endpoints for ASGI deployments.
+
+Mounted in front of the router when ``ASYNC_API_VIEWS`` is enabled. GET
+requests are served here with the async ORM interface, so a slow client
+or query only parks a coroutine instead of pinning a worker thread; any
+other method is handed to the regular DRF viewset.
+"""
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import exceptions
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from recipes.filters import IngredientFilter, RecipeFilter
+from recipes.models import Ingredient, Recipe, ShoppingCartItem, Tag
+
+from core import cache
+
+from . import catalog, pagination
+from .caching import recipe_detail_tags, recipe_list_tags, subscriptions_tags
+from .pagination import CustomUserPagination
+from .querysets import recipes_for, subscriptions_for
+from .serializers import (
+    CustomUserWithRecipesSerializer,
+    IngredientSerializer,
+    RecipeReadSerializer,
+    TagSerializer
+)
+from .views import (
+    CustomUserViewSet,
+    IngredientViewSet,
+    RecipeViewSet,
+    TagViewSet
+)
+
+jwt_authentication = JWTAuthentication()
+
+RECIPE_LIST = RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+RECIPE_DETAIL = RecipeViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+    'delete': 'destroy'
+})
+TAG_LIST = TagViewSet.as_view({'get': 'list'})
+TAG_DETAIL = TagViewSet.as_view({'get': 'retrieve'})
+INGREDIENT_LIST = IngredientViewSet.as_view({'get': 'list',
+                                             'post': 'create'})
+INGREDIENT_DETAIL = IngredientViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+    'delete': 'destroy'
+})
+SUBSCRIPTIONS = CustomUserViewSet.as_view({'get': 'subscriptions'})
+DOWNLOAD_SHOPPING_CART = RecipeViewSet.as_view(
+    {'get': 'download_shopping_cart'})
+
+
+def json_response(data, **kwargs):
+    return JsonResponse(data, safe=False,
+                        json_dumps_params={'ensure_ascii': False}, **kwargs)
+
+
+def error_response(exc):
+    data = exc.detail
+    if not isinstance(data, dict):
+        data = {'detail': data}
+    response = json_response(data, status=exc.status_code)
+    if exc.status_code == 401:
+        response['WWW-Authenticate'] = (
+            jwt_authentication.authenticate_header(None))
+    return response
+
+
+async def authenticate(request):
+    """Authenticate the JWT of ``request`` and set ``request.user``."""
+    header = jwt_authentication.get_header(request)
+    raw_token = header and jwt_authentication.get_raw_token(header)
+    if not raw_token:
+        raise exceptions.NotAuthenticated()
+    token = jwt_authentication.get_validated_token(raw_token)
+    request.user = await sync_to_async(jwt_authentication.get_user)(token)
+    return request.user
+
+
+async def paginate(request, queryset, page_size):
+    """Return one ``PageNumberPagination``-shaped page of ``queryset``."""
+    count, estimated = await sync_to_async(pagination.count)(queryset)
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        raise exceptions.NotFound('Invalid page.')
+    if page < 1 or page > max(1, math.ceil(count / page_size)):
+        raise exceptions.NotFound('Invalid page.')
+
+    start = (page - 1) * page_size
+    items = [item async for item in queryset[start:start + page_size]]
+    url = request.build_absolute_uri()
+    next_url = (replace_query_param(url, 'page', page + 1)
+                if start + page_size < count else None)
+    previous_url = None
+    if page == 2:
+        previous_url = remove_query_param(url, 'page')
+    elif page > 2:
+        previous_url = replace_query_param(url, 'page', page - 1)
+    return count, estimated, next_url, previous_url, items
+
+
+def page_data(count, estimated, next_url, previous_url, results):
+    return {'count': count, 'count_is_estimated': estimated,
+            'next': next_url, 'previous': previous_url, 'results': results}
+
+
+async def cached_json(request, tags, compute):
+    """Serve ``compute()`` through the tagged response cache."""
+    data = await cache.aget_or_set(cache.request_key(request), tags, compute)
+    return json_response(data)
+
+
+def filter_queryset(filterset_class, request, queryset):
+    filterset = filterset_class(request.GET, queryset=queryset,
+                                request=request)
+    if not filterset.is_valid():
+        raise exceptions.ValidationError(filterset.errors)
+    return filterset.qs
+
+
+def read_view(fallback, streaming=False):
+    """Serve GET with the wrapped coroutine and anything else with DRF.
+
+    A ``streaming`` view reads the database after it has returned, out of
+    reach of the request's query budget, so budgeted requests to it are
+    served by DRF as well.
+    """
+    def decorator(view):
+        async def wrapper(request, *args, **kwargs):
+            # Profiled requests run synchronously, in the sampled thread.
+            budgeted = streaming and hasattr(request, 'query_budget')
+            if (request.method != 'GET'
+                    or getattr(request, 'profiling', False) or budgeted):
+                return await sync_to_async(fallback)(request, *args,
+                                                     **kwargs)
+            try:
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return error_response(exc)
+        wrapper.csrf_exempt = True
+        wrapper.sync_view = fallback
+        return wrapper
+    return decorator
+
+
+@read_view(RECIPE_LIST)
+async def recipe_list(request):
+    if request.GET.get('pagination') == 'keyset':
+        return await sync_to_async(RECIPE_LIST)(request)
+    user = await authenticate(request)
+
+    async def compute():
+        queryset = await sync_to_async(filter_queryset)(
+            RecipeFilter, request,
+            recipes_for(user, Recipe.objects.order_by('-pub_date', '-id'))
+        )
+        count, estimated, next_url, previous_url, recipes = await paginate(
+            request, queryset, settings.REST_FRAMEWORK['PAGE_SIZE'])
+        serializer = RecipeReadSerializer(recipes, many=True,
+                                          context={'request': request})
+        return page_data(count, estimated, next_url, previous_url,
+                         serializer.data)
+
+    return await cached_json(request, recipe_list_tags(None, request),
+                             compute)
+
+
+@read_view(RECIPE_DETAIL)
+async def recipe_detail(request, pk):
+    user = await authenticate(request)
+
+    async def compute():
+        recipe = await recipes_for(user).filter(pk=pk).afirst()
+        if recipe is None:
+            raise exceptions.NotFound()
+        return RecipeReadSerializer(recipe,
+                                    context={'request': request}).data
+
+    return await cached_json(request,
+                             recipe_detail_tags(None, request, pk=pk),
+                             compute)
+
+
+@read_view(DOWNLOAD_SHOPPING_CART, streaming=True)
+async def download_shopping_cart(request):
+    user = await authenticate(request)
+    items = (
+        ShoppingCartItem.objects.filter(user=user)
+        .select_related('ingredient')
+        .only('amount', 'ingredient__name', 'ingredient__measurement_unit')
+        .order_by('ingredient__name')
+    )
+
+    async def lines():
+        separator = ''
+        async for item in items.aiterator(chunk_size=500):
+            ingredient = item.ingredient
+            yield (f"{separator}{ingredient.name} "
+                   f"({ingredient.measurement_unit}) — {item.amount}")
+            separator = '\n'
+
+    response = StreamingHttpResponse(lines(), content_type='text/plain')
+    response['Content-Disposition'] = (
+        'attachment; filename="shopping_list.txt"'
+    )
+    return response
+
+
+@read_view(TAG_LIST)
+async def tag_list(request):
+    return json_response(await sync_to_async(catalog.tags)())
+
+
+@read_view(TAG_DETAIL)
+async def tag_detail(request, pk):
+    tag = await Tag.objects.filter(pk=pk).afirst()
+    if tag is None:
+        raise exceptions.NotFound()
+    return json_response(TagSerializer(tag).data)
+
+
+@read_view(INGREDIENT_LIST)
+async def ingredient_list(request):
+    if not request.GET:
+        return json_response(
+            await sync_to_async(catalog.ingredients)())
+    queryset = await sync_to_async(filter_queryset)(
+        IngredientFilter, request, Ingredient.objects.all())
+    ingredients = [ingredient async for ingredient in queryset]
+    return json_response(IngredientSerializer(ingredients, many=True).data)
+
+
+@read_view(INGREDIENT_DETAIL)
+async def ingredient_detail(request, pk):
+    ingredient = await Ingredient.objects.filter(pk=pk).afirst()
+    if ingredient is None:
+        raise exceptions.NotFound()
+    return json_response(IngredientSerializer(ingredient).data)
+
+
+@read_view(SUBSCRIPTIONS)
+async def subscriptions(request):
+    user = await authenticate(request)
+    recipes_limit = request.GET.get('recipes_limit')
+    if recipes_limit:
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            raise exceptions.ValidationError(
+                {'error': 'Invalid recipes_limit value'})
+
+    paginator = CustomUserPagination()
+    page_size = paginator.page_size
+    try:
+        page_size = min(int(request.GET[paginator.page_size_query_param]),
+                        paginator.max_page_size)
+    except (KeyError, ValueError):
+        pass
+
+    async def compute():
+        count, estimated, next_url, previous_url, page = await paginate(
+            request, subscriptions_for(user), page_size)
+        serializer = CustomUserWithRecipesSerializer(
+            [subscription.author for subscription in page],
+            many=True,
+            context={'request': request, 'recipes_limit': recipes_limit}
+        )
+        return page_data(count, estimated, next_url, previous_url,
+                         serializer.data)
+
+    return await cached_json(request, subscriptions_tags(None, request),
+                             compute)
@@ -0,0 +1,52 @@
+"""Dependency tags of the cached API responses.
+
+``recipes`` covers every recipe list, ``recipe:{id}`` a single recipe,
+``users`` any change to a user profile shown inside recipes, the catalog
+tags the tag and ingredient lists, and the ``user:{id}:...`` tags the
+per-user flags (favorites, cart, subscriptions) embedded in responses.
+``table:{name}`` changes with any row written to the table (cached counts).
+``stats`` is only dropped when the rollups are rebuilt; otherwise the
+statistics simply expire.
+"""
+CATALOG_TAGS = 'catalog:tags'
+CATALOG_INGREDIENTS = 'catalog:ingredients'
+RECIPES = 'recipes'
+USERS = 'users'
+STATS = 'stats'
+
+
+def recipe_tag(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def user_tag(user_id, relation):
+    return f'user:{user_id}:{relation}'
+
+
+def table_tag(table):
+    return f'table:{table}'
+
+
+def user_flags(user):
+    if not user.is_authenticated:
+        return []
+    return [user_tag(user.id, relation)
+            for relation in ('favorites', 'cart', 'subscriptions')]
+
+
+def recipe_list_tags(view, request, **kwargs):
+    return [RECIPES, USERS, CATALOG_TAGS, CATALOG_INGREDIENTS,
+            *user_flags(request.user)]
+
+
+def recipe_detail_tags(view, request, pk=None, **kwargs):
+    return [recipe_tag(pk), USERS, CATALOG_TAGS, CATALOG_INGREDIENTS,
+            *user_flags(request.user)]
+
+
+def subscriptions_tags(view, request, **kwargs):
+    return recipe_list_tags(view, request)
+
+
+def stats_tags(view, request, **kwargs):
+    return [STATS]
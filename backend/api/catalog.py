@@ -0,0 +1,35 @@
+"""Cached serialized tag and ingredient catalogs.
+
+Both lists are small, read on nearly every page and rarely change, so the
+full serialized lists are cached under the catalog tags, which are bumped
+whenever a tag or ingredient is saved or deleted (see ``api.signals``).
+The entries still expire after ``CACHE_TTL`` like other cached responses:
+with the per-process local memory cache a bump reaches only the worker
+that made the change, and the expiry bounds how stale the others get.
+"""
+from core import cache
+
+from recipes.models import Ingredient, Tag
+
+from .caching import CATALOG_INGREDIENTS, CATALOG_TAGS
+from .serializers import IngredientSerializer, TagSerializer
+
+
+def tags():
+    return cache.get_or_set(
+        'catalog:tags', [CATALOG_TAGS],
+        lambda: list(TagSerializer(Tag.objects.all(), many=True).data)
+    )
+
+
+def ingredients():
+    return cache.get_or_set(
+        'catalog:ingredients', [CATALOG_INGREDIENTS],
+        lambda: list(IngredientSerializer(Ingredient.objects.all(),
+                                          many=True).data)
+    )
+
+
+def warm():
+    tags()
+    ingredients()
@@ -1,7 +1,257 @@
-from rest_framework.pagination import PageNumberPagination
+"""Page number pagination with cached and estimated counts.
 
+Counting a filtered queryset costs a full scan of the matching rows on
+every page, so counts are cached per query (the SQL of the filtered
+queryset) for ``COUNT_CACHE_TTL`` seconds, tagged with the tables the
+query reads so that writes to them drop the count at once. Unfiltered
+PostgreSQL tables of at least ``COUNT_ESTIMATE_THRESHOLD`` rows are not
+counted at all: the planner's ``pg_class.reltuples`` estimate is used
+instead and responses say so in ``count_is_estimated``. Filtering out
+``is_hidden`` rows does not count as filtering here: hidden rows are few
+and purged shortly, well within the error of the estimate.
+"""
+import hashlib
+import json
+import re
+from base64 import b64decode, b64encode
 
-class CustomUserPagination(PageNumberPagination):
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.db import connections
+from django.db.models import F, Field, Func, Q, QuerySet, Value
+from django.db.models.lookups import Exact
+from django.db.models.sql.where import AND, WhereNode
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from core import cache
+
+from .caching import table_tag
+
+TABLES = re.compile(r'(?:FROM|JOIN)\s+"([^"]+)"')
+
+
+def _hides_only(where):
+    """Whether ``where`` only drops rows that are ``is_hidden``."""
+    if where.negated or where.connector != AND:
+        return False
+    for child in where.children:
+        if isinstance(child, WhereNode):
+            if not _hides_only(child):
+                return False
+        elif not (isinstance(child, Exact) and child.rhs is False
+                  and getattr(child.lhs, 'target', None) is not None
+                  and child.lhs.target.name == 'is_hidden'):
+            return False
+    return True
+
+
+def _estimate(queryset):
+    query = queryset.query
+    connection = connections[queryset.db]
+    if (connection.vendor != 'postgresql' or not _hides_only(query.where)
+            or query.distinct or query.combinator or query.is_sliced):
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class '
+                       'WHERE oid = %s::regclass',
+                       [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    # reltuples is -1 for a table that has never been analyzed.
+    if row is None or row[0] < settings.COUNT_ESTIMATE_THRESHOLD:
+        return None
+    return int(row[0])
+
+
+def count(queryset):
+    """``(count, is_estimated)`` for ``queryset``."""
+    estimate = _estimate(queryset)
+    if estimate is not None:
+        return estimate, True
+    try:
+        sql, params = (queryset.order_by().values('pk').query
+                       .sql_with_params())
+    except EmptyResultSet:
+        return 0, False
+    signature = repr((queryset.db, sql, params)).encode()
+    key = f'count:{hashlib.sha256(signature).hexdigest()}'
+    tags = [table_tag(table) for table in sorted(set(TABLES.findall(sql)))]
+    total = cache.get(key, tags)
+    if total is None:
+        total = queryset.count()
+        cache.set(key, total, tags, settings.COUNT_CACHE_TTL)
+    return total, False
+
+
+class CountCachingPaginator(Paginator):
+    count_is_estimated = False
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        total, self.count_is_estimated = count(self.object_list)
+        return total
+
+
+class CountCachingPagination(PageNumberPagination):
+    django_paginator_class = CountCachingPaginator
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_is_estimated': self.page.paginator.count_is_estimated,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_estimated'] = {
+            'type': 'boolean',
+            'example': False,
+        }
+        return response_schema
+
+
+class CustomUserPagination(CountCachingPagination):
     page_size = 6
     page_size_query_param = 'limit'
     max_page_size = 1000
+
+
+class UserKeysetPagination(CursorPagination):
+    """Keyset pages over usernames: no count, constant cost at any depth."""
+    ordering = 'username'
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+
+
+class RowValue(Func):
+    """``(a, b, ...)``: compared element by element, as SQL does."""
+    template = '(%(expressions)s)'
+    output_field = Field()
+
+
+class RecipeKeysetPagination(CursorPagination):
+    """Keyset pages in the order the recipe filters sorted by.
+
+    DRF's cursor keeps the first sort key only and steps over rows that
+    tie on it with an OFFSET, so a page deep into a column of equal
+    cooking times costs as much as page numbers do. Here the cursor
+    holds the whole sort key of the row it points at, ``id`` included,
+    and the next page is the rows past it: one row-value comparison when
+    all the keys sort the same way, or the expanded ``a > x OR (a = x
+    AND b < y) ...`` when the directions are mixed.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(queryset.query.order_by) or ['-pub_date']
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = [
+            queryset.model._meta.get_field(key.lstrip('-'))
+            if key.lstrip('-') != 'pk' else queryset.model._meta.pk
+            for key in self.ordering
+        ]
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = self.ordering
+        if reverse:
+            ordering = [key[1:] if key.startswith('-') else f'-{key}'
+                        for key in ordering]
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = self.after(queryset, ordering, self.cursor.position)
+        rows = list(queryset[:self.page_size + 1])
+        more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, more
+        else:
+            self.has_next, self.has_previous = more, self.cursor is not None
+        return self.page
+
+    def after(self, queryset, ordering, values):
+        """Rows of ``queryset`` that sort after the key ``values``."""
+        names = [key.lstrip('-') for key in ordering]
+        values = [Value(value, output_field=field)
+                  for value, field in zip(values, self.fields)]
+        descending = [key.startswith('-') for key in ordering]
+        if len(set(descending)) == 1:
+            lookup = 'lt' if descending[0] else 'gt'
+            return queryset.alias(
+                keyset=RowValue(*map(F, names)),
+            ).filter(**{f'keyset__{lookup}': RowValue(*values)})
+        condition = Q()
+        for index, name in enumerate(names):
+            lookup = 'lt' if descending[index] else 'gt'
+            condition |= Q(**{f'{name}__{lookup}': values[index]},
+                           **dict(zip(names[:index], values)))
+        return queryset.filter(condition)
+
+    def position(self, row):
+        return [field.value_from_object(row) for field in self.fields]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii')))
+            if (cursor['o'] != list(self.ordering)
+                    or len(cursor['v']) != len(self.fields)):
+                raise ValueError
+            position = [field.to_python(value)
+                        for value, field in zip(cursor['v'], self.fields)]
+            return Cursor(offset=0, reverse=bool(cursor['r']),
+                          position=position)
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        # str() and not DjangoJSONEncoder, which cuts datetimes down to
+        # milliseconds: the row at the cursor would sort after it.
+        data = json.dumps({'o': self.ordering, 'r': int(cursor.reverse),
+                           'v': cursor.position}, default=str)
+        encoded = b64encode(data.encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Stepped back past the first row: start over from the top.
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=self.position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return self.encode_cursor(Cursor(
+                offset=0, reverse=True, position=self.cursor.position))
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True, position=self.position(self.page[0])))
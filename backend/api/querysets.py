@@ -0,0 +1,56 @@
+"""Querysets that carry everything the read serializers need.
+
+Relations are prefetched and per-user flags are annotated with ``Exists``,
+so serializing a page costs a fixed number of queries and never touches
+the database lazily (which also makes it safe in async views). Hidden
+users and recipes (deleted, see ``recipes.purge``) are left out.
+"""
+from django.db.models import BooleanField, Count, Exists, OuterRef, Prefetch
+from django.db.models import Q, Value
+
+from recipes.models import FavoriteRecipe, Recipe, RecipeIngredient
+from recipes.models import ShoppingList
+from users.models import CustomUser, Subscription
+
+
+def _flag(model, user, **lookups):
+    if not user.is_authenticated:
+        return Value(False, output_field=BooleanField())
+    return Exists(model.objects.filter(user=user, **lookups))
+
+
+def recipes_for(user, queryset=None):
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    queryset = queryset.filter(is_hidden=False, author__is_hidden=False)
+    return queryset.select_related('author').prefetch_related(
+        'tags',
+        Prefetch('recipe_ingredients',
+                 queryset=RecipeIngredient.objects.select_related(
+                     'ingredient')),
+    ).annotate(
+        favorited=_flag(FavoriteRecipe, user, recipe=OuterRef('pk')),
+        in_shopping_cart=_flag(ShoppingList, user, recipe=OuterRef('pk')),
+        author_subscribed=_flag(Subscription, user,
+                                author=OuterRef('author')),
+    )
+
+
+def users_for(user, queryset=None):
+    if queryset is None:
+        queryset = CustomUser.objects.all()
+    return queryset.filter(is_hidden=False).annotate(
+        subscribed=_flag(Subscription, user, author=OuterRef('pk')),
+    )
+
+
+def subscriptions_for(user):
+    authors = CustomUser.objects.annotate(
+        recipes_count=Count('recipes', filter=Q(recipes__is_hidden=False)),
+        subscribed=Value(True, output_field=BooleanField()),
+    ).prefetch_related(
+        Prefetch('recipes', queryset=recipes_for(user))
+    )
+    return Subscription.objects.filter(
+        user=user, author__is_hidden=False).order_by('id') \
+        .prefetch_related(Prefetch('author', queryset=authors))
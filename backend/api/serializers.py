@@ -1,12 +1,21 @@
+import re
+
 from rest_framework.relations import PrimaryKeyRelatedField
 from rest_framework.fields import IntegerField
 from rest_framework import serializers
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
 
+from core import uploads
+from core.models import Upload
 from recipes.models import (
     FavoriteRecipe, Ingredient, Recipe,
     RecipeIngredient, ShoppingList, Tag
 )
+from core.jobs import enqueue_on_commit
+from recipes import rollups
+from recipes.tasks import update_similarity
 from recipes.utils import decode_image
 from users.models import CustomUser, Subscription
 
@@ -20,6 +29,8 @@ class CustomUserSerializer(serializers.ModelSerializer):
                   'first_name', 'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         user = self.context['request'].user
         if user.is_authenticated:
             subscription_exists = Subscription.objects.filter(
@@ -96,7 +107,14 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'author', 'name', 'image', 'text', 'cooking_time',
                   'tags', 'ingredients', 'is_favorited', 'is_in_shopping_cart')
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_subscribed'):
+            instance.author.subscribed = instance.author_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'favorited'):
+            return obj.favorited
         user = self.context['request'].user
         if user.is_authenticated:
             return FavoriteRecipe.objects.filter(user=user,
@@ -104,6 +122,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'in_shopping_cart'):
+            return obj.in_shopping_cart
         user = self.context['request'].user
         if user.is_authenticated:
             return ShoppingList.objects.filter(user=user, recipe=obj).exists()
@@ -118,6 +138,11 @@ class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
+# An ``image`` value that refers to a finished upload (see ``core.uploads``)
+# instead of carrying a base64 data URI.
+UPLOAD_PREFIX = 'upload:'
+
+
 class RecipeWriteSerializer(serializers.ModelSerializer):
     tags = PrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
     author = CustomUserSerializer(read_only=True)
@@ -131,19 +156,48 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
     def to_internal_value(self, data):
         image = data.get('image')
-        if image:
+        if isinstance(image, str) and image.startswith(UPLOAD_PREFIX):
+            data['image'] = self.uploaded_image(image[len(UPLOAD_PREFIX):])
+        elif image:
             data['image'] = decode_image(image, data.get('name'))
         return super().to_internal_value(data)
 
+    def uploaded_image(self, token):
+        try:
+            self.upload = Upload.objects.get(
+                token=token, user=self.context['request'].user,
+                completed_at__isnull=False)
+            return uploads.read_file(self.upload)
+        except (Upload.DoesNotExist, DjangoValidationError,
+                FileNotFoundError):
+            raise serializers.ValidationError(
+                {'image': ['Unknown or unfinished upload.']})
+
+    def save(self, **kwargs):
+        # The upload's part file is open only while the image is stored.
+        if getattr(self, 'upload', None) is None:
+            return super().save(**kwargs)
+        with self.validated_data['image'].open():
+            return super().save(**kwargs)
+
+    def discard_upload(self):
+        upload = getattr(self, 'upload', None)
+        if upload is not None:
+            transaction.on_commit(lambda: uploads.discard(upload))
+
     @transaction.atomic
     def create_ingredients_amounts(self, ingredients, recipe):
-        RecipeIngredient.objects.bulk_create(
+        recipe_ingredients = RecipeIngredient.objects.bulk_create(
             [RecipeIngredient(
                 ingredient=Ingredient.objects.get(id=ingredient['id']),
                 recipe=recipe,
                 amount=ingredient['amount']
             ) for ingredient in ingredients]
         )
+        # bulk_create sends no post_save for the rollup receivers.
+        rollups.record_uses(
+            RecipeIngredient, recipe.id,
+            [item.ingredient_id for item in recipe_ingredients])
 
     @transaction.atomic
     def create(self, validated_data):
@@ -154,6 +208,8 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         recipe.tags.set(tags)
         self.create_ingredients_amounts(recipe=recipe,
                                         ingredients=ingredients)
+        enqueue_on_commit(update_similarity, recipe_id=recipe.id)
+        self.discard_upload()
 
         return recipe
 
@@ -173,6 +229,8 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                     'amount': ingredient_data['amount']
                 }
             )
+        enqueue_on_commit(update_similarity, recipe_id=instance.id)
+        self.discard_upload()
         return instance
 
     def to_representation(self, instance):
@@ -200,6 +258,8 @@ class CustomUserWithRecipesSerializer(CustomUserSerializer):
                                                      'recipes_count')
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_recipes(self, obj):
@@ -209,3 +269,31 @@ class CustomUserWithRecipesSerializer(CustomUserSerializer):
                                         many=True, context=self.context).data
         return RecipeReadSerializer(obj.recipes.all(), many=True,
                                     context=self.context).data
+
+
+class UploadSerializer(serializers.ModelSerializer):
+    complete = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Upload
+        fields = ('token', 'name', 'size', 'checksum', 'offset', 'complete')
+        read_only_fields = ('token', 'offset')
+
+    def get_complete(self, obj):
+        return obj.completed_at is not None
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Size must be between 1 and {settings.UPLOAD_MAX_SIZE} '
+                f'bytes.')
+        return value
+
+    def validate_checksum(self, value):
+        if not re.fullmatch(r'[0-9a-fA-F]{64}', value):
+            raise serializers.ValidationError(
+                'Checksum must be a hex SHA-256 digest.')
+        return value.lower()
+
+    def create(self, validated_data):
+        return uploads.create(self.context['request'].user, **validated_data)
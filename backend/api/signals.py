@@ -0,0 +1,212 @@
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save
+)
+from django.dispatch import receiver
+
+from core import changelog
+from core.cache import invalidate_on_commit
+from core.models import ChangeLog
+from recipes.models import (
+    FavoriteRecipe, Ingredient, Recipe, RecipeIngredient, RecipeTag,
+    ShoppingList, Tag
+)
+from users.models import CustomUser, Subscription
+
+from .caching import (
+    CATALOG_INGREDIENTS, CATALOG_TAGS, RECIPES, USERS, recipe_tag, table_tag,
+    user_tag
+)
+
+
+# Tables that cached responses read (the counts cached by
+# ``api.pagination`` are tagged with every table their query names).
+# Writes to any other table, such as jobs, the change log or the
+# rollups, leave the caches alone.
+CACHED_TABLE_MODELS = (
+    Recipe, RecipeTag, RecipeIngredient, Tag, Ingredient, CustomUser,
+    Subscription, FavoriteRecipe, ShoppingList,
+)
+
+
+def table_changed(sender, **kwargs):
+    invalidate_on_commit(table_tag(sender._meta.db_table))
+
+
+for model in CACHED_TABLE_MODELS:
+    post_save.connect(table_changed, sender=model)
+    post_delete.connect(table_changed, sender=model)
+
+
+@receiver(m2m_changed, sender=RecipeIngredient)
+@receiver(m2m_changed, sender=RecipeTag)
+def through_table_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_on_commit(table_tag(sender._meta.db_table))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    invalidate_on_commit(CATALOG_TAGS)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    invalidate_on_commit(CATALOG_INGREDIENTS)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate_on_commit(RECIPES, recipe_tag(instance.id))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+def recipe_part_changed(sender, instance, **kwargs):
+    invalidate_on_commit(RECIPES, recipe_tag(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=RecipeIngredient)
+@receiver(m2m_changed, sender=RecipeTag)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        recipe_ids = [instance.id]
+    else:
+        recipe_ids = pk_set or []
+    invalidate_on_commit(RECIPES, *map(recipe_tag, recipe_ids))
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+def favorite_changed(sender, instance, **kwargs):
+    invalidate_on_commit(user_tag(instance.user_id, 'favorites'))
+
+
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_delete, sender=ShoppingList)
+def shopping_list_changed(sender, instance, **kwargs):
+    invalidate_on_commit(user_tag(instance.user_id, 'cart'))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def subscription_changed(sender, instance, **kwargs):
+    invalidate_on_commit(user_tag(instance.user_id, 'subscriptions'))
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_on_commit(USERS)
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_on_commit(USERS, RECIPES)
+
+
+# Delta sync change log (see ``core.changelog``). Recipes embed their
+# author, tags and ingredients, so changes to those are recorded against
+# every recipe that shows them.
+
+@receiver(post_save, sender=Recipe)
+def log_recipe_saved(sender, instance, **kwargs):
+    changelog.record(ChangeLog.RECIPE, [instance.id])
+
+
+@receiver(post_delete, sender=Recipe)
+def log_recipe_deleted(sender, instance, **kwargs):
+    changelog.record(ChangeLog.RECIPE, [instance.id], deleted=True)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+def log_recipe_part_changed(sender, instance, **kwargs):
+    changelog.record(ChangeLog.RECIPE, [instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=RecipeIngredient)
+@receiver(m2m_changed, sender=RecipeTag)
+def log_recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    if not action.startswith('post_'):
+        return
+    recipe_ids = (pk_set or []) if reverse else [instance.id]
+    changelog.record(ChangeLog.RECIPE, recipe_ids)
+
+
+@receiver(post_save, sender=Tag)
+def log_tag_saved(sender, instance, created, **kwargs):
+    changelog.record(ChangeLog.TAG, [instance.id])
+    if not created:
+        changelog.record(ChangeLog.RECIPE, RecipeTag.objects.filter(
+            tag=instance).values_list('recipe_id', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def log_tag_deleted(sender, instance, **kwargs):
+    changelog.record(ChangeLog.TAG, [instance.id], deleted=True)
+
+
+@receiver(post_save, sender=Ingredient)
+def log_ingredient_saved(sender, instance, created, **kwargs):
+    changelog.record(ChangeLog.INGREDIENT, [instance.id])
+    if not created:
+        changelog.record(ChangeLog.RECIPE, RecipeIngredient.objects.filter(
+            ingredient=instance).values_list('recipe_id', flat=True))
+
+
+@receiver(post_delete, sender=Ingredient)
+def log_ingredient_deleted(sender, instance, **kwargs):
+    changelog.record(ChangeLog.INGREDIENT, [instance.id], deleted=True)
+
+
+# Recipes also embed the requesting user's flags: is_favorited,
+# is_in_shopping_cart and the author's is_subscribed. Logging the recipes
+# a toggle affects makes the user's next sync fetch them with new flags.
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_delete, sender=ShoppingList)
+def log_recipe_flag_changed(sender, instance, **kwargs):
+    changelog.record(ChangeLog.RECIPE, [instance.recipe_id])
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def log_subscription_changed(sender, instance, **kwargs):
+    changelog.record(ChangeLog.RECIPE, Recipe.objects.filter(
+        author_id=instance.author_id).values_list('id', flat=True))
+
+
+AUTHOR_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=CustomUser)
+def author_changing(sender, instance, **kwargs):
+    instance._previous_profile = None
+    if instance.pk is not None:
+        instance._previous_profile = (
+            CustomUser.objects.filter(pk=instance.pk)
+            .values_list(*AUTHOR_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=CustomUser)
+def log_author_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_profile', None)
+    profile = tuple(getattr(instance, field) for field in AUTHOR_FIELDS)
+    if created or previous is None or previous == profile:
+        return
+    changelog.record(ChangeLog.RECIPE, Recipe.objects.filter(
+        author=instance).values_list('id', flat=True))
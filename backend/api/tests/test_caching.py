@@ -0,0 +1,48 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.caching import table_tag
+from core.models import Job
+from recipes.models import (
+    FavoriteRecipe, ImportProgress, IngredientUsage, Recipe
+)
+from users.models import CustomUser
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class TableTagTests(TestCase):
+    """Writes drop the cached counts of the tables they change only."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            username='cook', email='cook@example.com', password='secret')
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Soup', image='recipes/soup.png',
+            text='Boil.', cooking_time=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def favorites_count(self):
+        return self.client.get('/api/recipes/?is_favorited=1').data['count']
+
+    def test_cached_count_follows_writes(self):
+        self.assertEqual(self.favorites_count(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            FavoriteRecipe.objects.add(self.user.id, self.recipe.id)
+        self.assertEqual(self.favorites_count(), 1)
+
+    def test_other_tables_invalidate_nothing(self):
+        with mock.patch('api.signals.invalidate_on_commit') as invalidate:
+            Job.objects.create(task='recipes.tasks.update_similarity',
+                               kwargs={})
+            ImportProgress.objects.create(source='recipes.ndjson')
+            IngredientUsage.objects.all().delete()
+            invalidate.assert_not_called()
+
+            FavoriteRecipe.objects.add(self.user.id, self.recipe.id)
+        invalidate.assert_any_call(
+            table_tag(FavoriteRecipe._meta.db_table))
@@ -0,0 +1,88 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import CustomUser
+
+RECIPES = '/api/recipes/'
+ORDERINGS = (
+    None, 'cooking_time', '-cooking_time', 'name', 'popular', '-popular',
+    'pub_date', 'cooking_time,-name', '-cooking_time,name,pub_date',
+)
+
+
+# Reads stay on the default connection, where the queries are captured.
+@override_settings(DATABASE_REPLICAS=[])
+class RecipeKeysetPaginationTests(TestCase):
+    """Keyset pages match page numbers, however many rows tie."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='cook', email='cook@example.com', password='secret')
+        Recipe.objects.bulk_create(
+            Recipe(author=cls.user, name='ab'[i % 2], text='-',
+                   cooking_time=1 + i % 3, popularity=i % 2)
+            for i in range(23)
+        )
+        # Every recipe published at once: the default order is all ties.
+        Recipe.objects.update(pub_date=timezone.now())
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def ids(self, url, follow):
+        ids, queries = [], []
+        while url:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            page = [recipe['id'] for recipe in response.data['results']]
+            ids = page + ids if follow == 'previous' else ids + page
+            queries += [query['sql'] for query in captured]
+            # A cursor that does not move on would loop forever.
+            self.assertLessEqual(len(ids), Recipe.objects.count())
+            url = response.data[follow]
+        return ids, queries
+
+    def test_matches_page_numbers(self):
+        for ordering in ORDERINGS:
+            with self.subTest(ordering=ordering):
+                query = f'?limit=5&ordering={ordering}' if ordering else (
+                    '?limit=5')
+                expected, _ = self.ids(RECIPES + query, 'next')
+                self.assertEqual(len(set(expected)), 23)
+
+                ids, queries = self.ids(
+                    RECIPES + query + '&pagination=keyset', 'next')
+                self.assertEqual(ids, expected)
+                for sql in queries:
+                    self.assertNotIn('OFFSET', sql)
+
+    def test_previous_links(self):
+        for ordering in ORDERINGS:
+            with self.subTest(ordering=ordering):
+                query = f'?limit=5&ordering={ordering}' if ordering else (
+                    '?limit=5')
+                forward, _ = self.ids(RECIPES + query, 'next')
+                url = RECIPES + query + '&pagination=keyset'
+                while True:
+                    data = self.client.get(url).data
+                    if not data['next']:
+                        break
+                    url = data['next']
+                backward, _ = self.ids(url, 'previous')
+                self.assertEqual(backward, forward)
+
+    def test_cursor_of_another_ordering(self):
+        data = self.client.get(
+            RECIPES + '?limit=5&pagination=keyset&ordering=name').data
+        response = self.client.get(data['next'].replace(
+            'ordering=name', 'ordering=cooking_time'))
+        self.assertEqual(response.status_code, 404)
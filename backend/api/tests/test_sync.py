@@ -0,0 +1,62 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import CustomUser
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class SyncFlagsTests(TestCase):
+    """Toggles bring a recipe back into the user's next delta sync."""
+
+    def setUp(self):
+        self.cook, self.reader = [
+            CustomUser.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='secret')
+            for name in ('cook', 'reader')
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe = Recipe.objects.create(
+                author=self.cook, name='Soup', image='recipes/soup.png',
+                text='Boil.', cooking_time=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.cursor = self.sync()['cursor']
+
+    def sync(self):
+        response = self.client.get('/api/sync/',
+                                   {'since': getattr(self, 'cursor', 0)})
+        self.assertEqual(response.status_code, 200)
+        self.cursor = response.data['cursor']
+        return response.data
+
+    def toggle(self, method, path):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(path)
+        self.assertIn(response.status_code, (200, 201, 204))
+
+    def synced_recipe(self):
+        recipes = self.sync()['recipes']
+        self.assertEqual([recipe['id'] for recipe in recipes],
+                         [self.recipe.id])
+        return recipes[0]
+
+    def test_unchanged_recipe_is_not_resent(self):
+        self.assertEqual(self.sync()['recipes'], [])
+
+    def test_favorite_and_cart_flags(self):
+        for action, flag in (('favorite', 'is_favorited'),
+                             ('shopping_cart', 'is_in_shopping_cart')):
+            path = f'/api/recipes/{self.recipe.id}/{action}/'
+            self.toggle('post', path)
+            self.assertTrue(self.synced_recipe()[flag])
+            self.toggle('delete', path)
+            self.assertFalse(self.synced_recipe()[flag])
+
+    def test_subscription_flag(self):
+        path = f'/api/users/{self.cook.id}/subscribe/'
+        self.toggle('post', path)
+        self.assertTrue(self.synced_recipe()['author']['is_subscribed'])
+        self.toggle('delete', path)
+        self.assertFalse(self.synced_recipe()['author']['is_subscribed'])
@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from api.throttles import take
+from users.models import CustomUser
+
+LOGIN = '/api/auth/token/login/'
+
+
+class TakeTests(TestCase):
+    """``take`` with 60 tokens a minute (one a second) and a burst of 3."""
+
+    def setUp(self):
+        cache.clear()
+        self.now = 1000.0
+        patcher = mock.patch('api.throttles.time.time',
+                             side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def take(self):
+        return take('throttle:test:ip:1.2.3.4', 60, 3)
+
+    def test_burst_then_refused(self):
+        self.assertEqual([self.take() for _ in range(3)], [0, 0, 0])
+        self.assertEqual(self.take(), 1.0)
+        # A refused request does not use up a token.
+        self.assertEqual(self.take(), 1.0)
+
+    def test_refill(self):
+        for _ in range(3):
+            self.take()
+        self.now += 0.5
+        self.assertEqual(self.take(), 0.5)
+        self.now += 0.5
+        self.assertEqual(self.take(), 0)
+        self.assertEqual(self.take(), 1.0)
+
+    def test_full_after_idle(self):
+        for _ in range(3):
+            self.take()
+        self.now += 60
+        self.assertEqual([self.take() for _ in range(3)], [0, 0, 0])
+        self.assertGreater(self.take(), 0)
+
+
+@override_settings(THROTTLE_BUCKETS={'login': (10, 5),
+                                     'recipe_write': (30, 10)})
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CustomUser.objects.create_user(
+            username='cook', email='cook@example.com', password='secret')
+
+    def login(self, **headers):
+        return self.client.post(
+            LOGIN, {'email': 'cook@example.com', 'password': 'wrong'},
+            content_type='application/json', headers=headers)
+
+    def test_retry_after(self):
+        statuses = [self.login().status_code for _ in range(6)]
+        self.assertEqual(statuses, [401] * 5 + [429])
+        self.assertEqual(self.login()['Retry-After'], '6')
+
+    def test_spoofed_forwarded_for_does_not_reset_buckets(self):
+        # nginx appends the address it saw to what the client sent.
+        statuses = [
+            self.login(**{'X-Forwarded-For': f'10.0.0.{number}, 127.0.0.1'})
+            .status_code
+            for number in range(20)
+        ]
+        self.assertEqual(statuses, [401] * 5 + [429] * 15)
+
+    def test_other_address_keeps_its_own_buckets(self):
+        for _ in range(6):
+            self.login()
+        response = self.client.post(
+            LOGIN, {'email': 'cook@example.com', 'password': 'secret'},
+            content_type='application/json', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 201)
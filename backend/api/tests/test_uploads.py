@@ -0,0 +1,102 @@
+import base64
+import hashlib
+import os
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core import uploads
+from core.models import Upload
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import CustomUser
+
+# A 1x1 PNG.
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAC'
+    'hwGA60e6kgAAAABJRU5ErkJggg==')
+
+
+@override_settings(DATABASE_REPLICAS=[], JOB_RUN_INLINE=False)
+class UploadedImageTests(TestCase):
+    """``upload:<token>`` images are stored from the part file."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.user = CustomUser.objects.create_user(
+            username='cook', email='cook@example.com', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(name='soup', color='#FF0000',
+                                      slug='soup')
+        self.salt = Ingredient.objects.create(name='salt',
+                                              measurement_unit='g')
+        self.opened = []
+        open_part = uploads.PartFile.open
+
+        def record_open(part, *args, **kwargs):
+            self.opened.append(part)
+            return open_part(part, *args, **kwargs)
+
+        patcher = mock.patch.object(uploads.PartFile, 'open', record_open)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, content):
+        response = self.client.post('/api/uploads/', {
+            'name': 'photo.png', 'size': len(content),
+            'checksum': hashlib.sha256(content).hexdigest(),
+        }, format='json')
+        token = response.data['token']
+        response = self.client.generic(
+            'PATCH', f'/api/uploads/{token}/', content,
+            content_type='application/octet-stream',
+            HTTP_UPLOAD_OFFSET='0')
+        self.assertEqual(response.status_code, 200, response.data)
+        return Upload.objects.get(token=token)
+
+    def create_recipe(self, upload):
+        return self.client.post('/api/recipes/', {
+            'name': 'Soup', 'image': f'upload:{upload.token}',
+            'text': 'Boil.', 'cooking_time': 10, 'tags': [self.tag.id],
+            'ingredients': [{'id': self.salt.id, 'amount': 5}],
+        }, format='json')
+
+    def test_image_is_moved_into_storage(self):
+        upload = self.upload(PNG)
+        inode = os.stat(uploads.part_path(upload)).st_ino
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.create_recipe(upload)
+        self.assertEqual(response.status_code, 201, response.data)
+
+        image = Recipe.objects.get(id=response.data['id']).image
+        with image.open('rb') as file:
+            self.assertEqual(file.read(), PNG)
+        self.assertIn(hashlib.sha256(PNG).hexdigest(), image.name)
+        # Renamed, not copied.
+        self.assertEqual(os.stat(image.path).st_ino, inode)
+        self.assertFalse(os.path.exists(uploads.part_path(upload)))
+        self.assertFalse(Upload.objects.filter(id=upload.id).exists())
+        self.assertTrue(self.opened)
+        self.assertTrue(all(part.closed for part in self.opened))
+
+    def test_invalid_image_is_never_opened(self):
+        upload = self.upload(b'not an image')
+        response = self.create_recipe(upload)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+        self.assertEqual(self.opened, [])
+        self.assertTrue(os.path.exists(uploads.part_path(upload)))
+
+    def test_missing_part_file(self):
+        upload = self.upload(PNG)
+        os.remove(uploads.part_path(upload))
+        response = self.create_recipe(upload)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['image'],
+                         ['Unknown or unfinished upload.'])
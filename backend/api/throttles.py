@@ -0,0 +1,85 @@
+"""Token bucket throttles kept in the shared cache.
+
+A bucket of ``burst`` tokens refills at ``rate`` tokens per minute and
+every request takes one. The state is a single integer per bucket, the
+moment in milliseconds at which the bucket would be full again (the
+"theoretical arrival time" of GCRA), advanced with the cache's atomic
+``incr`` so that all workers share each bucket without locks. Refused
+requests give their token back and get 429 with ``Retry-After``.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+
+def take(key, rate, burst):
+    """Take a token; return 0 or the seconds until one is available."""
+    interval = 60000 // rate
+    capacity = interval * burst
+    timeout = math.ceil(capacity / 1000) + 1
+    now = int(time.time() * 1000)
+    if cache.add(key, now + interval, timeout):
+        return 0
+    try:
+        full_at = cache.incr(key, interval)
+    except ValueError:
+        # The bucket expired (filled up) since ``add``.
+        cache.set(key, now + interval, timeout)
+        return 0
+    if full_at - interval < now:
+        # The bucket was full: restart from now instead of the past.
+        cache.set(key, now + interval, timeout)
+        return 0
+    if full_at - now > capacity:
+        cache.decr(key, interval)
+        return (full_at - now - capacity) / 1000
+    cache.touch(key, timeout)
+    return 0
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle with the ``THROTTLE_BUCKETS[scope]`` buckets of a request."""
+    scope = None
+
+    def get_idents(self, request, view):
+        """Who the request is counted against, e.g. ``['ip:1.2.3.4']``."""
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return [f'user:{user.pk}']
+        return [f'ip:{self.get_ident(request)}']
+
+    def allow_request(self, request, view):
+        rate, burst = settings.THROTTLE_BUCKETS[self.scope]
+        self.delay = 0
+        for ident in self.get_idents(request, view):
+            self.delay = take(f'throttle:{self.scope}:{ident}', rate, burst)
+            if self.delay:
+                return False
+        return True
+
+    def wait(self):
+        return self.delay
+
+
+class LoginThrottle(TokenBucketThrottle):
+    """Bound password checks per client address and per account from it.
+
+    The account bucket is keyed by the address too: keyed by the email
+    alone, anyone could lock an account's owner out by failing logins.
+    """
+    scope = 'login'
+
+    def get_idents(self, request, view):
+        ip = self.get_ident(request)
+        idents = [f'ip:{ip}']
+        email = request.data.get('email')
+        if isinstance(email, str) and email:
+            idents.append(f'account:{email.strip().lower()}:{ip}')
+        return idents
+
+
+class RecipeWriteThrottle(TokenBucketThrottle):
+    scope = 'recipe_write'
@@ -0,0 +1,74 @@
+"""Resumable chunked uploads (see ``core.uploads``).
+
+``POST /api/uploads/`` with ``{"name": "photo.jpg", "size": 1048576,
+"checksum": "<sha256 hex>"}`` starts an upload and returns its token.
+Each ``PATCH /api/uploads/<token>/`` sends the next chunk as the raw
+request body with an ``Upload-Offset`` header; the response carries the
+new offset. ``GET`` reports the offset to resume from after a dropped
+connection and ``DELETE`` abandons the upload. A complete upload is used
+as ``"image": "upload:<token>"`` when creating or updating a recipe.
+"""
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import uploads
+from core.models import Upload
+
+from .serializers import UploadSerializer
+
+OFFSET_HEADER = 'Upload-Offset'
+
+
+def upload_response(upload, status_code=status.HTTP_200_OK):
+    return Response(UploadSerializer(upload).data, status=status_code,
+                    headers={OFFSET_HEADER: str(upload.offset)})
+
+
+class UploadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = UploadSerializer(data=request.data,
+                                      context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        return upload_response(serializer.save(), status.HTTP_201_CREATED)
+
+
+class UploadDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+    # The body is streamed to disk by ``core.uploads``, not parsed.
+    parser_classes = []
+
+    def get_object(self):
+        return get_object_or_404(Upload, token=self.kwargs['token'],
+                                 user=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        return upload_response(self.get_object())
+
+    def patch(self, request, *args, **kwargs):
+        upload = self.get_object()
+        try:
+            offset = int(request.headers[OFFSET_HEADER])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return Response(
+                {'detail': f'{OFFSET_HEADER} and Content-Length headers '
+                           f'are required.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        try:
+            uploads.write(upload, offset, request.stream, length)
+        except uploads.UploadError as error:
+            return Response(
+                {'detail': str(error), 'offset': upload.offset},
+                status=(status.HTTP_409_CONFLICT if error.conflict
+                        else status.HTTP_400_BAD_REQUEST),
+                headers={OFFSET_HEADER: str(upload.offset)})
+        return upload_response(upload)
+
+    def delete(self, request, *args, **kwargs):
+        uploads.discard(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,13 +1,18 @@
+from django.conf import settings
 from django.urls import include, path
 
 from rest_framework.routers import DefaultRouter
 
+from .batch import BatchView
+from .uploads import UploadDetailView, UploadView
 from .views import (
     CustomUserViewSet,
     IngredientViewSet,
     RecipeViewSet,
     TagViewSet,
     CustomTokenObtainPairView,
+    StatsView,
+    SyncView,
     TokenLogoutConfirmationView
 )
 
@@ -23,4 +28,25 @@ urlpatterns = [
          name='custom_token_obtain_pair'),
     path('auth/token/logout/', TokenLogoutConfirmationView.as_view(),
          name='token_logout'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('stats/', StatsView.as_view(), name='stats'),
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('uploads/', UploadView.as_view(), name='uploads'),
+    path('uploads/<uuid:token>/', UploadDetailView.as_view(),
+         name='upload_detail'),
 ]
+
+if settings.ASYNC_API_VIEWS:
+    from . import async_views
+
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list),
+        path('recipes/download_shopping_cart/',
+             async_views.download_shopping_cart),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+        path('tags/', async_views.tag_list),
+        path('tags/<int:pk>/', async_views.tag_detail),
+        path('ingredients/', async_views.ingredient_list),
+        path('ingredients/<int:pk>/', async_views.ingredient_detail),
+        path('users/subscriptions/', async_views.subscriptions),
+    ] + urlpatterns
@@ -1,5 +1,11 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
+from django.db.models import Sum
+from django.http import Http404, HttpResponse
+from django.utils import timezone
 
 from django_filters import rest_framework as filters
 from rest_framework import status, viewsets
@@ -9,8 +15,14 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from core import changelog
+from core.cache import cache_response
+from core.models import ChangeLog
 from users.models import CustomUser, Subscription
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.models import (
+    AuthorFavorites, Ingredient, IngredientUsage, Recipe, RecipeIngredient,
+    ShoppingCartItem, Tag, TagUsage
+)
 from api.serializers import (
     CustomUserCreateSerializer,
     CustomUserSerializer,
@@ -23,20 +35,52 @@ from api.serializers import (
     FavoriteRecipe,
     ShoppingList
 )
+from recipes import purge, similarity
 from recipes.filters import RecipeFilter, IngredientFilter
-from .pagination import CustomUserPagination
+from users.filters import UserFilter
+from . import catalog
+from .caching import (
+    recipe_detail_tags, recipe_list_tags, stats_tags, subscriptions_tags
+)
+from .pagination import (
+    CustomUserPagination, RecipeKeysetPagination, UserKeysetPagination
+)
+from .querysets import recipes_for, subscriptions_for, users_for
+from .throttles import LoginThrottle, RecipeWriteThrottle
+
+
+def parse_pk(pk):
+    try:
+        return int(pk)
+    except (TypeError, ValueError):
+        raise Http404
 
 
 class CustomUserViewSet(viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
     pagination_class = CustomUserPagination
+    filterset_class = UserFilter
+
+    def get_queryset(self):
+        return users_for(self.request.user, super().get_queryset())
+
+    @property
+    def paginator(self):
+        """Page numbers by default; ?pagination=keyset on the user list."""
+        if not hasattr(self, '_paginator'):
+            keyset = (self.action == 'list' and self.request.query_params
+                      .get('pagination') == 'keyset')
+            self._paginator = (UserKeysetPagination() if keyset
+                               else self.pagination_class())
+        return self._paginator
 
     @action(detail=False, methods=['GET'],
             permission_classes=[IsAuthenticated])
     def me(self, request):
-        serializer = CustomUserSerializer(request.user,
-                                          context={'request': request})
+        serializer = CustomUserSerializer(
+            users_for(request.user).get(pk=request.user.pk),
+            context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def create(self, request, *args, **kwargs):
@@ -46,35 +90,36 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         response_data = CustomUserCreateSerializer(user).data
         return Response(response_data, status=status.HTTP_201_CREATED)
 
+    def perform_destroy(self, instance):
+        purge.hide_user(instance)
+
     @action(detail=True, methods=['POST', 'DELETE'], url_path='subscribe',
             permission_classes=[IsAuthenticated])
     def manage_subscription(self, request, pk=None):
+        user = self.request.user
         if request.method == 'POST':
-            user = self.request.user
             author = self.get_object()
 
             if user.id == author.id:
                 return Response({'error': 'Cannot subscribe to yourself'},
                                 status=status.HTTP_400_BAD_REQUEST)
 
-            Subscription.objects.get_or_create(user=user, author=author)
+            Subscription.objects.subscribe(user.id, author.id)
             serializer = CustomUserWithRecipesSerializer(
                 author, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        user = self.request.user
-        author = self.get_object()
-
-        subscription = user.following.filter(author=author)
-        if not subscription.exists():
+        author_id = parse_pk(pk)
+        if not Subscription.objects.unsubscribe(user.id, author_id):
+            if not CustomUser.objects.filter(id=author_id).exists():
+                raise Http404
             return Response({'error': 'Not subscribed'},
                             status=status.HTTP_400_BAD_REQUEST)
-
-        subscription.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['GET'],
             permission_classes=[IsAuthenticated])
+    @cache_response(subscriptions_tags)
     def subscriptions(self, request):
         recipes_limit = request.query_params.get('recipes_limit', None)
         if recipes_limit:
@@ -84,8 +129,7 @@ class CustomUserViewSet(viewsets.ModelViewSet):
                 return Response({'error': 'Invalid recipes_limit value'},
                                 status=status.HTTP_400_BAD_REQUEST)
 
-        subscriptions = (Subscription.objects.filter(user=request.user)
-                         .prefetch_related('author', 'author__recipes'))
+        subscriptions = subscriptions_for(request.user)
         page = self.paginate_queryset(subscriptions)
         if page is not None:
             serializer = CustomUserWithRecipesSerializer(
@@ -129,6 +173,8 @@ class CustomUserViewSet(viewsets.ModelViewSet):
 
 
 class CustomTokenObtainPairView(APIView):
+    throttle_classes = [LoginThrottle]
+
     def post(self, request, *args, **kwargs):
         email = request.data.get('email', None)
         password = request.data.get('password', None)
@@ -139,7 +185,7 @@ class CustomTokenObtainPairView(APIView):
 
         user = get_user_model().objects.filter(email=email).first()
 
-        if user and user.check_password(password):
+        if user and user.is_active and user.check_password(password):
             refresh = RefreshToken.for_user(user)
             return Response({'auth_token': str(refresh.access_token)},
                             status=status.HTTP_201_CREATED)
@@ -155,12 +201,133 @@ class TokenLogoutConfirmationView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class SyncView(APIView):
+    """Recipes, tags and ingredients changed since a cursor.
+
+    ``since`` is the ``cursor`` of the previous response (0 for a first
+    sync). Changed objects are returned in full and deleted ones as ids in
+    ``deleted``; while ``has_more`` is true the client repeats the request
+    with the new cursor. ``reset`` means the cursor predates the retained
+    history: the client drops its copy and applies the response as a fresh
+    sync.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            since = -1
+        if since < 0:
+            return Response({'error': 'Invalid since value'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        reset = since < changelog.horizon()
+        if reset:
+            since = 0
+        entries = changelog.changes_since(since, settings.SYNC_PAGE_SIZE + 1)
+        has_more = len(entries) > settings.SYNC_PAGE_SIZE
+        entries = entries[:settings.SYNC_PAGE_SIZE]
+
+        changed = defaultdict(list)
+        deleted = defaultdict(list)
+        for entry in entries:
+            ids = deleted if entry.deleted else changed
+            ids[entry.model].append(entry.object_id)
+
+        context = {'request': request}
+        recipes = recipes_for(request.user).filter(
+            id__in=changed[ChangeLog.RECIPE])
+        tags = Tag.objects.filter(id__in=changed[ChangeLog.TAG])
+        ingredients = Ingredient.objects.filter(
+            id__in=changed[ChangeLog.INGREDIENT])
+        data = {
+            'cursor': entries[-1].id if entries else since,
+            'has_more': has_more,
+            'reset': reset,
+        }
+        for name, model, queryset, serializer_class in (
+            ('recipes', ChangeLog.RECIPE, recipes, RecipeReadSerializer),
+            ('tags', ChangeLog.TAG, tags, TagSerializer),
+            ('ingredients', ChangeLog.INGREDIENT, ingredients,
+             IngredientSerializer),
+        ):
+            objects = {obj.id: obj for obj in queryset}
+            # Deleted after its change was logged; the tombstone follows.
+            missing = [pk for pk in changed[model] if pk not in objects]
+            data[name] = serializer_class(
+                [objects[pk] for pk in changed[model] if pk in objects],
+                many=True, context=context
+            ).data
+            deleted[model].extend(missing)
+        data['deleted'] = {
+            'recipes': deleted[ChangeLog.RECIPE],
+            'tags': deleted[ChangeLog.TAG],
+            'ingredients': deleted[ChangeLog.INGREDIENT],
+        }
+        return Response(data)
+
+
+def top(rollup, since, limit, key, fields, count):
+    """Largest ``count`` sums of a rollup since a day, with ``fields``."""
+    rows = (
+        rollup.objects.filter(day__gte=since)
+        .values(key, *fields).annotate(total=Sum(count))
+        .filter(total__gt=0).order_by('-total', key)[:limit]
+    )
+    return [
+        {'id': row[key],
+         **{field.split('__')[-1]: row[field] for field in fields},
+         count: row['total']}
+        for row in rows
+    ]
+
+
+class StatsView(APIView):
+    """Most used ingredients and tags and most favorited authors.
+
+    Read from the daily rollups of ``recipes.rollups`` over the last
+    ``days`` days (30 by default), ``limit`` entries per list.
+    """
+
+    @cache_response(stats_tags, timeout=settings.STATS_CACHE_TTL)
+    def get(self, request, *args, **kwargs):
+        params = {}
+        for name, default, maximum in (
+            ('days', 30, settings.STATS_MAX_DAYS),
+            ('limit', 10, 100),
+        ):
+            try:
+                params[name] = int(request.query_params.get(name, default))
+            except ValueError:
+                params[name] = 0
+            if not 1 <= params[name] <= maximum:
+                return Response({'error': f'Invalid {name} value'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        since = timezone.localdate() - timedelta(days=params['days'] - 1)
+        limit = params['limit']
+        return Response({
+            'since': since,
+            'ingredients': top(IngredientUsage, since, limit, 'ingredient',
+                               ('ingredient__name',
+                                'ingredient__measurement_unit'), 'uses'),
+            'tags': top(TagUsage, since, limit, 'tag',
+                        ('tag__name', 'tag__slug'), 'uses'),
+            'authors': top(AuthorFavorites, since, limit, 'author',
+                           ('author__username',), 'favorites'),
+        })
+
+
 class TagViewSet(viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     http_method_names = ['get']
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return Response(catalog.tags())
+
 
 class IngredientViewSet(viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
@@ -168,21 +335,52 @@ class IngredientViewSet(viewsets.ModelViewSet):
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        return Response(catalog.ingredients())
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all().order_by('-pub_date')
+    queryset = Recipe.objects.all().order_by('-pub_date', '-id')
     serializer_class = RecipeReadSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        return recipes_for(self.request.user, super().get_queryset())
+
+    @property
+    def paginator(self):
+        """Page numbers by default; ?pagination=keyset on the recipe list."""
+        if not hasattr(self, '_paginator'):
+            keyset = (self.action == 'list' and self.request.query_params
+                      .get('pagination') == 'keyset')
+            self._paginator = (RecipeKeysetPagination() if keyset
+                               else self.pagination_class())
+        return self._paginator
+
+    @cache_response(recipe_list_tags)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response(recipe_detail_tags)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        purge.hide_recipe(instance)
+
     def manage_relation(self, request, model, action_type, pk=None):
-        recipe = self.get_object()
+        """Toggle a user/recipe relation; return whether it changed."""
+        recipe_id = parse_pk(pk)
         if action_type == 'create':
-            model.objects.get_or_create(user=request.user, recipe=recipe)
-            return Response(status=status.HTTP_201_CREATED)
-        model.objects.filter(user=request.user, recipe=recipe).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+            try:
+                return model.objects.add(request.user.id, recipe_id)
+            except Recipe.DoesNotExist:
+                raise Http404
+        return model.objects.remove(request.user.id, recipe_id)
 
     @action(detail=True, methods=['POST', 'DELETE'], url_path='favorite')
     def manage_favorites(self, request, pk=None):
@@ -204,29 +402,45 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response({"detail": "Recipe removed from shopping cart."},
                         status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['GET'])
+    def top(self, request):
+        recipes = self.get_queryset().order_by('-popularity', '-id')
+        page = self.paginate_queryset(recipes)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['GET'])
+    def similar(self, request, pk=None):
+        limit = request.query_params.get('limit', 6)
+        try:
+            limit = min(int(limit), 100)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response({'error': 'Invalid limit value'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        recipe = self.get_object()
+        scores = dict(similarity.similar(recipe.id, limit))
+        recipes = sorted(self.get_queryset().filter(id__in=scores),
+                         key=lambda recipe: -scores[recipe.id])
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['GET'], url_path='download_shopping_cart')
     def download_shopping_cart(self, request):
-        user = request.user
-        shopping_list_recipes = (
-            ShoppingList.objects.filter(user=user).values_list('recipe',
-                                                               flat=True)
-        )
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__in=shopping_list_recipes
+        items = (
+            ShoppingCartItem.objects.filter(user=request.user)
+            .order_by('ingredient__name')
+            .values_list('ingredient__name', 'ingredient__measurement_unit',
+                         'amount')
         )
 
-        aggregated_ingredients = {}
-        for ingredient in ingredients:
-            key = (
-                ingredient.ingredient.name,
-                ingredient.ingredient.measurement_unit
-            )
-            if key not in aggregated_ingredients:
-                aggregated_ingredients[key] = 0
-            aggregated_ingredients[key] += ingredient.amount
-
         ingredients_list = []
-        for (name, unit), amount in aggregated_ingredients.items():
+        for name, unit, amount in items:
             ingredients_list.append(f"{name} ({unit}) — {amount}")
 
         response = HttpResponse('\n'.join(ingredients_list),
@@ -236,6 +450,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         return response
 
+    def get_throttles(self):
+        if self.action in ('create', 'update', 'partial_update'):
+            return [RecipeWriteThrottle()]
+        return super().get_throttles()
+
     def get_serializer_class(self):
         if self.request.method in ['POST', 'PUT', 'PATCH']:
             return RecipeWriteSerializer
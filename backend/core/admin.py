@@ -0,0 +1,120 @@
+from datetime import timedelta
+
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F
+from django.db.models import Min, Q
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
+
+from .models import Job, RequestProfile
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'user', 'status_code',
+                    'duration_ms', 'query_count', 'sql_ms')
+    list_select_related = ('user',)
+    search_fields = ('path',)
+    list_filter = ('method', 'status_code')
+    fields = ('created_at', 'user', 'method', 'path', 'status_code',
+              'duration_ms', 'query_count', 'sql_ms', 'samples',
+              'downloads')
+    readonly_fields = fields
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        view = self.admin_site.admin_view
+        return [
+            path('<int:pk>/stacks/', view(self.download_stacks),
+                 name='core_requestprofile_stacks'),
+            path('<int:pk>/queries/', view(self.download_queries),
+                 name='core_requestprofile_queries'),
+        ] + super().get_urls()
+
+    @admin.display(description='Downloads')
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">collapsed stacks</a> | <a href="{}">queries</a>',
+            reverse('admin:core_requestprofile_stacks', args=[obj.pk]),
+            reverse('admin:core_requestprofile_queries', args=[obj.pk]),
+        )
+
+    def get_profile(self, request, pk):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        return get_object_or_404(RequestProfile, pk=pk)
+
+    def download_stacks(self, request, pk):
+        profile = self.get_profile(request, pk)
+        response = HttpResponse(profile.stacks,
+                                content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = (
+            f'attachment; filename="profile-{pk}.folded"')
+        return response
+
+    def download_queries(self, request, pk):
+        profile = self.get_profile(request, pk)
+        response = JsonResponse(profile.queries, safe=False,
+                                json_dumps_params={'indent': 2})
+        response['Content-Disposition'] = (
+            f'attachment; filename="profile-{pk}-queries.json"')
+        return response
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'status', 'attempts', 'run_at',
+                    'started_at', 'finished_at', 'worker')
+    list_filter = ('status', 'task')
+    search_fields = ('task',)
+    readonly_fields = ('task', 'kwargs', 'status', 'attempts',
+                       'max_attempts', 'run_at', 'created_at', 'started_at',
+                       'finished_at', 'worker', 'last_error')
+    show_full_result_count = False
+    actions = ['retry']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Retry selected jobs now')
+    def retry(self, request, queryset):
+        count = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, run_at=timezone.now(), attempts=0,
+            finished_at=None)
+        self.message_user(request, f'{count} jobs queued')
+
+    def queue_stats(self):
+        now = timezone.now()
+        stats = Job.objects.aggregate(
+            queued=Count('id', filter=Q(status=Job.QUEUED)),
+            ready=Count('id', filter=Q(status=Job.QUEUED,
+                                       run_at__lte=now)),
+            running=Count('id', filter=Q(status=Job.RUNNING)),
+            failed=Count('id', filter=Q(status=Job.FAILED)),
+            oldest_ready=Min('run_at', filter=Q(status=Job.QUEUED,
+                                                run_at__lte=now)),
+        )
+        oldest = stats.pop('oldest_ready')
+        stats['oldest_wait'] = now - oldest if oldest else None
+        # Time from becoming ready to being picked up, over the last hour.
+        stats['latency'] = Job.objects.filter(
+            started_at__gte=now - timedelta(hours=1)
+        ).aggregate(latency=Avg(ExpressionWrapper(
+            F('started_at') - F('run_at'), output_field=DurationField())
+        ))['latency']
+        return stats
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {**(extra_context or {}),
+                         'queue_stats': self.queue_stats()}
+        return super().changelist_view(request, extra_context)
@@ -0,0 +1,181 @@
+"""Per-view limits on the database work of one request.
+
+``QUERY_BUDGETS`` gives expensive views a maximum number of queries and
+of SQL milliseconds. An execute wrapper on every connection counts and
+times the statements; on PostgreSQL the request also runs in a
+transaction with ``SET LOCAL statement_timeout``, so a single runaway
+statement is cancelled by the server instead of holding a backend. A
+request over budget is answered with 503 and logged with its slowest
+statements. With ``QUERY_BUDGET_MODE = 'report'`` nothing is cut off and
+the violations are only logged, for rolling out new limits.
+"""
+import heapq
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+ENFORCE = 'enforce'
+REPORT = 'report'
+# SQLSTATE of a statement cancelled by statement_timeout.
+QUERY_CANCELED = '57014'
+# Slowest statements shown in the log message.
+SLOWEST = 3
+SQL_LENGTH = 300
+
+
+class QueryBudgetExceeded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The request needs more database work than allowed.'
+    default_code = 'query_budget_exceeded'
+
+
+class QueryBudget:
+    def __init__(self, view, queries=None, sql_ms=None, enforce=True):
+        self.view = view
+        self.max_queries = queries
+        self.max_sql_ms = sql_ms
+        self.enforce = enforce
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.slowest = []
+        self.violation = None
+
+    def exceed(self, reason):
+        if self.violation is None:
+            self.violation = reason
+        if self.enforce:
+            raise QueryBudgetExceeded()
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.max_queries is not None and self.queries >= self.max_queries:
+            self.exceed(f'more than {self.max_queries} queries')
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except Exception as error:
+            if getattr(error.__cause__, 'pgcode', None) == QUERY_CANCELED:
+                self.exceed(f'statement over {self.max_sql_ms} ms')
+            raise
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.sql_ms += ms
+            entry = (ms, sql[:SQL_LENGTH])
+            if len(self.slowest) < SLOWEST:
+                heapq.heappush(self.slowest, entry)
+            else:
+                heapq.heappushpop(self.slowest, entry)
+            if self.max_sql_ms is not None and self.sql_ms > self.max_sql_ms:
+                self.exceed(f'more than {self.max_sql_ms} ms of SQL')
+
+    def log(self, request):
+        slowest = '; '.join(f'{ms:.1f} ms: {sql}' for ms, sql
+                            in sorted(self.slowest, reverse=True))
+        logger.warning(
+            '%s %s (%s) %s query budget: %s; %d queries, %.1f ms of SQL. '
+            'Slowest: %s', request.method, request.get_full_path(),
+            self.view, 'exceeded' if self.enforce else 'would exceed',
+            self.violation, self.queries, self.sql_ms, slowest)
+
+
+def view_name(match, method):
+    """``ViewClass.action`` of a resolved URL, as used in QUERY_BUDGETS."""
+    func = getattr(match.func, 'sync_view', match.func)
+    view_class = getattr(func, 'cls', None) or getattr(func, 'view_class',
+                                                       None)
+    if view_class is None:
+        return None
+    actions = getattr(func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+def budget_for(match, method):
+    if settings.QUERY_BUDGET_MODE not in (ENFORCE, REPORT):
+        return None
+    name = view_name(match, method)
+    limits = settings.QUERY_BUDGETS.get(name)
+    if limits is None:
+        return None
+    return QueryBudget(name, enforce=settings.QUERY_BUDGET_MODE == ENFORCE,
+                       **limits)
+
+
+def _enter(stack, budget):
+    """Watch this thread's connections; return the aliases in a transaction.
+
+    The transactions carry ``statement_timeout`` and are rolled back when
+    the request goes over budget.
+    """
+    aliases = []
+    if budget.enforce and budget.max_sql_ms is not None:
+        aliases = [alias for alias in connections
+                   if connections[alias].vendor == 'postgresql']
+    for alias in aliases:
+        stack.enter_context(transaction.atomic(using=alias))
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SET LOCAL statement_timeout = %s',
+                           [int(budget.max_sql_ms)])
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(budget))
+    return aliases
+
+
+def _finish(budget, aliases):
+    if budget.violation is not None:
+        for alias in aliases:
+            transaction.set_rollback(True, using=alias)
+
+
+def run(request, get_response, budget):
+    """Run ``get_response(request)`` within ``budget``."""
+    try:
+        with ExitStack() as stack:
+            aliases = _enter(stack, budget)
+            response = get_response(request)
+            if response.streaming and not response.is_async:
+                # Produce the body while the budget still applies.
+                response.streaming_content = [
+                    b''.join(response.streaming_content)]
+            _finish(budget, aliases)
+    finally:
+        if budget.violation is not None:
+            budget.log(request)
+    return response
+
+
+async def arun(request, get_response, budget):
+    """``run`` for an async ``get_response``.
+
+    Async views do their database work in the request's thread-sensitive
+    executor, so the budget is installed on, and later removed from, the
+    connections of that thread, while the view itself stays on the event
+    loop.
+    """
+    stack = ExitStack()
+    try:
+        try:
+            aliases = await sync_to_async(_enter)(stack, budget)
+            response = await get_response(request)
+            if response.streaming and not response.is_async:
+                content = await sync_to_async(b''.join)(
+                    response.streaming_content)
+                response.streaming_content = [content]
+            await sync_to_async(_finish)(budget, aliases)
+        except BaseException as error:
+            await sync_to_async(stack.__exit__)(
+                type(error), error, error.__traceback__)
+            raise
+        await sync_to_async(stack.close)()
+    finally:
+        if budget.violation is not None:
+            budget.log(request)
+    return response
@@ -0,0 +1,272 @@
+"""Cache entries invalidated through dependency tags.
+
+Every tag (``recipe:42``, ``user:7:favorites``, ``catalog:tags`` ...) has a
+version counter in the cache. An entry is stored under its key combined
+with the current versions of its tags, so bumping one counter makes every
+entry that depends on the tag unreachable at once, without scanning or
+deleting keys.
+
+Entries are recomputed single-flight: the request that takes the entry's
+lock (``cache.add``, so it holds across threads and worker processes)
+computes the value while concurrent requests serve the previous value,
+or, if there is none or it was invalidated, wait for the new one. Entries
+also expire probabilistically ahead of time (XFetch), with the chance
+growing as expiry nears and with the cost of the last computation, so a
+hot key is usually refreshed by a single request before it expires.
+"""
+import asyncio
+import hashlib
+import math
+import random
+import time
+import uuid
+from collections import namedtuple
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+from rest_framework.response import Response
+
+
+def _tag_key(tag):
+    return f'tag:{tag}'
+
+
+def tag_versions(tags):
+    """Current version of each tag, creating the missing counters."""
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A fresh counter starts from the clock, so a counter that was
+            # evicted never comes back with a version that was already used.
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+Entry = namedtuple('Entry', 'versions value stored_at expires_at delta')
+
+# Larger values refresh earlier; 1 is the XFetch paper's default.
+EARLY_EXPIRY_BETA = 1.0
+# Seconds between checks while waiting for another request's result.
+POLL_INTERVAL = 0.05
+
+
+def _timeout(timeout):
+    return settings.CACHE_TTL if timeout is DEFAULT_TIMEOUT else timeout
+
+
+def _lock_key(key):
+    return f'lock:{key}'
+
+
+def _entry(value, versions, timeout, delta):
+    now = time.time()
+    expires_at = None if timeout is None else now + timeout
+    return Entry(versions, value, now, expires_at, delta)
+
+
+def _backend_timeout(timeout):
+    """Keep entries past their expiry so they can be served while stale."""
+    return None if timeout is None else timeout + settings.CACHE_STALE_TTL
+
+
+def _is_current(entry, versions):
+    return entry is not None and entry.versions == versions
+
+
+def _is_valid(entry, versions):
+    return _is_current(entry, versions) and (
+        entry.expires_at is None or time.time() < entry.expires_at)
+
+
+def _is_fresh(entry, versions):
+    """Valid and not picked for early recomputation."""
+    if not _is_current(entry, versions):
+        return False
+    if entry.expires_at is None:
+        return True
+    gap = -entry.delta * EARLY_EXPIRY_BETA * math.log(1 - random.random())
+    return time.time() + gap < entry.expires_at
+
+
+def _is_newer(entry, seen, versions):
+    return _is_valid(entry, versions) and (
+        seen is None or entry.stored_at != seen.stored_at)
+
+
+def get(key, tags, default=None):
+    entry = cache.get(key)
+    if _is_valid(entry, tag_versions(tags)):
+        return entry.value
+    return default
+
+
+def set(key, value, tags, timeout=DEFAULT_TIMEOUT):
+    timeout = _timeout(timeout)
+    entry = _entry(value, tag_versions(tags), timeout, 0)
+    cache.set(key, entry, _backend_timeout(timeout))
+
+
+def _acquire(key):
+    token = uuid.uuid4().hex
+    if cache.add(_lock_key(key), token, settings.CACHE_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def _release(key, token):
+    # Not atomic, but the lock only ever outlives its owner by accident
+    # (a computation longer than CACHE_LOCK_TIMEOUT).
+    if cache.get(_lock_key(key)) == token:
+        cache.delete(_lock_key(key))
+
+
+def _compute(key, versions, compute, timeout):
+    started = time.monotonic()
+    value = compute()
+    entry = _entry(value, versions, timeout, time.monotonic() - started)
+    cache.set(key, entry, _backend_timeout(timeout))
+    return value
+
+
+def get_or_set(key, tags, compute, timeout=DEFAULT_TIMEOUT):
+    """Cached value of ``compute()``, recomputed by one request at a time.
+
+    The versions are read before computing, so a value computed while one
+    of its tags is invalidated is stored already out of date.
+    """
+    timeout = _timeout(timeout)
+    versions = tag_versions(tags)
+    seen = cache.get(key)
+    if _is_fresh(seen, versions):
+        return seen.value
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while True:
+        token = _acquire(key)
+        if token is not None:
+            try:
+                entry = cache.get(key)
+                if _is_newer(entry, seen, versions):
+                    return entry.value
+                return _compute(key, versions, compute, timeout)
+            finally:
+                _release(key, token)
+        if _is_current(seen, versions):
+            return seen.value
+        if time.monotonic() >= deadline:
+            return _compute(key, versions, compute, timeout)
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if _is_valid(entry, versions):
+            return entry.value
+
+
+async def _aacquire(key):
+    token = uuid.uuid4().hex
+    if await cache.aadd(_lock_key(key), token, settings.CACHE_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+async def _arelease(key, token):
+    if await cache.aget(_lock_key(key)) == token:
+        await cache.adelete(_lock_key(key))
+
+
+async def _acompute(key, versions, compute, timeout):
+    started = time.monotonic()
+    value = await compute()
+    entry = _entry(value, versions, timeout, time.monotonic() - started)
+    await cache.aset(key, entry, _backend_timeout(timeout))
+    return value
+
+
+async def aget_or_set(key, tags, compute, timeout=DEFAULT_TIMEOUT):
+    """``get_or_set`` for async views; ``compute`` is a coroutine function."""
+    timeout = _timeout(timeout)
+    versions = await sync_to_async(tag_versions)(tags)
+    seen = await cache.aget(key)
+    if _is_fresh(seen, versions):
+        return seen.value
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while True:
+        token = await _aacquire(key)
+        if token is not None:
+            try:
+                entry = await cache.aget(key)
+                if _is_newer(entry, seen, versions):
+                    return entry.value
+                return await _acompute(key, versions, compute, timeout)
+            finally:
+                await _arelease(key, token)
+        if _is_current(seen, versions):
+            return seen.value
+        if time.monotonic() >= deadline:
+            return await _acompute(key, versions, compute, timeout)
+        await asyncio.sleep(POLL_INTERVAL)
+        entry = await cache.aget(key)
+        if _is_valid(entry, versions):
+            return entry.value
+
+
+def invalidate(*tags):
+    for tag in tags:
+        try:
+            cache.incr(_tag_key(tag))
+        except ValueError:
+            cache.add(_tag_key(tag), time.time_ns(), None)
+
+
+def invalidate_on_commit(*tags):
+    """Invalidate once the current transaction commits.
+
+    Bumping earlier would let a concurrent request cache the old data
+    under the new versions.
+    """
+    transaction.on_commit(lambda: invalidate(*tags))
+
+
+def request_key(request, prefix='view'):
+    """Cache key for a GET request as seen by its user."""
+    user = getattr(request, 'user', None)
+    user_id = user.id if user is not None and user.is_authenticated else 0
+    path = hashlib.sha256(request.get_full_path().encode()).hexdigest()
+    return f'{prefix}:{user_id}:{path}'
+
+
+class _Uncacheable(Exception):
+    pass
+
+
+def cache_response(tags, timeout=DEFAULT_TIMEOUT):
+    """Cache successful responses of a DRF view method.
+
+    ``tags`` is called with the view, the request and the URL kwargs and
+    returns the tags the response depends on.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            response = None
+
+            def compute():
+                nonlocal response
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    raise _Uncacheable
+                return response.data
+
+            try:
+                data = get_or_set(request_key(request),
+                                  tags(self, request, **kwargs),
+                                  compute, timeout)
+            except _Uncacheable:
+                return response
+            return response if response is not None else Response(data)
+        return wrapper
+    return decorator
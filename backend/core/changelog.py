@@ -0,0 +1,119 @@
+"""Ordered log of catalog changes for delta sync.
+
+Every recipe, tag and ingredient keeps a single row: publishing a change
+deletes the object's previous row and appends a new one, so the table
+holds one row per live object plus the tombstones of deleted ones, and a
+client that has read the log up to a row id only needs the rows after it.
+
+Writers never touch the log itself. ``record`` inserts ``PendingChange``
+rows in the writer's transaction, which conflicts with nothing, and once
+it commits ``publish`` moves the committed pending rows into the log.
+Publishing is short and the only thing that takes the advisory lock, so
+log ids are handed out by one transaction at a time and become visible in
+id order: a cursor never skips a row whose transaction commits late. A
+pending row that is still uncommitted is simply published next time.
+
+Tombstones older than the retention period are purged; a client whose
+cursor predates the newest purged tombstone must start over.
+"""
+from django.db import connections, router, transaction
+from django.db.models import Max
+
+from .models import ChangeLog, ChangeLogPurge, PendingChange
+
+# Arbitrary key of the advisory lock held by publishers.
+LOCK_KEY = 35110035
+# Pending changes moved into the log per transaction.
+PUBLISH_BATCH_SIZE = 1000
+
+
+def _lock(using):
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [LOCK_KEY])
+    elif connection.vendor == 'sqlite':
+        # The test database: SQLite has only the database write lock, and
+        # a transaction that reads first fails to upgrade to it instead of
+        # waiting, so a write that changes nothing takes it up front.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {PendingChange._meta.db_table} WHERE 0')
+
+
+def record(model, object_ids, deleted=False):
+    """Record changes of ``model`` objects.
+
+    Joins the caller's transaction, if any, so the change commits or rolls
+    back together with the save or delete it describes, and is published
+    to the log after the commit.
+    """
+    object_ids = list(dict.fromkeys(object_ids))
+    if not object_ids:
+        return
+    using = router.db_for_write(PendingChange)
+    PendingChange.objects.using(using).bulk_create([
+        PendingChange(model=model, object_id=object_id, deleted=deleted)
+        for object_id in object_ids
+    ])
+    transaction.on_commit(publish, using=using)
+
+
+def publish():
+    """Move committed pending changes into the log; returns their count."""
+    using = router.db_for_write(ChangeLog)
+    published = 0
+    while True:
+        with transaction.atomic(using=using):
+            _lock(using)
+            # Fetched once: later statements must not act on rows that
+            # commit while this runs.
+            pending = list(PendingChange.objects.using(using)
+                           .order_by('id')[:PUBLISH_BATCH_SIZE])
+            if not pending:
+                return published
+            latest = {}
+            for change in pending:
+                latest.pop((change.model, change.object_id), None)
+                latest[change.model, change.object_id] = change
+            for model in {change.model for change in pending}:
+                ChangeLog.objects.using(using).filter(
+                    model=model, object_id__in=[
+                        object_id for key, object_id in latest
+                        if key == model]).delete()
+            ChangeLog.objects.using(using).bulk_create([
+                ChangeLog(model=change.model, object_id=change.object_id,
+                          deleted=change.deleted,
+                          changed_at=change.changed_at)
+                for change in latest.values()
+            ])
+            PendingChange.objects.using(using).filter(
+                id__in=[change.id for change in pending]).delete()
+        published += len(pending)
+
+
+def horizon():
+    """Id of the newest purged tombstone; older cursors are stale."""
+    return ChangeLogPurge.objects.aggregate(
+        horizon=Max('purged_through'))['horizon'] or 0
+
+
+def changes_since(cursor, limit):
+    return list(ChangeLog.objects.filter(id__gt=cursor)
+                .order_by('id')[:limit])
+
+
+def purge(before):
+    """Drop tombstones recorded before ``before``; returns their count."""
+    publish()
+    using = router.db_for_write(ChangeLog)
+    with transaction.atomic(using=using):
+        _lock(using)
+        tombstones = ChangeLog.objects.using(using).filter(
+            deleted=True, changed_at__lt=before)
+        last = tombstones.aggregate(last=Max('id'))['last']
+        if last is None:
+            return 0
+        count, _ = tombstones.filter(id__lte=last).delete()
+        ChangeLogPurge.objects.using(using).create(purged_through=last)
+    return count
@@ -0,0 +1,46 @@
+from django.db import connections
+from django.db.models import signals
+
+
+def fetch_returning(sql, params, using):
+    """Run a single ``... RETURNING`` statement and return its first row."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+def returning_columns(model):
+    """Column list for a ``RETURNING`` clause covering every local field."""
+    return ', '.join(field.column for field in model._meta.concrete_fields)
+
+
+def instance_from_row(model, row, using):
+    """Build a model instance from a ``returning_columns`` row.
+
+    Raw cursors skip the backend converters, so they are applied here the
+    same way the ORM does before values reach the model.
+    """
+    connection = connections[using]
+    fields = model._meta.concrete_fields
+    values = []
+    for field, value in zip(fields, row):
+        expression = field.get_col(model._meta.db_table)
+        converters = (connection.ops.get_db_converters(expression)
+                      + field.get_db_converters(connection))
+        for converter in converters:
+            value = converter(value, expression, connection)
+        values.append(value)
+    return model.from_db(using, [field.attname for field in fields], values)
+
+
+def send_created(instance, using):
+    """Notify ``post_save`` receivers about a row inserted with raw SQL."""
+    signals.post_save.send(sender=type(instance), instance=instance,
+                           created=True, update_fields=None, raw=False,
+                           using=using)
+
+
+def send_deleted(instance, using):
+    """Notify ``post_delete`` receivers about a row removed with raw SQL."""
+    signals.post_delete.send(sender=type(instance), instance=instance,
+                             using=using, origin=instance)
@@ -0,0 +1,84 @@
+"""Query plan checks for ``explain_hot_queries``.
+
+``capture`` records the SQL an ORM call sends, ``seq_scans`` asks the
+database for the plan of one statement and lists the tables it reads
+sequentially with their size: ``pg_class.reltuples`` on PostgreSQL and
+an exact count on SQLite, where ``EXPLAIN QUERY PLAN`` has no estimates.
+"""
+import json
+import re
+
+from django.db import connections
+
+# ``"table" alias`` pairs, to map SQLite plan aliases back to tables.
+ALIASES = re.compile(r'"([^"]+)"\s+(?:AS\s+)?("?\w+"?)')
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\S+)(.*)$')
+
+
+class Capture:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+def capture(func, using='default'):
+    """Run ``func`` and return the SELECT statements it executed."""
+    statements = Capture()
+    with connections[using].execute_wrapper(statements):
+        func()
+    return statements.statements
+
+
+def _walk(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _walk(child)
+
+
+def _postgresql_scans(cursor, sql, params):
+    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    tables = {node['Relation Name'] for node in _walk(plan[0]['Plan'])
+              if node['Node Type'] == 'Seq Scan'}
+    sizes = {}
+    for table in tables:
+        cursor.execute('SELECT reltuples FROM pg_class '
+                       'WHERE oid = %s::regclass', [table])
+        sizes[table] = max(int(cursor.fetchone()[0]), 0)
+    return sizes
+
+
+def _sqlite_scans(cursor, sql, params, tables):
+    aliases = {alias.strip('"'): table
+               for table, alias in ALIASES.findall(sql)}
+    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+    sizes = {}
+    for *_, detail in cursor.fetchall():
+        match = SQLITE_SCAN.match(detail)
+        if match is None or 'INDEX' in match.group(2):
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        if table not in tables:
+            continue
+        cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
+        sizes[table] = cursor.fetchone()[0]
+    return sizes
+
+
+def seq_scans(sql, params, using='default'):
+    """``{table: rows}`` of the tables the statement scans sequentially."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            return _postgresql_scans(cursor, sql, params)
+        if connection.vendor == 'sqlite':
+            tables = set(connection.introspection.table_names(cursor))
+            return _sqlite_scans(cursor, sql, params, tables)
+    raise NotImplementedError(f'EXPLAIN of {connection.vendor} is not '
+                              f'supported')
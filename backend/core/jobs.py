@@ -0,0 +1,155 @@
+"""Background jobs stored in the database.
+
+A function becomes a task with the ``task`` decorator and is queued with
+``enqueue`` (the job row commits or rolls back with the surrounding
+transaction) or ``enqueue_on_commit``. Workers started by ``run_workers``
+claim ready jobs with ``SELECT ... FOR UPDATE SKIP LOCKED``, so any
+number of them share the queue without a broker and without blocking
+each other. A failed job is retried with exponential backoff until it
+runs out of attempts; a job whose worker died is requeued once it has
+been running for ``JOB_TIMEOUT`` seconds. With ``JOB_RUN_INLINE`` tasks
+run in the enqueuing process right after commit (development without a
+worker).
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Longest pause, in seconds, after repeated errors of a worker loop.
+MAX_ERROR_PAUSE = 60
+
+
+def task(func=None, *, max_attempts=5):
+    """Mark ``func`` as runnable by workers; its kwargs must be JSON."""
+    def decorator(func):
+        func.task_name = f'{func.__module__}.{func.__qualname__}'
+        func.max_attempts = max_attempts
+        return func
+    return decorator(func) if func is not None else decorator
+
+
+def enqueue(func, run_at=None, **kwargs):
+    if settings.JOB_RUN_INLINE:
+        transaction.on_commit(lambda: func(**kwargs))
+        return None
+    return Job.objects.create(
+        task=func.task_name, kwargs=kwargs,
+        max_attempts=func.max_attempts,
+        run_at=run_at or timezone.now(),
+    )
+
+
+def enqueue_on_commit(func, **kwargs):
+    """Queue the job once the current transaction commits, if it does."""
+    transaction.on_commit(lambda: enqueue(func, **kwargs))
+
+
+def claim(worker, limit=1):
+    """Mark up to ``limit`` ready jobs as running by ``worker``."""
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_at__lte=timezone.now())
+            .order_by('run_at', 'id')[:limit]
+        )
+        claimed = []
+        now = timezone.now()
+        for job in jobs:
+            # The status condition keeps the claim exclusive on databases
+            # without row locks (SQLite).
+            if Job.objects.filter(id=job.id, status=Job.QUEUED).update(
+                    status=Job.RUNNING, started_at=now, worker=worker,
+                    attempts=job.attempts + 1):
+                job.status, job.started_at = Job.RUNNING, now
+                job.worker, job.attempts = worker, job.attempts + 1
+                claimed.append(job)
+        return claimed
+
+
+def backoff(attempts):
+    """Delay before retry number ``attempts``, with jitter."""
+    delay = settings.JOB_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.5))
+
+
+def run(job):
+    try:
+        func = import_string(job.task)
+        if not hasattr(func, 'task_name'):
+            raise ImportError(f'{job.task} is not a task')
+        func(**job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s failed (attempt %s of %s)', job,
+                       job.attempts, job.max_attempts, exc_info=True)
+        if job.attempts < job.max_attempts:
+            Job.objects.filter(id=job.id).update(
+                status=Job.QUEUED, last_error=error,
+                run_at=timezone.now() + backoff(job.attempts))
+        else:
+            Job.objects.filter(id=job.id).update(
+                status=Job.FAILED, last_error=error,
+                finished_at=timezone.now())
+        return False
+    Job.objects.filter(id=job.id).update(status=Job.DONE,
+                                         finished_at=timezone.now())
+    return True
+
+
+def requeue_stale():
+    """Requeue jobs whose worker stopped without finishing them."""
+    deadline = timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT)
+    stale = Job.objects.filter(status=Job.RUNNING, started_at__lt=deadline)
+    # A job that keeps killing its worker fails instead of looping.
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=timezone.now(),
+        last_error='Worker stopped while running the job')
+    return stale.update(status=Job.QUEUED, run_at=timezone.now())
+
+
+def purge(before):
+    """Delete finished jobs older than ``before``."""
+    count, _ = Job.objects.filter(status=Job.DONE,
+                                  finished_at__lt=before).delete()
+    return count
+
+
+def work(worker, stop, once=False, poll=1.0):
+    """Run jobs until ``stop`` is set, or the queue is empty if ``once``.
+
+    Database errors (a dropped connection, a locked SQLite file) are
+    logged and retried with a growing pause instead of ending the thread.
+    """
+    errors = 0
+    try:
+        while not stop.is_set():
+            try:
+                close_old_connections()
+                claimed = claim(worker)
+                if not claimed:
+                    if once:
+                        break
+                    stop.wait(poll)
+                    continue
+                for job in claimed:
+                    run(job)
+                errors = 0
+            except Exception:
+                errors += 1
+                logger.exception('Worker %s failed to claim or finish a job',
+                                 worker)
+                close_old_connections()
+                stop.wait(min(poll * 2 ** errors, MAX_ERROR_PAUSE))
+    finally:
+        connections.close_all()
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import changelog
+
+
+class Command(BaseCommand):
+    help = 'Purge change log tombstones older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.CHANGELOG_RETENTION_DAYS,
+                            help='Keep tombstones of the last DAYS days')
+
+    def handle(self, *args, **kwargs):
+        before = timezone.now() - timedelta(days=kwargs['days'])
+        count = changelog.purge(before)
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully purged {count} change log tombstones'))
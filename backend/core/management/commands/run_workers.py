@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from core import jobs
+
+# Seconds between housekeeping passes of the supervising process.
+HOUSEKEEPING_INTERVAL = 60
+
+
+def work_in_process(worker, stop, once, poll):
+    # The supervisor handles Ctrl+C and tells the workers through ``stop``.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    jobs.work(worker, stop, once, poll)
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers until interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=settings.JOB_WORKERS)
+        parser.add_argument('--processes', action='store_true',
+                            help='Run workers as processes, not threads')
+        parser.add_argument('--poll', type=float,
+                            default=settings.JOB_POLL_INTERVAL,
+                            help='Seconds between polls of an empty queue')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when no job is ready')
+
+    def housekeeping(self):
+        requeued = jobs.requeue_stale()
+        if requeued:
+            self.stderr.write(f'Requeued {requeued} stale jobs')
+        jobs.purge(timezone.now()
+                   - timedelta(days=settings.JOB_RETENTION_DAYS))
+
+    def handle(self, *args, **kwargs):
+        once, poll = kwargs['once'], kwargs['poll']
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        self.housekeeping()
+
+        if kwargs['processes']:
+            stop = multiprocessing.Event()
+            # Forked workers must not share the parent's connections.
+            connections.close_all()
+            workers = [
+                multiprocessing.Process(
+                    target=work_in_process,
+                    args=(f'{prefix}:{number}', stop, once, poll))
+                for number in range(kwargs['workers'])
+            ]
+        else:
+            stop = threading.Event()
+            workers = [
+                threading.Thread(target=jobs.work,
+                                 args=(f'{prefix}:{number}', stop, once,
+                                       poll))
+                for number in range(kwargs['workers'])
+            ]
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        for worker in workers:
+            worker.start()
+        self.stdout.write(
+            f"Started {len(workers)} workers, press Ctrl+C to stop")
+        checked = time.monotonic()
+        try:
+            while any(worker.is_alive() for worker in workers):
+                if stop.wait(1):
+                    break
+                if time.monotonic() - checked >= HOUSEKEEPING_INTERVAL:
+                    self.housekeeping()
+                    checked = time.monotonic()
+        except KeyboardInterrupt:
+            stop.set()
+        for worker in workers:
+            worker.join()
+        self.stdout.write(self.style.SUCCESS('Successfully stopped workers'))
@@ -0,0 +1,281 @@
+import hashlib
+import math
+import time
+
+from asgiref.sync import (
+    async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+)
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import budgets, profiling
+from .routers import use_replicas
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'db_pin'
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = '_profile'
+REQUEST_START_HEADER = 'X-Request-Start'
+
+
+def queue_time(request):
+    """Seconds since the proxy received the request, or None.
+
+    ``X-Request-Start`` is ``t=<seconds>`` as nginx sends it with
+    ``$msec``; milliseconds and microseconds since the epoch are accepted
+    too.
+    """
+    value = request.headers.get(REQUEST_START_HEADER, '')
+    try:
+        started = float(value[2:] if value.startswith('t=') else value)
+    except ValueError:
+        return None
+    while started > 1e11:
+        started /= 1000
+    return max(time.time() - started, 0)
+
+
+def is_read_only(request):
+    """Whether the view only reads despite an unsafe method.
+
+    Class-based views declare that with ``read_only = True``.
+    """
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return False
+    view_class = getattr(match.func, 'view_class', None)
+    return getattr(view_class, 'read_only', False)
+
+
+class DualModeMiddleware:
+    """Middleware that runs natively in both sync and async chains.
+
+    Under ASGI a sync-only middleware makes Django wrap the rest of the
+    chain, async views included, in a thread adapter. Subclasses implement
+    ``handle`` for WSGI and ``ahandle`` for ASGI instead of ``__call__``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.ahandle(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        raise NotImplementedError
+
+    async def ahandle(self, request):
+        raise NotImplementedError
+
+
+class LoadSheddingMiddleware(DualModeMiddleware):
+    """Refuse writes while the server is overloaded.
+
+    A request that waited in the queues longer than ``OVERLOAD_QUEUE_MS``
+    means the workers cannot keep up. Unsafe requests (logins, recipe
+    writes, uploads) are the expensive ones and the ones clients retry,
+    so they get 503 with ``Retry-After`` and the cheap reads, which are
+    most of the traffic, go on being served; views that only read despite
+    an unsafe method (``read_only``) count as reads.
+    """
+
+    @staticmethod
+    def overload_response(request):
+        if request.method in SAFE_METHODS or is_read_only(request):
+            return None
+        waited = queue_time(request)
+        if waited is None or waited * 1000 <= settings.OVERLOAD_QUEUE_MS:
+            return None
+        response = JsonResponse(
+            {'detail': 'The server is overloaded, retry later.'},
+            status=503)
+        response['Retry-After'] = str(max(1, math.ceil(waited)))
+        return response
+
+    def handle(self, request):
+        response = self.overload_response(request)
+        if response is None:
+            response = self.get_response(request)
+        return response
+
+    async def ahandle(self, request):
+        response = self.overload_response(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
+
+
+class ReplicaRoutingMiddleware(DualModeMiddleware):
+    """Send safe requests to replicas, except right after a write.
+
+    A successful unsafe request pins its client to the primary for
+    ``REPLICA_PIN_SECONDS``: browsers through a cookie, token clients
+    through a cache key derived from their ``Authorization`` header. This
+    way a client always sees its own new recipes and toggles even while
+    the replicas are still catching up. Class-based views that only read
+    despite an unsafe method declare ``read_only = True``.
+    """
+
+    @staticmethod
+    def pin_key(request):
+        authorization = request.headers.get('Authorization')
+        if not authorization:
+            return None
+        digest = hashlib.sha256(authorization.encode()).hexdigest()
+        return f'db-pin:{digest}'
+
+    @staticmethod
+    def cookie_pinned(request):
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def is_pinned(self, request):
+        if self.cookie_pinned(request):
+            return True
+        key = self.pin_key(request)
+        return key is not None and cache.get(key) is not None
+
+    async def ais_pinned(self, request):
+        if self.cookie_pinned(request):
+            return True
+        key = self.pin_key(request)
+        return key is not None and await cache.aget(key) is not None
+
+    @staticmethod
+    def is_safe(request):
+        return request.method in SAFE_METHODS or is_read_only(request)
+
+    def pin(self, request, response):
+        """Pin the client after a write; return its cache key, if any."""
+        window = settings.REPLICA_PIN_SECONDS
+        response.set_cookie(PIN_COOKIE, str(time.time() + window),
+                            max_age=window, httponly=True, samesite='Lax')
+        return self.pin_key(request)
+
+    def handle(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        safe = self.is_safe(request)
+        token = use_replicas.set(safe and not self.is_pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replicas.reset(token)
+
+        if not safe and response.status_code < 400:
+            key = self.pin(request, response)
+            if key is not None:
+                cache.set(key, 1, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def ahandle(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        safe = self.is_safe(request)
+        token = use_replicas.set(safe and not await self.ais_pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_replicas.reset(token)
+
+        if not safe and response.status_code < 400:
+            key = self.pin(request, response)
+            if key is not None:
+                await cache.aset(key, 1, settings.REPLICA_PIN_SECONDS)
+        return response
+
+
+class ProfilingMiddleware(DualModeMiddleware):
+    """Profile a request when a staff user asks for it.
+
+    The request carries an ``X-Profile`` header or a ``_profile`` query
+    parameter; the stored profile's id comes back in ``X-Profile-Id`` and
+    the profile is downloadable from the admin. Other requests only pay
+    for checking the flag. Under ASGI a profiled request is run from a
+    worker thread, so that its database work, which async views hand to
+    the thread-sensitive executor, happens in the thread the profiler
+    watches.
+    """
+
+    @staticmethod
+    def staff_user(request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            try:
+                result = JWTAuthentication().authenticate(request)
+            except APIException:
+                return None
+            user = result[0] if result else None
+        if user is not None and user.is_staff:
+            return user
+        return None
+
+    @staticmethod
+    def wants_profile(request):
+        return (PROFILE_HEADER in request.headers
+                or PROFILE_PARAM in request.GET)
+
+    def handle(self, request):
+        if not self.wants_profile(request):
+            return self.get_response(request)
+        user = self.staff_user(request)
+        if user is None:
+            return self.get_response(request)
+        request.profiling = True
+        return profiling.profile(request, self.get_response, user)
+
+    async def ahandle(self, request):
+        if not self.wants_profile(request):
+            return await self.get_response(request)
+        user = await sync_to_async(self.staff_user)(request)
+        if user is None:
+            return await self.get_response(request)
+        request.profiling = True
+        return await sync_to_async(profiling.profile)(
+            request, async_to_sync(self.get_response), user)
+
+
+class QueryBudgetMiddleware(DualModeMiddleware):
+    """Hold requests to the query budget of their view.
+
+    See ``core.budgets``; views without an entry in ``QUERY_BUDGETS`` are
+    not watched.
+    """
+
+    @staticmethod
+    def budget_for(request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        return budgets.budget_for(match, request.method)
+
+    def handle(self, request):
+        budget = self.budget_for(request)
+        if budget is None:
+            return self.get_response(request)
+        request.query_budget = budget
+        return budgets.run(request, self.get_response, budget)
+
+    async def ahandle(self, request):
+        budget = self.budget_for(request)
+        if budget is None:
+            return await self.get_response(request)
+        request.query_budget = budget
+        return await budgets.arun(request, self.get_response, budget)
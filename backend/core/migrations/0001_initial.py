@@ -0,0 +1,51 @@
+# Generated by Django 4.2.5 on 2026-10-19 09:56
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def fill_changelog(apps, schema_editor):
+    ChangeLog = apps.get_model('core', 'ChangeLog')
+    for model, label in (('recipe', 'Recipe'), ('tag', 'Tag'),
+                         ('ingredient', 'Ingredient')):
+        ids = apps.get_model('recipes', label).objects.values_list(
+            'id', flat=True).order_by('id')
+        ChangeLog.objects.bulk_create(
+            (ChangeLog(model=model, object_id=object_id)
+             for object_id in ids.iterator()),
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('recipes', '0006_recipe_minhash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogPurge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purged_through', models.BigIntegerField()),
+                ('purged_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('recipe', 'Recipe'), ('tag', 'Tag'), ('ingredient', 'Ingredient')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model', 'object_id'], name='changelog_object_idx')],
+            },
+        ),
+        migrations.RunPython(fill_changelog, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,122 @@
+import uuid
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class ChangeLog(models.Model):
+    """Latest change of a catalog object; see ``core.changelog``."""
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    MODELS = [(RECIPE, 'Recipe'), (TAG, 'Tag'), (INGREDIENT, 'Ingredient')]
+
+    model = models.CharField(max_length=20, choices=MODELS)
+    object_id = models.PositiveIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'object_id'],
+                         name='changelog_object_idx'),
+        ]
+
+    def __str__(self):
+        action = 'deleted' if self.deleted else 'changed'
+        return f'#{self.id} {self.model} {self.object_id} {action}'
+
+
+class PendingChange(models.Model):
+    """A change recorded by a transaction, not yet placed in the log."""
+    model = models.CharField(max_length=20, choices=ChangeLog.MODELS)
+    object_id = models.PositiveIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'{self.model} {self.object_id} pending'
+
+
+class ChangeLogPurge(models.Model):
+    """A compaction run: tombstones up to ``purged_through`` are gone."""
+    purged_through = models.BigIntegerField()
+    purged_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'Purged through #{self.purged_through}'
+
+
+class RequestProfile(models.Model):
+    """Profile of one API request, recorded on demand by staff.
+
+    See ``core.profiling``.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True,
+                             on_delete=models.SET_NULL, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+    method = models.CharField(max_length=10)
+    path = models.TextField()
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    sql_ms = models.FloatField()
+    samples = models.PositiveIntegerField()
+    stacks = models.TextField(blank=True)
+    queries = models.JSONField(default=list)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration_ms:.0f} ms)'
+
+
+class Job(models.Model):
+    """A deferred call of a ``core.jobs.task`` function."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'),
+                (FAILED, 'Failed')]
+
+    task = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'],
+                         name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'#{self.id} {self.task} ({self.status})'
+
+
+class Upload(models.Model):
+    """A file being uploaded in chunks; see ``core.uploads``."""
+    token = models.UUIDField(default=uuid.uuid4, unique=True,
+                             editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE, related_name='+')
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    checksum = models.CharField(max_length=64)
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.offset}/{self.size})'
@@ -0,0 +1,108 @@
+"""On-demand profiling of single requests.
+
+A request runs with a sampling thread that records the request thread's
+stack every ``PROFILE_SAMPLE_INTERVAL`` seconds, and with an execute
+wrapper on every database connection that logs the queries. The samples
+are stored as collapsed stacks (``outer;inner;leaf count`` lines, the
+input format of flamegraph.pl and speedscope) next to the query list in
+a ``RequestProfile``.
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .models import RequestProfile
+
+# Longest stored params representation of a query.
+PARAMS_LENGTH = 500
+
+
+def collapse(frame):
+    names = []
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '?')
+        names.append(f'{module}.{frame.f_code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+    def collapsed(self):
+        return '\n'.join(f'{stack} {count}'
+                         for stack, count in self.stacks.most_common())
+
+
+class QueryLog:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'params': repr(params)[:PARAMS_LENGTH],
+                'many': many,
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+def profile(request, get_response, user):
+    """Run ``get_response(request)`` under the profiler and store it."""
+    queries = QueryLog()
+    sampler = Sampler(threading.get_ident(),
+                      settings.PROFILE_SAMPLE_INTERVAL)
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(queries))
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            response = get_response(request)
+            if response.streaming:
+                # Produce the body while the profiler is still running.
+                response.streaming_content = [
+                    b''.join(response.streaming_content)]
+        finally:
+            duration = time.perf_counter() - started
+            sampler.stop()
+
+    record = RequestProfile.objects.create(
+        user=user,
+        method=request.method,
+        path=request.get_full_path(),
+        status_code=response.status_code,
+        duration_ms=round(duration * 1000, 3),
+        query_count=len(queries.queries),
+        sql_ms=round(sum(query['ms'] for query in queries.queries), 3),
+        samples=sum(sampler.stacks.values()),
+        stacks=sampler.collapsed(),
+        queries=queries.queries,
+    )
+    response['X-Profile-Id'] = str(record.id)
+    return response
@@ -0,0 +1,25 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Set by ``ReplicaRoutingMiddleware`` for requests whose reads may be
+# served by a replica. Everything else (writes, management commands, jobs
+# and requests pinned after a write) reads from the primary.
+use_replicas = ContextVar('use_replicas', default=False)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICAS and use_replicas.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
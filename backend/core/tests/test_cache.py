@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache as backend
+from django.test import SimpleTestCase
+
+from core import cache
+from core.tests.utils import run_concurrently
+
+THREADS = 8
+# Long enough for every thread to miss while the first one computes.
+COMPUTE_TIME = 0.2
+
+
+class Computation:
+    """A slow ``compute`` that counts its calls from any thread."""
+
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+            value = self.calls
+        time.sleep(COMPUTE_TIME)
+        return value
+
+    async def acompute(self):
+        self.calls += 1
+        value = self.calls
+        await asyncio.sleep(COMPUTE_TIME)
+        return value
+
+
+class SingleFlightTests(SimpleTestCase):
+    """``get_or_set`` recomputes each key once however many requests miss."""
+
+    def setUp(self):
+        backend.clear()
+        self.compute = Computation()
+
+    def get_or_set(self, timeout=60):
+        return cache.get_or_set('key', ['tag'], self.compute, timeout)
+
+    def test_concurrent_misses(self):
+        results = run_concurrently(*[self.get_or_set] * THREADS)
+        self.assertEqual(self.compute.calls, 1)
+        self.assertEqual(results, [1] * THREADS)
+
+    def test_concurrent_misses_after_invalidation(self):
+        self.get_or_set()
+        cache.invalidate('tag')
+        results = run_concurrently(*[self.get_or_set] * THREADS)
+        self.assertEqual(self.compute.calls, 2)
+        # Nobody is served the invalidated value.
+        self.assertEqual(results, [2] * THREADS)
+
+    def test_expired_entry_served_while_one_recomputes(self):
+        self.get_or_set(timeout=0.01)
+        time.sleep(0.02)
+        results = run_concurrently(*[self.get_or_set] * THREADS)
+        self.assertEqual(self.compute.calls, 2)
+        self.assertCountEqual(results, [2] + [1] * (THREADS - 1))
+
+    def test_async_concurrent_misses(self):
+        async def main():
+            return await asyncio.gather(*[
+                cache.aget_or_set('key', ['tag'], self.compute.acompute, 60)
+                for _ in range(THREADS)
+            ])
+
+        self.assertEqual(asyncio.run(main()), [1] * THREADS)
+        self.assertEqual(self.compute.calls, 1)
+
+
+class EarlyExpiryTests(SimpleTestCase):
+    """XFetch: the closer to expiry and the costlier, the likelier."""
+
+    def setUp(self):
+        backend.clear()
+        self.versions = cache.tag_versions(['tag'])
+
+    def is_fresh(self, expires_in, delta, draw=0.5):
+        now = time.time()
+        entry = cache.Entry(self.versions, 'value', now, now + expires_in,
+                            delta)
+        with mock.patch('core.cache.random.random', return_value=draw):
+            return cache._is_fresh(entry, self.versions)
+
+    def test_cheap_entry_far_from_expiry(self):
+        self.assertTrue(self.is_fresh(expires_in=60, delta=0.01))
+
+    def test_costly_entry_near_expiry(self):
+        # The gap is delta * ln 2, about 6.9 seconds: past the expiry.
+        self.assertFalse(self.is_fresh(expires_in=5, delta=10))
+        self.assertTrue(self.is_fresh(expires_in=10, delta=10))
+
+    def test_early_refresh_is_single_flight(self):
+        compute = Computation()
+        cache.get_or_set('key', ['tag'], compute, 60)
+        entry = backend.get('key')
+        backend.set('key', entry._replace(delta=1000), None)
+        with mock.patch('core.cache.random.random', return_value=0.5):
+            results = run_concurrently(
+                *[lambda: cache.get_or_set('key', ['tag'], compute, 60)]
+                * THREADS)
+        self.assertEqual(compute.calls, 2)
+        self.assertCountEqual(results, [2] + [1] * (THREADS - 1))
@@ -0,0 +1,79 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.http import JsonResponse
+from django.test import AsyncClient, SimpleTestCase, override_settings
+from django.urls import path
+
+from core.middleware import (
+    LoadSheddingMiddleware, ProfilingMiddleware, QueryBudgetMiddleware,
+    ReplicaRoutingMiddleware
+)
+from core.routers import use_replicas
+
+MIDDLEWARE = (LoadSheddingMiddleware, ReplicaRoutingMiddleware,
+              ProfilingMiddleware, QueryBudgetMiddleware)
+
+
+async def async_view(request):
+    return JsonResponse({'replicas': use_replicas.get()})
+
+
+# csrf_exempt() would wrap the coroutine in a sync function.
+async_view.csrf_exempt = True
+
+
+def sync_view(request):
+    return JsonResponse({'replicas': use_replicas.get()})
+
+
+urlpatterns = [
+    path('async/', async_view),
+    path('sync/', sync_view),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__, DATABASE_REPLICAS=['replica'])
+class DualModeMiddlewareTests(SimpleTestCase):
+    def test_capabilities(self):
+        async def get_response(request):
+            pass
+
+        for middleware in MIDDLEWARE:
+            with self.subTest(middleware=middleware.__name__):
+                self.assertTrue(middleware.sync_capable)
+                self.assertTrue(middleware.async_capable)
+                self.assertTrue(
+                    iscoroutinefunction(middleware(get_response)))
+                self.assertFalse(
+                    iscoroutinefunction(middleware(lambda request: None)))
+
+    @override_settings(DEBUG=True)
+    async def test_async_view_is_not_adapted(self):
+        # Django logs every handler it wraps in sync_to_async or
+        # async_to_sync while building the chain in DEBUG.
+        with self.assertLogs('django.request', 'DEBUG') as logs:
+            response = await AsyncClient().get('/async/')
+            logging.getLogger('django.request').debug('Done.')
+        self.assertEqual(logs.output, ['DEBUG:django.request:Done.'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'replicas': True})
+
+    async def test_async_write_pins_to_primary(self):
+        client = AsyncClient()
+        response = await client.post('/async/')
+        self.assertEqual(response.json(), {'replicas': False})
+        self.assertIn('db_pin', response.cookies)
+        response = await client.get('/async/')
+        self.assertEqual(response.json(), {'replicas': False})
+
+    async def test_async_write_shed_when_overloaded(self):
+        response = await AsyncClient().post(
+            '/async/', headers={'X-Request-Start': f't={time.time() - 4.5}'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+
+    def test_sync_chain(self):
+        response = self.client.get('/sync/')
+        self.assertEqual(response.json(), {'replicas': True})
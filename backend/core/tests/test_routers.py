@@ -0,0 +1,127 @@
+from django.core.cache import cache
+from django.db import connections
+from django.test import (
+    Client, SimpleTestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.routers import PrimaryReplicaRouter, use_replicas
+from recipes.models import Recipe, Tag
+from users.models import CustomUser
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    router = PrimaryReplicaRouter()
+
+    def test_reads_go_to_replica_only_when_allowed(self):
+        self.assertEqual(self.router.db_for_read(Tag), 'default')
+        token = use_replicas.set(True)
+        try:
+            self.assertEqual(self.router.db_for_read(Tag), 'replica')
+            self.assertEqual(self.router.db_for_write(Tag), 'default')
+        finally:
+            use_replicas.reset(token)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        token = use_replicas.set(True)
+        try:
+            self.assertEqual(self.router.db_for_read(Tag), 'default')
+        finally:
+            use_replicas.reset(token)
+
+    def test_migrations_run_on_primary_only(self):
+        self.assertTrue(self.router.allow_migrate('default', 'recipes'))
+        self.assertFalse(self.router.allow_migrate('replica', 'recipes'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReadYourWritesTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            username='cook', email='cook@example.com', password='secret')
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Soup', image='recipes/soup.png',
+            text='Boil.', cooking_time=10)
+        token = RefreshToken.for_user(self.user).access_token
+        self.headers = {'Authorization': f'Token {token}'}
+        self.client = Client(headers=self.headers)
+
+    def request(self, method, path, client=None, **kwargs):
+        """The response and the number of queries run on each alias."""
+        client = client or self.client
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(client, method)(path, **kwargs)
+        return response, len(primary), len(replica)
+
+    def favorite(self, recipe_id=None):
+        recipe_id = recipe_id or self.recipe.id
+        return self.request('post', f'/api/recipes/{recipe_id}/favorite/')
+
+    def test_read_goes_to_replica(self):
+        response, primary, replica = self.request(
+            'get', f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_write_goes_to_primary(self):
+        response, primary, replica = self.favorite()
+        self.assertEqual(response.status_code, 201)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_reads_after_write_stay_on_primary(self):
+        self.favorite()
+        response, primary, replica = self.request(
+            'get', f'/api/recipes/{self.recipe.id}/')
+        self.assertTrue(response.json()['is_favorited'])
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_token_client_is_pinned_without_cookie(self):
+        self.favorite()
+        response, primary, replica = self.request(
+            'get', '/api/recipes/', client=Client(headers=self.headers))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica, 0)
+
+    def test_other_clients_still_read_replica(self):
+        self.favorite()
+        other = CustomUser.objects.create_user(
+            username='guest', email='guest@example.com', password='secret')
+        token = RefreshToken.for_user(other).access_token
+        client = Client(headers={'Authorization': f'Token {token}'})
+        response, primary, replica = self.request(
+            'get', '/api/recipes/', client=client)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary, 0)
+
+    def test_failed_write_does_not_pin(self):
+        response, _, _ = self.favorite(recipe_id=self.recipe.id + 1)
+        self.assertEqual(response.status_code, 404)
+        response, primary, replica = self.request('get', '/api/recipes/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    @override_settings(REPLICA_PIN_SECONDS=0)
+    def test_pin_expires(self):
+        self.favorite()
+        response, primary, replica = self.request('get', '/api/recipes/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_read_only_post_reads_replica_and_does_not_pin(self):
+        response, primary, replica = self.request(
+            'post', '/api/batch/', data={'requests': ['/api/recipes/']},
+            content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+        self.assertNotIn('db_pin', response.cookies)
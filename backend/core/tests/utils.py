@@ -0,0 +1,43 @@
+import threading
+
+from django.db import connections
+
+
+def run_concurrently(*calls):
+    """Run the callables in threads started together; return the results.
+
+    A call that raised contributes its exception instead of a result.
+    """
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def run(index, call):
+        try:
+            barrier.wait()
+            results[index] = call()
+        except Exception as error:
+            results[index] = error
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=(index, call))
+               for index, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class SignalLog:
+    """Instances a signal was sent for, collected from any thread."""
+
+    def __init__(self, test, signal, sender):
+        self.instances = []
+        self.lock = threading.Lock()
+        signal.connect(self.receive, sender=sender, weak=False)
+        test.addCleanup(signal.disconnect, self.receive, sender=sender)
+
+    def receive(self, sender, instance, **kwargs):
+        with self.lock:
+            self.instances.append(instance)
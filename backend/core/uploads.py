@@ -0,0 +1,154 @@
+"""Resumable uploads of files in raw binary chunks.
+
+A client creates an upload with the file's name, size and SHA-256, then
+sends the bytes in ``PATCH`` requests whose ``Upload-Offset`` header says
+where the chunk starts. Request bodies are streamed into a part file
+under ``MEDIA_ROOT/uploads`` piece by piece, never read into memory, and
+the bytes that did arrive count even when the connection drops, so the
+client asks for the current offset and carries on from there. After the
+last byte the checksum is verified and the upload's token can stand in
+for the file, e.g. ``upload:<token>`` as a recipe image. The part file is
+validated from disk and moved into the storage, again without reading it
+into memory.
+
+Uploads that were never used are deleted after ``UPLOAD_EXPIRY_HOURS``.
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import Upload
+
+DIRECTORY = 'uploads'
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A chunk that cannot be applied; ``conflict`` means a wrong offset."""
+
+    def __init__(self, message, conflict=False):
+        super().__init__(message)
+        self.conflict = conflict
+
+
+def part_path(upload):
+    return os.path.join(settings.MEDIA_ROOT, DIRECTORY,
+                        f'{upload.token}.part')
+
+
+def create(user, name, size, checksum):
+    upload = Upload.objects.create(user=user, name=name, size=size,
+                                   checksum=checksum.lower())
+    os.makedirs(os.path.dirname(part_path(upload)), exist_ok=True)
+    open(part_path(upload), 'wb').close()
+    return upload
+
+
+def write(upload, offset, stream, length):
+    """Append ``length`` bytes read from ``stream`` at ``offset``."""
+    if upload.completed_at is not None:
+        raise UploadError('Upload is already complete.', conflict=True)
+    if offset != upload.offset:
+        raise UploadError(f'Upload continues at offset {upload.offset}.',
+                          conflict=True)
+    if offset + length > upload.size:
+        raise UploadError('Chunk goes past the end of the upload.')
+    written = 0
+    try:
+        with open(part_path(upload), 'r+b') as file:
+            file.seek(offset)
+            while written < length:
+                chunk = stream.read(min(CHUNK_SIZE, length - written))
+                if not chunk:
+                    break
+                file.write(chunk)
+                written += len(chunk)
+    finally:
+        # Keep whatever arrived, even if the client went away.
+        moved = Upload.objects.filter(pk=upload.pk, offset=offset).update(
+            offset=offset + written)
+    if not moved:
+        upload.refresh_from_db()
+        raise UploadError(f'Upload continues at offset {upload.offset}.',
+                          conflict=True)
+    upload.offset = offset + written
+    if upload.offset == upload.size:
+        finish(upload)
+    return upload
+
+
+def finish(upload):
+    digest = hashlib.sha256()
+    with open(part_path(upload), 'rb') as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    if digest.hexdigest() != upload.checksum:
+        with open(part_path(upload), 'wb'):
+            pass
+        upload.offset = 0
+        upload.save(update_fields=['offset'])
+        raise UploadError('Checksum mismatch, the upload starts over.')
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=['completed_at'])
+
+
+class PartFile(File):
+    """The part file of a finished upload, open only while it is saved.
+
+    ``temporary_file_path`` lets image validation read the file from disk
+    and the storage move it into place instead of copying it.
+    """
+
+    def __init__(self, upload):
+        super().__init__(None, name=upload.name)
+        self.path = part_path(upload)
+
+    @cached_property
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def temporary_file_path(self):
+        return self.path
+
+    def open(self, mode='rb'):
+        if self.closed:
+            self.file = open(self.path, mode)
+        else:
+            self.seek(0)
+        return self
+
+    def close(self):
+        if not self.closed:
+            self.file.close()
+
+
+def read_file(upload):
+    """The finished upload as a ``PartFile``; nothing is read yet.
+
+    Raises ``FileNotFoundError`` if the part file is gone, e.g. moved
+    into the storage by a save that was then rolled back.
+    """
+    if not os.path.isfile(part_path(upload)):
+        raise FileNotFoundError(part_path(upload))
+    return PartFile(upload)
+
+
+def discard(upload):
+    upload.delete()
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def purge(before):
+    """Delete uploads started before ``before``; returns their number."""
+    count = 0
+    for upload in Upload.objects.filter(created_at__lt=before).iterator():
+        discard(upload)
+        count += 1
+    return count
@@ -0,0 +1,46 @@
+"""Gunicorn configuration for the backend container.
+
+The application is imported once in the master (``preload_app``), the
+catalog caches are warmed there and the resulting heap is frozen, so
+forked workers share it copy-on-write instead of each building a copy.
+
+By default the WSGI application runs on ``gthread`` workers, each thread
+keeping its database connection open (see ``settings_production``).
+``ASYNC_API_VIEWS=True`` switches to the ASGI application on uvicorn
+workers instead, where the read endpoints are async views: a slow client
+or query then parks a coroutine rather than a thread, but Django cannot
+keep connections open across async requests, so every request opens a new
+one, and ``threads`` no longer applies. Measure both with
+``infra/loadtest.py`` before switching.
+"""
+import gc
+import multiprocessing
+import os
+
+ASGI = os.getenv('ASYNC_API_VIEWS', 'False') == 'True'
+
+wsgi_app = os.getenv('GUNICORN_APP', 'foodgram.asgi:application' if ASGI
+                     else 'foodgram.wsgi:application')
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS',
+                         'uvicorn.workers.UvicornWorker' if ASGI
+                         else 'gthread')
+workers = int(os.getenv('GUNICORN_WORKERS',
+                        multiprocessing.cpu_count() * 2 + 1))
+# Threads per worker; gthread workers only.
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+preload_app = True
+
+
+def when_ready(server):
+    from django.db import connections
+
+    from api.catalog import warm
+
+    warm()
+    # Workers must not inherit the master's database sockets.
+    connections.close_all()
+    gc.collect()
+    gc.freeze()
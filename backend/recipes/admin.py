@@ -1,42 +1,137 @@
 from django.contrib import admin
 from django.contrib import messages
+from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.http import HttpResponseRedirect
 
+from . import purge
 from .models import (
     Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag,
     FavoriteRecipe)
 
 
+class BackgroundDeleteMixin:
+    """Delete with ``purge.hide`` and a background purge."""
+
+    def hide(self, obj):
+        purge.hide(obj)
+
+    def _cascade(self, model, seen):
+        for relation in model._meta.related_objects:
+            related = relation.related_model
+            if (relation.on_delete is models.CASCADE
+                    and related not in seen):
+                seen.add(related)
+                self._cascade(related, seen)
+        return seen
+
+    def get_deleted_objects(self, objs, request):
+        # Collecting the cascade for the confirmation page would load all
+        # of it; list only the objects themselves, but still require the
+        # delete permission on every model the purge removes rows from.
+        objs = list(objs)
+        perms_needed = set()
+        for model in self._cascade(self.model, {self.model}):
+            model_admin = self.admin_site._registry.get(model)
+            if (model_admin is not None
+                    and not model_admin.has_delete_permission(request)):
+                perms_needed.add(model._meta.verbose_name)
+        return ([str(obj) for obj in objs],
+                {self.opts.verbose_name_plural: len(objs)}, perms_needed, [])
+
+    def delete_model(self, request, obj):
+        self.hide(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.hide(obj)
+
+
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'color', 'slug')
+    search_fields = ('name', 'slug')
 
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
-    list_filter = ('name',)
+    search_fields = ('^name',)
+    list_filter = ('measurement_unit',)
+    show_full_result_count = False
 
 
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     extra = 1
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('recipe',
+                                                            'ingredient')
 
 
 class RecipeTagInline(admin.TabularInline):
     model = Recipe.tags.through
     extra = 1
+    autocomplete_fields = ('tag',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('recipe', 'tag')
+
+
+class CookingTimeFilter(admin.SimpleListFilter):
+    title = 'cooking time'
+    parameter_name = 'cooking_time'
+    RANGES = {
+        'quick': (None, 15),
+        'medium': (16, 60),
+        'long': (61, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return (
+            ('quick', 'Up to 15 minutes'),
+            ('medium', '16 to 60 minutes'),
+            ('long', 'Over an hour'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.RANGES:
+            return queryset
+        low, high = self.RANGES[self.value()]
+        if low is not None:
+            queryset = queryset.filter(cooking_time__gte=low)
+        if high is not None:
+            queryset = queryset.filter(cooking_time__lte=high)
+        return queryset
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'favorite_count')
-    search_fields = ('name', 'author__username')
-    list_filter = ('author', 'name', 'tags')
+class RecipeAdmin(BackgroundDeleteMixin, admin.ModelAdmin):
+    list_display = ('name', 'author', 'pub_date', 'favorite_count')
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__username', 'author__email')
+    list_filter = ('tags', 'pub_date', 'is_hidden', CookingTimeFilter)
+    autocomplete_fields = ('author',)
+    show_full_result_count = False
     inlines = [RecipeIngredientInline, RecipeTagInline]
 
+    def get_queryset(self, request):
+        # A correlated subquery is only evaluated for the rows on the
+        # page, unlike a join with GROUP BY over the whole table.
+        favorites = (
+            FavoriteRecipe.objects.filter(recipe=OuterRef('pk'))
+            .order_by().values('recipe').annotate(count=Count('*'))
+            .values('count')
+        )
+        return super().get_queryset(request).annotate(
+            favorite_count=Coalesce(Subquery(favorites), 0))
+
+    @admin.display(ordering='favorite_count')
     def favorite_count(self, obj):
-        return FavoriteRecipe.objects.filter(recipe=obj).count()
+        return obj.favorite_count
 
     def changeform_view(self, request, object_id=None, form_url='',
                         extra_context=None):
@@ -68,8 +163,17 @@ class RecipeAdmin(admin.ModelAdmin):
 @admin.register(RecipeIngredient)
 class RecipeIngredientAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
+    search_fields = ('recipe__name', '^ingredient__name')
+    autocomplete_fields = ('recipe', 'ingredient')
+    show_full_result_count = False
 
 
 @admin.register(RecipeTag)
 class RecipeTagAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'tag')
+    list_select_related = ('recipe', 'tag')
+    list_filter = ('tag',)
+    search_fields = ('recipe__name',)
+    autocomplete_fields = ('recipe', 'tag')
+    show_full_result_count = False
@@ -0,0 +1,132 @@
+"""Incremental maintenance of the ``ShoppingCartItem`` totals.
+
+Every cart entry contributes its recipe's ingredient vector to the owner's
+totals. Additions are upserts, removals are clamped decrements followed by
+a cleanup of empty rows, so each change costs a couple of statements no
+matter how large the cart is.
+"""
+from django.db import connections, router, transaction
+from django.db.models import Sum
+
+from .models import RecipeIngredient, ShoppingCartItem, ShoppingList
+
+ITEMS = ShoppingCartItem._meta.db_table
+RECIPE_INGREDIENTS = RecipeIngredient._meta.db_table
+CART = ShoppingList._meta.db_table
+
+UPSERT = (
+    f'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+    f'SET amount = {ITEMS}.amount + excluded.amount'
+)
+
+
+def _execute(*statements):
+    db = router.db_for_write(ShoppingCartItem)
+    with transaction.atomic(using=db), connections[db].cursor() as cursor:
+        for sql, params in statements:
+            cursor.execute(sql, params)
+
+
+def add_recipe(user_id, recipe_id):
+    """Add the recipe's ingredients to the user's totals."""
+    _execute((
+        f'INSERT INTO {ITEMS} (user_id, ingredient_id, amount) '
+        f'SELECT %s, ingredient_id, amount FROM {RECIPE_INGREDIENTS} '
+        f'WHERE recipe_id = %s {UPSERT}',
+        [user_id, recipe_id]
+    ))
+
+
+def remove_recipe(user_id, recipe_id):
+    """Subtract the recipe's ingredients from the user's totals."""
+    _execute(
+        (f'UPDATE {ITEMS} SET amount = CASE '
+         f'WHEN {ITEMS}.amount > sub.amount '
+         f'THEN {ITEMS}.amount - sub.amount ELSE 0 END '
+         f'FROM (SELECT ingredient_id, amount FROM {RECIPE_INGREDIENTS} '
+         f'WHERE recipe_id = %s) AS sub '
+         f'WHERE {ITEMS}.user_id = %s '
+         f'AND {ITEMS}.ingredient_id = sub.ingredient_id',
+         [recipe_id, user_id]),
+        (f'DELETE FROM {ITEMS} WHERE user_id = %s AND amount = 0',
+         [user_id]),
+    )
+
+
+def change_ingredient(recipe_id, ingredient_id, delta):
+    """Apply an ingredient amount change to every cart holding the recipe."""
+    if delta > 0:
+        _execute((
+            f'INSERT INTO {ITEMS} (user_id, ingredient_id, amount) '
+            f'SELECT user_id, %s, %s FROM {CART} WHERE recipe_id = %s '
+            f'{UPSERT}',
+            [ingredient_id, delta, recipe_id]
+        ))
+    elif delta < 0:
+        holders = f'SELECT user_id FROM {CART} WHERE recipe_id = %s'
+        _execute(
+            (f'UPDATE {ITEMS} SET amount = CASE WHEN amount > %s '
+             f'THEN amount - %s ELSE 0 END '
+             f'WHERE ingredient_id = %s AND user_id IN ({holders})',
+             [-delta, -delta, ingredient_id, recipe_id]),
+            (f'DELETE FROM {ITEMS} WHERE ingredient_id = %s AND amount = 0 '
+             f'AND user_id IN ({holders})',
+             [ingredient_id, recipe_id]),
+        )
+
+
+def compute_totals(user_ids=None):
+    """Return ``{(user_id, ingredient_id): amount}`` computed from scratch."""
+    rows = RecipeIngredient.objects.filter(
+        recipe__shoppinglist__isnull=False
+    )
+    if user_ids is not None:
+        rows = rows.filter(recipe__shoppinglist__user_id__in=user_ids)
+    rows = rows.values_list(
+        'recipe__shoppinglist__user_id', 'ingredient_id'
+    ).annotate(total=Sum('amount')).order_by()
+    return {(user_id, ingredient_id): total
+            for user_id, ingredient_id, total in rows}
+
+
+def stored_totals(user_ids=None):
+    """Return ``{(user_id, ingredient_id): amount}`` from the aggregate."""
+    items = ShoppingCartItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    return {(user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in items.values_list('user_id', 'ingredient_id', 'amount')}
+
+
+def find_mismatches(user_ids=None):
+    """Yield ``(user_id, ingredient_id, expected, stored)`` differences."""
+    expected = compute_totals(user_ids)
+    stored = stored_totals(user_ids)
+    for key in sorted(expected.keys() | stored.keys()):
+        if expected.get(key, 0) != stored.get(key, 0):
+            yield (*key, expected.get(key, 0), stored.get(key, 0))
+
+
+def rebuild(user_ids=None):
+    """Recompute the aggregate from the cart and recipe ingredients."""
+    items = ShoppingCartItem.objects.all()
+    user_filter, params = '', []
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        items = items.filter(user_id__in=user_ids)
+        user_filter = 'AND cart.user_id IN ({})'.format(
+            ', '.join(['%s'] * len(user_ids)))
+        params = user_ids
+    with transaction.atomic(using=router.db_for_write(ShoppingCartItem)):
+        items.delete()
+        _execute((
+            f'INSERT INTO {ITEMS} (user_id, ingredient_id, amount) '
+            f'SELECT cart.user_id, ri.ingredient_id, SUM(ri.amount) '
+            f'FROM {CART} cart JOIN {RECIPE_INGREDIENTS} ri '
+            f'ON ri.recipe_id = cart.recipe_id WHERE 1 = 1 {user_filter} '
+            f'GROUP BY cart.user_id, ri.ingredient_id',
+            params
+        ))
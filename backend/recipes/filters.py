@@ -3,11 +3,41 @@ from django_filters import rest_framework as filters
 from .models import FavoriteRecipe, ShoppingList, Recipe, Ingredient
 
 
+class RecipeOrderingFilter(filters.OrderingFilter):
+    """Comma-separated sort keys; ties are broken by id.
+
+    ``popular`` lists the most popular recipes first, as it always did.
+    """
+
+    def get_ordering_value(self, param):
+        value = super().get_ordering_value(param)
+        if param.lstrip('-') == 'popular':
+            return value[1:] if value.startswith('-') else f'-{value}'
+        return value
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        ordering = [self.get_ordering_value(param) for param in value]
+        ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return qs.order_by(*ordering)
+
+
 class RecipeFilter(filters.FilterSet):
     is_favorited = filters.BooleanFilter(method='filter_by_relation')
     is_in_shopping_cart = filters.BooleanFilter(method='filter_by_relation')
     author = filters.NumberFilter(field_name='author__id')
     tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    cooking_time_min = filters.NumberFilter(field_name='cooking_time',
+                                            lookup_expr='gte')
+    cooking_time_max = filters.NumberFilter(field_name='cooking_time',
+                                            lookup_expr='lte')
+    ordering = RecipeOrderingFilter(fields=(
+        ('cooking_time', 'cooking_time'),
+        ('name', 'name'),
+        ('pub_date', 'pub_date'),
+        ('popularity', 'popular'),
+    ))
 
     class Meta:
         model = Recipe
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import cart
+
+
+class Command(BaseCommand):
+    help = ('Compare the stored shopping cart totals with totals computed '
+            'from scratch')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users', help='Only check these user ids')
+        parser.add_argument('--fix', action='store_true',
+                            help='Rebuild the totals of mismatching users')
+
+    def handle(self, *args, **kwargs):
+        mismatches = list(cart.find_mismatches(kwargs['users']))
+        for user_id, ingredient_id, expected, stored in mismatches:
+            self.stdout.write(
+                f'user {user_id}, ingredient {ingredient_id}: '
+                f'expected {expected}, stored {stored}')
+
+        if not mismatches:
+            self.stdout.write(
+                self.style.SUCCESS('Shopping cart totals are consistent'))
+            return
+
+        if kwargs['fix']:
+            cart.rebuild({user_id for user_id, *_ in mismatches})
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt totals for {len(mismatches)} mismatching rows'))
+            return
+        raise CommandError(f'{len(mismatches)} mismatching rows found')
@@ -0,0 +1,115 @@
+from itertools import combinations
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import RequestFactory
+
+from api.querysets import recipes_for, subscriptions_for
+from core import explain
+from recipes import cart
+from recipes.filters import RecipeFilter
+from recipes.models import Recipe, ShoppingCartItem, Tag
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN the SQL of the recipe list filters, subscriptions and '
+            'shopping cart; fail on sequential scans of large tables')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-rows', type=int, default=1000,
+                            help='Largest table that may be scanned '
+                                 'sequentially')
+        parser.add_argument('--user', type=int,
+                            help='User whose feed, subscriptions and cart '
+                                 'are explained (default: the first one)')
+
+    def recipe_list(self, user, params):
+        request = RequestFactory().get('/api/recipes/', params)
+        request.user = user
+        queryset = RecipeFilter(
+            request.GET, request=request,
+            queryset=recipes_for(user, Recipe.objects.order_by('-pub_date')),
+        ).qs
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+
+        def run():
+            # Unfiltered lists are counted from cache or estimated (see
+            # api.pagination); a full count would always scan the table.
+            if queryset.query.where:
+                queryset.count()
+            list(queryset[:page_size])
+        return run
+
+    def scenarios(self, user):
+        author = (Recipe.objects.values_list('author_id', flat=True)
+                  .annotate(recipes=Count('id')).order_by('-recipes')
+                  .first())
+        tag = Tag.objects.values_list('slug', flat=True).first()
+        filters = {'is_favorited': '1', 'is_in_shopping_cart': '1',
+                   'cooking_time_max': '30', 'ordering': 'popular'}
+        if author is not None:
+            filters['author'] = str(author)
+        if tag is not None:
+            filters['tags'] = tag
+        for size in range(len(filters) + 1):
+            for names in combinations(sorted(filters), size):
+                params = {name: filters[name] for name in names}
+                label = '&'.join(f'{name}={value}'
+                                 for name, value in params.items())
+                yield (f'recipes?{label}', self.recipe_list(user, params))
+        for ordering in ('cooking_time', '-cooking_time', 'name', 'pub_date'):
+            params = {'cooking_time_max': '30', 'ordering': ordering}
+            yield (f'recipes?cooking_time_max=30&ordering={ordering}',
+                   self.recipe_list(user, params))
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        yield ('subscriptions',
+               lambda: list(subscriptions_for(user)[:page_size]))
+        yield ('download_shopping_cart', lambda: list(
+            ShoppingCartItem.objects.filter(user=user)
+            .order_by('ingredient__name')
+            .values_list('ingredient__name', 'ingredient__measurement_unit',
+                         'amount')))
+        yield ('cart totals', lambda: cart.compute_totals([user.id]))
+
+    def handle(self, *args, **kwargs):
+        users = CustomUser.objects.order_by('id')
+        if kwargs['user'] is not None:
+            users = users.filter(id=kwargs['user'])
+        user = users.first()
+        if user is None:
+            raise CommandError('No user to explain the queries for')
+
+        failures = 0
+        for name, func in self.scenarios(user):
+            statements = dict.fromkeys(
+                (sql, tuple(params or ()))
+                for sql, params in explain.capture(func))
+            problems = []
+            for sql, params in statements:
+                try:
+                    scans = explain.seq_scans(sql, params)
+                except NotImplementedError as error:
+                    raise CommandError(error)
+                large = {table: rows for table, rows in scans.items()
+                         if rows > kwargs['max_rows']}
+                if large:
+                    problems.append((sql, large))
+                if kwargs['verbosity'] > 1:
+                    self.stdout.write(f'  {sql}')
+            if not problems:
+                self.stdout.write(f'{name}: {len(statements)} queries ok')
+                continue
+            failures += 1
+            for sql, large in problems:
+                tables = ', '.join(f'{table} ({rows} rows)'
+                                   for table, rows in sorted(large.items()))
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: sequential scan of {tables} in: {sql}'))
+
+        if failures:
+            raise CommandError(
+                f'{failures} hot queries scan large tables sequentially')
+        self.stdout.write(self.style.SUCCESS(
+            'Successfully explained the hot queries'))
@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import export_recipes
+
+
+class Command(BaseCommand):
+    help = 'Export recipes as NDJSON, one recipe per line'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-',
+                            help='File to write, - for standard output')
+        parser.add_argument('--inline-images', action='store_true',
+                            help='Embed images as base64 data URLs '
+                                 'instead of MEDIA_ROOT paths')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **kwargs):
+        output = kwargs['output']
+        try:
+            if output == '-':
+                count = export_recipes(sys.stdout, kwargs['inline_images'],
+                                       kwargs['batch_size'])
+            else:
+                with open(output, 'w', encoding='utf-8') as stream:
+                    count = export_recipes(stream, kwargs['inline_images'],
+                                           kwargs['batch_size'])
+        except OSError as e:
+            raise CommandError(f"An error occurred: {str(e)}")
+        self.stderr.write(
+            self.style.SUCCESS(f'Successfully exported {count} recipes'))
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import uploads
+from recipes import media
+
+
+class Command(BaseCommand):
+    help = ('Delete recipe image files that no recipe references and '
+            'expired chunked uploads')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Files checked per database query')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='List orphaned files without deleting them')
+
+    def handle(self, *args, **kwargs):
+        count = 0
+        for name in media.collect(kwargs['batch_size'], kwargs['dry_run']):
+            count += 1
+            if kwargs['verbosity'] > 1 or kwargs['dry_run']:
+                self.stdout.write(name)
+        action = 'found' if kwargs['dry_run'] else 'deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully {action} {count} orphaned image files'))
+        if kwargs['dry_run']:
+            return
+        before = timezone.now() - timedelta(
+            hours=settings.UPLOAD_EXPIRY_HOURS)
+        count = uploads.purge(before)
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully deleted {count} expired uploads'))
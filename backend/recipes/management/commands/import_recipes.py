@@ -0,0 +1,77 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.caching import RECIPES, table_tag
+from core import cache
+from recipes.models import ImportProgress, Recipe, RecipeIngredient, RecipeTag
+from recipes.transfer import Importer
+
+
+class Command(BaseCommand):
+    help = ('Import recipes from an NDJSON file written by export_recipes. '
+            'An interrupted import resumes after the last committed batch.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='NDJSON file to read')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Processes that decode and check images')
+        parser.add_argument('--checkpoint',
+                            help='Name the progress is stored under '
+                                 '(default: the absolute INPUT path)')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the stored progress and start over')
+
+    def report(self, importer, reported):
+        for number, error in importer.errors[reported:]:
+            self.stderr.write(f'line {number}: {error}')
+        return len(importer.errors)
+
+    def handle(self, *args, **kwargs):
+        source = (kwargs['checkpoint']
+                  or os.path.abspath(kwargs['input']))[-255:]
+        batch_size = kwargs['batch_size']
+        progress, _ = ImportProgress.objects.get_or_create(source=source)
+        if kwargs['restart'] and progress.line:
+            progress.line = 0
+            progress.save(update_fields=['line', 'updated_at'])
+        done = progress.line
+        if done:
+            self.stderr.write(f'Resuming after line {done}')
+
+        imported = 0
+        reported = 0
+        try:
+            with open(kwargs['input'], encoding='utf-8') as file, \
+                    ProcessPoolExecutor(kwargs['workers']) as pool:
+                importer = Importer(pool, str(settings.MEDIA_ROOT),
+                                    batch_size)
+                batch = []
+                for number, line in enumerate(file, 1):
+                    if number <= done or not line.strip():
+                        continue
+                    batch.append((number, line))
+                    if len(batch) == batch_size:
+                        imported += importer.import_batch(batch, progress)
+                        batch = []
+                        reported = self.report(importer, reported)
+                        self.stderr.write(f'{number} lines, '
+                                          f'{imported} recipes imported')
+                if batch:
+                    imported += importer.import_batch(batch, progress)
+                    reported = self.report(importer, reported)
+        except OSError as e:
+            raise CommandError(f"An error occurred: {str(e)}")
+        finally:
+            if imported:
+                cache.invalidate(RECIPES, *(
+                    table_tag(model._meta.db_table)
+                    for model in (Recipe, RecipeTag, RecipeIngredient)))
+
+        progress.delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully imported {imported} recipes, '
+            f'skipped {len(importer.errors)} lines'))
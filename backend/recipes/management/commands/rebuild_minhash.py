@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from recipes import similarity
+
+
+class Command(BaseCommand):
+    help = 'Recompute the MinHash signatures used for similar recipes'
+
+    def handle(self, *args, **kwargs):
+        count = similarity.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully rebuilt signatures for {count} recipes'))
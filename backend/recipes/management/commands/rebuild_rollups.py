@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.caching import STATS
+from core import cache
+from recipes import rollups
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the daily ingredient, tag and author favorite '
+            'rollups, e.g. to backfill them from existing recipes')
+
+    def handle(self, *args, **kwargs):
+        rollups.rebuild()
+        cache.invalidate(STATS)
+        self.stdout.write(
+            self.style.SUCCESS('Successfully rebuilt analytics rollups'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from recipes import cart
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user shopping cart ingredient totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users', help='Only rebuild these user ids')
+
+    def handle(self, *args, **kwargs):
+        cart.rebuild(kwargs['users'])
+        self.stdout.write(
+            self.style.SUCCESS('Successfully rebuilt shopping cart totals'))
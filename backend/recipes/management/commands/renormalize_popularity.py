@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from recipes import popularity
+
+
+class Command(BaseCommand):
+    help = 'Rescale recipe popularity scores to a fresh epoch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute the scores from favorites and '
+                                 'shopping carts instead of rescaling')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['rebuild']:
+            popularity.rebuild()
+            self.stdout.write(
+                self.style.SUCCESS('Successfully rebuilt popularity scores'))
+            return
+        popularity.renormalize()
+        self.stdout.write(
+            self.style.SUCCESS('Successfully renormalized popularity scores'))
@@ -0,0 +1,68 @@
+"""Reference counting of recipe image files.
+
+The number of recipes whose ``image`` equals a file name is that file's
+reference count, read through the index on ``Recipe.image``. Replacing or
+deleting a recipe image releases the old file once the change commits;
+``collect`` sweeps the media directory for files left over by anything
+that bypassed the signals (raw SQL, imports, crashes).
+
+Neither path deletes files modified within ``MEDIA_GC_GRACE`` seconds: a
+deduplicated save bumps the modification time of the existing file, and
+the recipe that references it is not visible until its transaction
+commits.
+"""
+import os
+
+from .models import Recipe
+from .storage import image_storage
+
+IMAGE_DIRECTORY = Recipe._meta.get_field('image').upload_to
+
+
+def orphans(names):
+    """Names from ``names`` that no recipe references."""
+    names = set(names)
+    return names - set(Recipe.objects.filter(
+        image__in=names).values_list('image', flat=True))
+
+
+def release(names):
+    """Delete files no recipe references any more."""
+    for name in orphans(name for name in names if name):
+        if not image_storage.is_recent(name):
+            image_storage.delete(name)
+
+
+def walk(directory):
+    """Stream file names under ``directory`` relative to the storage."""
+    try:
+        entries = os.scandir(image_storage.path(directory))
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            name = os.path.join(directory, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk(name)
+            elif entry.is_file(follow_symlinks=False):
+                yield name.replace(os.sep, '/')
+
+
+def collect(batch_size=1000, dry_run=False):
+    """Delete unreferenced image files; yields the deleted names."""
+    batch = []
+    for name in walk(IMAGE_DIRECTORY.rstrip('/')):
+        batch.append(name)
+        if len(batch) >= batch_size:
+            yield from _collect(batch, dry_run)
+            batch = []
+    yield from _collect(batch, dry_run)
+
+
+def _collect(names, dry_run):
+    for name in sorted(orphans(names)):
+        if image_storage.is_recent(name):
+            continue
+        if not dry_run:
+            image_storage.delete(name)
+        yield name
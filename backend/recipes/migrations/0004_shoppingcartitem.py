@@ -0,0 +1,123 @@
+# Generated by Django 4.2.5 on 2026-10-19 09:42
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db.models import Sum
+
+
+def fill_shopping_cart_items(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartItem = apps.get_model('recipes', 'ShoppingCartItem')
+    totals = (
+        RecipeIngredient.objects
+        .filter(recipe__shoppinglist__isnull=False)
+        .values_list('recipe__shoppinglist__user_id', 'ingredient_id')
+        .annotate(total=Sum('amount')).order_by()
+    )
+    ShoppingCartItem.objects.bulk_create(
+        [ShoppingCartItem(user_id=user_id, ingredient_id=ingredient_id,
+                          amount=total)
+         for user_id, ingredient_id, total in totals.iterator()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0003_alter_ingredient_options_alter_recipe_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='favoriterecipe',
+            options={'ordering': ['user_id']},
+        ),
+        migrations.AlterModelOptions(
+            name='ingredient',
+            options={'ordering': ['name']},
+        ),
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'ordering': ['-pub_date']},
+        ),
+        migrations.AlterModelOptions(
+            name='recipeingredient',
+            options={'ordering': ['recipe_id']},
+        ),
+        migrations.AlterModelOptions(
+            name='recipetag',
+            options={'ordering': ['recipe_id']},
+        ),
+        migrations.AlterModelOptions(
+            name='shoppinglist',
+            options={'ordering': ['user_id']},
+        ),
+        migrations.AlterModelOptions(
+            name='tag',
+            options={'ordering': ['name']},
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='pub_date',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Date of Publication'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='favoriterecipe',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.recipe'),
+        ),
+        migrations.AlterField(
+            model_name='favoriterecipe',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(blank=True, on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='cooking_time',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1, message='Cooking time cannot be less than 1 minute.'), django.core.validators.MaxValueValidator(1440, message='Cooking time cannot exceed 1440 minutes (24 hours).')]),
+        ),
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='amount',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1, message='Ingredient amount cannot be less than 1.'), django.core.validators.MaxValueValidator(10000, message='Ingredient amount cannot exceed 10,000.')]),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglist',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.recipe'),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglist',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.CreateModel(
+            name='ShoppingCartItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(default=0)),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_items', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user_id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_cart_item'),
+        ),
+        migrations.RunPython(fill_shopping_cart_items,
+                             migrations.RunPython.noop),
+    ]
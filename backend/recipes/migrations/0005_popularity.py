@@ -0,0 +1,57 @@
+# Generated by Django 4.2.5 on 2026-10-19 09:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def fill_popularity(apps, schema_editor):
+    PopularityEpoch = apps.get_model('recipes', 'PopularityEpoch')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    weights = settings.POPULARITY_WEIGHTS
+    PopularityEpoch.objects.create(started_at=django.utils.timezone.now())
+    recipes = Recipe.objects.annotate(
+        favorites=models.Count('favoriterecipe', distinct=True),
+        carts=models.Count('shoppinglist', distinct=True),
+    ).filter(models.Q(favorites__gt=0) | models.Q(carts__gt=0))
+    for recipe in recipes.iterator():
+        recipe.popularity = (weights['favoriterecipe'] * recipe.favorites
+                             + weights['shoppinglist'] * recipe.carts)
+        recipe.save(update_fields=['popularity'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_shoppingcartitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityEpoch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='favoriterecipe',
+            name='added_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='added_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity', '-id'], name='recipe_popularity_idx'),
+        ),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+    ]
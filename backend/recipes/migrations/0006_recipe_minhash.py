@@ -0,0 +1,37 @@
+# Generated by Django 4.2.5 on 2026-10-19 09:45
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+from recipes.similarity import pack, signature
+
+
+def fill_minhash(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ingredients = defaultdict(set)
+    rows = RecipeIngredient.objects.values_list('recipe_id', 'ingredient_id')
+    for recipe_id, ingredient_id in rows.iterator():
+        ingredients[recipe_id].add(ingredient_id)
+    Recipe.objects.bulk_update(
+        [Recipe(id=recipe_id, minhash=pack(signature(ids)))
+         for recipe_id, ids in ingredients.items()],
+        ['minhash'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='minhash',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(fill_minhash, migrations.RunPython.noop),
+    ]
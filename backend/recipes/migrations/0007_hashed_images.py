@@ -0,0 +1,19 @@
+# Generated by Django 4.2.5 on 2026-10-19 10:09
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_minhash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(db_index=True, storage=recipes.storage.HashedFileSystemStorage(), upload_to='recipes/'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.5 on 2026-10-19 10:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('uses', models.IntegerField(default=0)),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.tag')),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='IngredientUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('uses', models.IntegerField(default=0)),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.ingredient')),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AuthorFavorites',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('favorites', models.IntegerField(default=0)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'author favorites',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='tagusage',
+            constraint=models.UniqueConstraint(fields=('day', 'tag'), name='unique_tag_usage'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientusage',
+            constraint=models.UniqueConstraint(fields=('day', 'ingredient'), name='unique_ingredient_usage'),
+        ),
+        migrations.AddConstraint(
+            model_name='authorfavorites',
+            constraint=models.UniqueConstraint(fields=('day', 'author'), name='unique_author_favorites'),
+        ),
+    ]
@@ -1,7 +1,13 @@
-from django.db import models
+from django.db import connections, models, router, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
+from core.db import (
+    fetch_returning, instance_from_row, returning_columns, send_created,
+    send_deleted
+)
 from users.models import CustomUser
+from .storage import image_storage
 from .utils import validate_color
 
 
@@ -38,7 +44,8 @@ class Recipe(models.Model):
                                related_name='recipes', blank=True)
 
     name = models.CharField(max_length=100)
-    image = models.ImageField(upload_to='recipes/')
+    image = models.ImageField(upload_to='recipes/', storage=image_storage,
+                              db_index=True)
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name="Date of Publication")
     text = models.TextField()
@@ -53,20 +60,91 @@ class Recipe(models.Model):
         )
     ])
 
+    popularity = models.FloatField(default=0, editable=False)
+    minhash = models.BinaryField(null=True, editable=False)
+    # Deleted, waiting for ``recipes.purge`` to remove it.
+    is_hidden = models.BooleanField(default=False, editable=False)
+
     tags = models.ManyToManyField(Tag, through='RecipeTag')
     ingredients = models.ManyToManyField(Ingredient,
                                          through='RecipeIngredient')
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-popularity', '-id'],
+                         name='recipe_popularity_idx'),
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=['cooking_time', 'id'],
+                         name='recipe_cooking_time_idx'),
+            models.Index(fields=['author', 'cooking_time'],
+                         name='recipe_author_cooking_time_idx'),
+            models.Index(fields=['name', 'id'], name='recipe_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class UserRecipeRelationQuerySet(models.QuerySet):
+    """Idempotent single-statement toggles for user/recipe pairs.
+
+    Both methods take bare ids, so the recipe is never loaded, and report
+    whether the stored state actually changed. Raw SQL bypasses the model
+    signals, so ``post_save``/``post_delete`` are sent by hand for rows
+    that really were inserted or deleted.
+    """
+
+    def add(self, user_id, recipe_id):
+        db = router.db_for_write(self.model)
+        table = self.model._meta.db_table
+        recipe_table = Recipe._meta.db_table
+        user_table = CustomUser._meta.db_table
+        added_at = connections[db].ops.adapt_datetimefield_value(
+            timezone.now())
+        # Hidden recipes and recipes of hidden authors are being purged
+        # and count as missing.
+        sql = (
+            f'INSERT INTO {table} (user_id, recipe_id, added_at) '
+            f'SELECT %s, r.id, %s FROM {recipe_table} r '
+            f'JOIN {user_table} u ON u.id = r.author_id '
+            f'WHERE r.id = %s AND NOT r.is_hidden AND NOT u.is_hidden '
+            f'ON CONFLICT (user_id, recipe_id) DO NOTHING '
+            f'RETURNING {returning_columns(self.model)}'
+        )
+        with transaction.atomic(using=db):
+            row = fetch_returning(sql, [user_id, added_at, recipe_id], db)
+            if row is None:
+                if not Recipe.objects.using(db).filter(
+                        id=recipe_id, is_hidden=False,
+                        author__is_hidden=False).exists():
+                    raise Recipe.DoesNotExist
+                return False
+            send_created(instance_from_row(self.model, row, db), db)
+        return True
+
+    def remove(self, user_id, recipe_id):
+        db = router.db_for_write(self.model)
+        table = self.model._meta.db_table
+        sql = (f'DELETE FROM {table} WHERE user_id = %s AND recipe_id = %s '
+               f'RETURNING {returning_columns(self.model)}')
+        with transaction.atomic(using=db):
+            row = fetch_returning(sql, [user_id, recipe_id], db)
+            if row is None:
+                return False
+            send_deleted(instance_from_row(self.model, row, db), db)
+        return True
+
+
 class UserRecipeRelation(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    added_at = models.DateTimeField(default=timezone.now)
+
+    objects = UserRecipeRelationQuerySet.as_manager()
 
     class Meta:
         abstract = True
@@ -137,3 +215,110 @@ class RecipeTag(models.Model):
 
     def __str__(self):
         return f"{self.tag.name} for {self.recipe.name}"
+
+
+class ShoppingCartItem(models.Model):
+    """Per-user ingredient totals of all recipes in the shopping cart.
+
+    Maintained incrementally by ``recipes.cart``; rebuild it with the
+    ``rebuild_shopping_cart`` command.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE,
+                             related_name='shopping_cart_items')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   related_name='+')
+    amount = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['user_id']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='unique_shopping_cart_item')
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.amount} of {self.ingredient}"
+
+
+class PopularityEpoch(models.Model):
+    """Reference time of the stored ``Recipe.popularity`` scores.
+
+    A single row; see ``recipes.popularity``.
+    """
+    started_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Popularity epoch {self.started_at:%Y-%m-%d %H:%M}"
+
+
+class IngredientUsage(models.Model):
+    """Recipes published per day that use an ingredient.
+
+    This model and the two below are daily rollups kept up to date by
+    ``recipes.rollups``; rebuild them with the ``rebuild_rollups``
+    command.
+    """
+    day = models.DateField()
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   related_name='+')
+    uses = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'ingredient'],
+                                    name='unique_ingredient_usage')
+        ]
+
+    def __str__(self):
+        return f"{self.day}: {self.ingredient} in {self.uses} recipes"
+
+
+class TagUsage(models.Model):
+    """Recipes published per day with a tag."""
+    day = models.DateField()
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='+')
+    uses = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'tag'],
+                                    name='unique_tag_usage')
+        ]
+
+    def __str__(self):
+        return f"{self.day}: {self.tag} on {self.uses} recipes"
+
+
+class AuthorFavorites(models.Model):
+    """Favorites added per day to the recipes of an author."""
+    day = models.DateField()
+    author = models.ForeignKey(CustomUser, on_delete=models.CASCADE,
+                               related_name='+')
+    favorites = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        verbose_name_plural = 'author favorites'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'author'],
+                                    name='unique_author_favorites')
+        ]
+
+    def __str__(self):
+        return f"{self.day}: {self.favorites} favorites of {self.author}"
+
+
+class ImportProgress(models.Model):
+    """Last input line of an ``import_recipes`` run that was committed.
+
+    Saved in the transaction of each batch, so a resumed import neither
+    repeats nor skips a batch.
+    """
+    source = models.CharField(max_length=255, unique=True)
+    line = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source}: line {self.line}"
@@ -0,0 +1,86 @@
+"""Time-decayed recipe popularity kept in ``Recipe.popularity``.
+
+An event at time ``t`` is worth ``weight * 2 ** ((t - epoch) / half_life)``.
+Every stored score decays at the same rate, so instead of rewriting all
+rows as time passes, new events are simply worth more than old ones and
+ordering by the stored value equals ordering by the decayed score. The
+values grow over time; ``renormalize`` rescales them and moves the epoch
+forward so they stay in a comfortable floating point range.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from .models import FavoriteRecipe, PopularityEpoch, Recipe, ShoppingList
+
+RELATIONS = (FavoriteRecipe, ShoppingList)
+
+
+def get_epoch():
+    epoch = PopularityEpoch.objects.values_list('started_at',
+                                                flat=True).first()
+    if epoch is None:
+        epoch = PopularityEpoch.objects.create().started_at
+    return epoch
+
+
+def decay(since, until):
+    """Factor by which a score decays between two moments."""
+    return 2 ** -((until - since) / settings.POPULARITY_HALF_LIFE)
+
+
+def contribution(model, at, epoch):
+    weight = settings.POPULARITY_WEIGHTS[model._meta.model_name]
+    return weight / decay(epoch, at)
+
+
+def record(relation, sign=1):
+    """Add (or with ``sign=-1`` withdraw) a relation row's contribution."""
+    amount = contribution(type(relation), relation.added_at, get_epoch())
+    if sign > 0:
+        score = F('popularity') + amount
+    else:
+        score = Case(When(popularity__gt=amount,
+                          then=F('popularity') - amount), default=0.0)
+    Recipe.objects.filter(id=relation.recipe_id).update(popularity=score)
+
+
+def current_score(recipe, now=None):
+    """The decayed score of a recipe as of ``now``."""
+    return recipe.popularity * decay(get_epoch(), now or timezone.now())
+
+
+def renormalize(now=None):
+    """Rescale every score to a new epoch at ``now``."""
+    now = now or timezone.now()
+    with transaction.atomic(using=router.db_for_write(PopularityEpoch)):
+        epoch = PopularityEpoch.objects.select_for_update().first()
+        if epoch is None:
+            PopularityEpoch.objects.create(started_at=now)
+            return
+        Recipe.objects.filter(popularity__gt=0).update(
+            popularity=F('popularity') * decay(epoch.started_at, now))
+        epoch.started_at = now
+        epoch.save(update_fields=['started_at'])
+
+
+def rebuild(now=None, batch_size=1000):
+    """Recompute every score from the relation timestamps."""
+    now = now or timezone.now()
+    scores = defaultdict(float)
+    for model in RELATIONS:
+        rows = model.objects.values_list('recipe_id', 'added_at')
+        for recipe_id, added_at in rows.iterator(chunk_size=batch_size):
+            scores[recipe_id] += contribution(model, added_at, now)
+
+    with transaction.atomic(using=router.db_for_write(PopularityEpoch)):
+        PopularityEpoch.objects.select_for_update().delete()
+        PopularityEpoch.objects.create(started_at=now)
+        Recipe.objects.filter(popularity__gt=0).update(popularity=0)
+        recipes = [Recipe(id=recipe_id, popularity=score)
+                   for recipe_id, score in scores.items()]
+        Recipe.objects.bulk_update(recipes, ['popularity'],
+                                   batch_size=batch_size)
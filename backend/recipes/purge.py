@@ -0,0 +1,113 @@
+"""Deletion of users and recipes in the background.
+
+Deleting a user through the ORM collects all their recipes, ingredient
+rows, favorites, cart entries and subscriptions into memory and removes
+them in one long transaction. ``hide_user`` and ``hide_recipe`` instead
+only mark the object ``is_hidden``, which drops it from the API at once,
+and queue a job. The job deletes the dependent rows in batches of
+``PURGE_BATCH_SIZE``, each a ``DELETE ... WHERE id IN (...)`` in its own
+short transaction, and sends ``post_delete`` for every deleted row so the
+shopping cart totals, popularity, rollups and caches follow as they do
+for single deletes. The emptied recipes and the user are deleted through
+the ORM last; their receivers log the deletion for delta sync and release
+the image files.
+"""
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from core.db import instance_from_row, returning_columns, send_deleted
+from core.jobs import enqueue_on_commit, task
+from users.models import CustomUser, Subscription
+from .models import (
+    FavoriteRecipe, Recipe, RecipeIngredient, RecipeTag, ShoppingList
+)
+
+# Cart entries go first: the cart totals are subtracted per ingredient row.
+RECIPE_RELATIONS = (ShoppingList, FavoriteRecipe, RecipeTag,
+                    RecipeIngredient)
+# ``(model, column)`` rows that refer to a user, besides their recipes.
+USER_RELATIONS = ((ShoppingList, 'user_id'), (FavoriteRecipe, 'user_id'),
+                  (Subscription, 'user_id'), (Subscription, 'author_id'))
+
+
+def delete_rows(model, **lookups):
+    """Delete the matching rows in batches; return how many went."""
+    db = router.db_for_write(model)
+    table = model._meta.db_table
+    pk = model._meta.pk.column
+    deleted = 0
+    while True:
+        with transaction.atomic(using=db):
+            ids = list(model.objects.using(db).filter(**lookups)
+                       .order_by('pk').values_list('pk', flat=True)
+                       [:settings.PURGE_BATCH_SIZE])
+            if not ids:
+                return deleted
+            placeholders = ', '.join(['%s'] * len(ids))
+            with connections[db].cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE {pk} IN ({placeholders}) '
+                    f'RETURNING {returning_columns(model)}', ids)
+                rows = cursor.fetchall()
+            # Only rows this statement removed: a concurrent purge of the
+            # same object must not count them out twice.
+            for row in rows:
+                send_deleted(instance_from_row(model, row, db), db)
+        deleted += len(rows)
+
+
+def purge_recipes(recipe_ids):
+    """Delete recipes, their relation rows in batches first."""
+    for model in RECIPE_RELATIONS:
+        delete_rows(model, recipe_id__in=recipe_ids)
+    with transaction.atomic(using=router.db_for_write(Recipe)):
+        Recipe.objects.filter(id__in=recipe_ids).delete()
+
+
+@task
+def purge_recipe(recipe_id):
+    if Recipe.objects.filter(id=recipe_id, is_hidden=True).exists():
+        purge_recipes([recipe_id])
+
+
+@task
+def purge_user(user_id):
+    if not CustomUser.objects.filter(id=user_id, is_hidden=True).exists():
+        return
+    while True:
+        recipe_ids = list(
+            Recipe.objects.filter(author_id=user_id).order_by('id')
+            .values_list('id', flat=True)[:settings.PURGE_BATCH_SIZE]
+        )
+        if not recipe_ids:
+            break
+        purge_recipes(recipe_ids)
+    for model, column in USER_RELATIONS:
+        delete_rows(model, **{column: user_id})
+    with transaction.atomic(using=router.db_for_write(CustomUser)):
+        CustomUser.objects.filter(id=user_id).delete()
+
+
+def hide_recipe(recipe):
+    """Hide the recipe now and delete it in the background."""
+    recipe.is_hidden = True
+    recipe.save(update_fields=['is_hidden'])
+    enqueue_on_commit(purge_recipe, recipe_id=recipe.id)
+
+
+def hide_user(user):
+    """Hide and deactivate the user now, delete the account later."""
+    user.is_hidden = True
+    user.is_active = False
+    user.save(update_fields=['is_hidden', 'is_active'])
+    enqueue_on_commit(purge_user, user_id=user.id)
+
+
+def hide(obj):
+    """Hide a recipe or a user; see ``hide_recipe`` and ``hide_user``."""
+    if isinstance(obj, Recipe):
+        hide_recipe(obj)
+    elif isinstance(obj, CustomUser):
+        hide_user(obj)
+    else:
+        raise TypeError(f'{type(obj).__name__} cannot be hidden')
@@ -0,0 +1,135 @@
+"""Incremental maintenance of the daily analytics rollups.
+
+``IngredientUsage`` and ``TagUsage`` count recipes by the local day they
+were published, ``AuthorFavorites`` counts favorites by the day they were
+added. Each created or deleted ``RecipeIngredient``, ``RecipeTag`` or
+``FavoriteRecipe`` row adds one with an upsert or subtracts one from the
+existing row, dropping rows that reach zero, so the stats never have to
+scan the relation tables. Recipe days are computed in SQL from
+``pub_date``; children are deleted before their recipe, so the recipe row
+is still there when they are counted out.
+"""
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import (
+    AuthorFavorites, FavoriteRecipe, IngredientUsage, Recipe,
+    RecipeIngredient, RecipeTag, TagUsage
+)
+
+RECIPES = Recipe._meta.db_table
+FAVORITES = FavoriteRecipe._meta.db_table
+AUTHORS = AuthorFavorites._meta.db_table
+# ``{relation model: (rollup table, counted column)}``.
+USAGES = {
+    RecipeIngredient: (IngredientUsage._meta.db_table, 'ingredient_id'),
+    RecipeTag: (TagUsage._meta.db_table, 'tag_id'),
+}
+
+
+def _upsert(table, key, value):
+    return (f'ON CONFLICT (day, {key}) DO UPDATE '
+            f'SET {value} = {table}.{value} + excluded.{value}')
+
+
+def _local_date(connection, column):
+    tzname = timezone.get_current_timezone_name() if settings.USE_TZ else None
+    return connection.ops.datetime_cast_date_sql(column, (), tzname)
+
+
+def _execute(build):
+    """Run the statements ``build(connection)`` returns in one transaction."""
+    db = router.db_for_write(IngredientUsage)
+    connection = connections[db]
+    with transaction.atomic(using=db), connection.cursor() as cursor:
+        for sql, params in build(connection):
+            cursor.execute(sql, params)
+
+
+def record_uses(model, recipe_id, object_ids, sign=1):
+    """Count ingredients or tags (per ``model``) of a recipe in or out."""
+    table, key = USAGES[model]
+    object_ids = list(object_ids)
+    if not object_ids:
+        return
+
+    def build(connection):
+        day, params = _local_date(connection, 'pub_date')
+        if sign > 0:
+            for object_id in object_ids:
+                yield (f'INSERT INTO {table} (day, {key}, uses) '
+                       f'SELECT {day}, %s, 1 FROM {RECIPES} WHERE id = %s '
+                       f'{_upsert(table, key, "uses")}',
+                       [*params, object_id, recipe_id])
+            return
+        objects = '{} IN ({})'.format(key, ', '.join(['%s'] * len(object_ids)))
+        yield (f'UPDATE {table} SET uses = uses - 1 WHERE {objects} '
+               f'AND day = (SELECT {day} FROM {RECIPES} WHERE id = %s)',
+               [*object_ids, *params, recipe_id])
+        yield (f'DELETE FROM {table} WHERE uses <= 0 AND {objects}',
+               object_ids)
+
+    _execute(build)
+
+
+def record_favorite(favorite, sign=1):
+    """Count a favorite in or out of its recipe author's day."""
+    day = timezone.localdate(favorite.added_at)
+    author = f'author_id = (SELECT author_id FROM {RECIPES} WHERE id = %s)'
+
+    def build(connection):
+        if sign > 0:
+            yield (f'INSERT INTO {AUTHORS} (day, author_id, favorites) '
+                   f'SELECT %s, author_id, 1 FROM {RECIPES} WHERE id = %s '
+                   f'{_upsert(AUTHORS, "author_id", "favorites")}',
+                   [day, favorite.recipe_id])
+            return
+        yield (f'UPDATE {AUTHORS} SET favorites = favorites - 1 '
+               f'WHERE day = %s AND {author}', [day, favorite.recipe_id])
+        yield (f'DELETE FROM {AUTHORS} WHERE favorites <= 0 AND {author}',
+               [favorite.recipe_id])
+
+    _execute(build)
+
+
+def _usage_totals(connection, model, recipe_filter='', params=()):
+    table, key = USAGES[model]
+    day, day_params = _local_date(connection, 'r.pub_date')
+    return (f'INSERT INTO {table} (day, {key}, uses) '
+            f'SELECT {day}, rel.{key}, COUNT(*) '
+            f'FROM {model._meta.db_table} rel JOIN {RECIPES} r '
+            f'ON r.id = rel.recipe_id WHERE 1 = 1 {recipe_filter} '
+            f'GROUP BY 1, 2 {_upsert(table, key, "uses")}',
+            [*day_params, *params])
+
+
+def add_recipes(recipe_ids):
+    """Count in the tags and ingredients of bulk-created recipes."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    recipe_filter = 'AND r.id IN ({})'.format(
+        ', '.join(['%s'] * len(recipe_ids)))
+
+    def build(connection):
+        for model in USAGES:
+            yield _usage_totals(connection, model, recipe_filter, recipe_ids)
+
+    _execute(build)
+
+
+def rebuild():
+    """Recompute all rollups from the relation tables."""
+    def build(connection):
+        for model, (table, _) in USAGES.items():
+            yield f'DELETE FROM {table}', []
+            yield _usage_totals(connection, model)
+        day, params = _local_date(connection, 'f.added_at')
+        yield f'DELETE FROM {AUTHORS}', []
+        yield (f'INSERT INTO {AUTHORS} (day, author_id, favorites) '
+               f'SELECT {day}, r.author_id, COUNT(*) '
+               f'FROM {FAVORITES} f JOIN {RECIPES} r ON r.id = f.recipe_id '
+               f'GROUP BY 1, 2', params)
+
+    _execute(build)
@@ -0,0 +1,146 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save
+)
+from django.dispatch import receiver
+
+from . import cart, media, popularity, rollups, similarity
+from .models import (
+    FavoriteRecipe, Recipe, RecipeIngredient, RecipeTag, ShoppingList
+)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    recipe_id = instance.id
+    transaction.on_commit(lambda: similarity.discard(recipe_id))
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_image_changing(sender, instance, **kwargs):
+    instance._previous_image = None
+    if instance.pk is not None:
+        instance._previous_image = (
+            Recipe.objects.filter(pk=instance.pk)
+            .values_list('image', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_image', None)
+    if previous and previous != instance.image.name:
+        transaction.on_commit(lambda: media.release([previous]))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    name = instance.image.name
+    transaction.on_commit(lambda: media.release([name]))
+
+
+@receiver(post_save, sender=ShoppingList)
+def shopping_list_saved(sender, instance, created, **kwargs):
+    if created:
+        cart.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingList)
+def shopping_list_deleted(sender, instance, **kwargs):
+    cart.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingList)
+def relation_saved(sender, instance, created, **kwargs):
+    if created:
+        popularity.record(instance)
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=ShoppingList)
+def relation_deleted(sender, instance, **kwargs):
+    popularity.record(instance, sign=-1)
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_changing(sender, instance, **kwargs):
+    instance._previous = None
+    if instance.pk is not None:
+        instance._previous = (
+            RecipeIngredient.objects.filter(pk=instance.pk)
+            .values_list('ingredient_id', 'amount').first()
+        )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        ingredient_id, amount = previous
+        if ingredient_id == instance.ingredient_id:
+            cart.change_ingredient(instance.recipe_id, ingredient_id,
+                                   instance.amount - amount)
+            return
+        cart.change_ingredient(instance.recipe_id, ingredient_id, -amount)
+    cart.change_ingredient(instance.recipe_id, instance.ingredient_id,
+                           instance.amount)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    cart.change_ingredient(instance.recipe_id, instance.ingredient_id,
+                           -instance.amount)
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+def favorite_saved(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_favorite(instance)
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+def favorite_deleted(sender, instance, **kwargs):
+    rollups.record_favorite(instance, sign=-1)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_usage_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if created:
+        rollups.record_uses(sender, instance.recipe_id,
+                            [instance.ingredient_id])
+    elif previous is not None and previous[0] != instance.ingredient_id:
+        rollups.record_uses(sender, instance.recipe_id, [previous[0]],
+                            sign=-1)
+        rollups.record_uses(sender, instance.recipe_id,
+                            [instance.ingredient_id])
+
+
+@receiver(post_save, sender=RecipeTag)
+def recipe_tag_saved(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_uses(sender, instance.recipe_id, [instance.tag_id])
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeTag)
+def recipe_relation_deleted(sender, instance, **kwargs):
+    object_id = (instance.ingredient_id if sender is RecipeIngredient
+                 else instance.tag_id)
+    rollups.record_uses(sender, instance.recipe_id, [object_id], sign=-1)
+
+
+@receiver(m2m_changed, sender=RecipeIngredient)
+@receiver(m2m_changed, sender=RecipeTag)
+def recipe_relations_added(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    # ``add()`` and ``set()`` bulk-create the rows without ``post_save``;
+    # removals go through ``post_delete``.
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        for recipe_id in pk_set:
+            rollups.record_uses(sender, recipe_id, [instance.pk])
+    else:
+        rollups.record_uses(sender, instance.pk, pk_set)
@@ -0,0 +1,221 @@
+"""Similar recipes by Jaccard similarity of their ingredient sets.
+
+Each recipe stores a MinHash signature of its ingredient ids in
+``Recipe.minhash``. The probability that two signatures agree in a slot
+equals the Jaccard similarity of the sets, so the fraction of agreeing
+slots estimates it. Candidates come from an in-memory LSH index that
+buckets band slices of the signatures: only recipes sharing at least one
+band with the query are compared, instead of every recipe in the table.
+"""
+import random
+import struct
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import Recipe, RecipeIngredient
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(1105)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+                 for _ in range(NUM_PERM)]
+_FORMAT = struct.Struct(f'<{NUM_PERM}I')
+
+
+def signature(ingredient_ids):
+    """MinHash signature of a set of ingredient ids, ``None`` if empty."""
+    ingredient_ids = set(ingredient_ids)
+    if not ingredient_ids:
+        return None
+    return tuple(
+        min(((a * x + b) % _PRIME) & _MAX_HASH for x in ingredient_ids)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def pack(sig):
+    return None if sig is None else _FORMAT.pack(*sig)
+
+
+def unpack(data):
+    return None if data is None else _FORMAT.unpack(bytes(data))
+
+
+def estimate(sig, other):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(sig, other)) / NUM_PERM
+
+
+class LSHIndex:
+    """Band index over MinHash signatures."""
+
+    def __init__(self):
+        self.signatures = {}
+        self.buckets = defaultdict(set)
+
+    @staticmethod
+    def bands(sig):
+        return [(band, sig[band * ROWS:(band + 1) * ROWS])
+                for band in range(BANDS)]
+
+    def add(self, recipe_id, sig):
+        self.remove(recipe_id)
+        if sig is None:
+            return
+        self.signatures[recipe_id] = sig
+        for key in self.bands(sig):
+            self.buckets[key].add(recipe_id)
+
+    def remove(self, recipe_id):
+        sig = self.signatures.pop(recipe_id, None)
+        if sig is None:
+            return
+        for key in self.bands(sig):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.discard(recipe_id)
+                if not bucket:
+                    del self.buckets[key]
+
+    def query(self, sig, limit, exclude=None):
+        """Return up to ``limit`` ``(recipe_id, similarity)`` pairs."""
+        candidates = set()
+        for key in self.bands(sig):
+            candidates |= self.buckets.get(key, set())
+        candidates.discard(exclude)
+        scored = [(recipe_id, estimate(sig, self.signatures[recipe_id]))
+                  for recipe_id in candidates]
+        scored.sort(key=lambda item: (-item[1], -item[0]))
+        return scored[:limit]
+
+
+# ``_lock`` guards the globals below, ``_load_lock`` is held by the one
+# thread loading a new index.
+_lock = threading.Lock()
+_load_lock = threading.Lock()
+_index = None
+_loaded_at = 0.0
+# Changes applied while a reload runs, replayed onto the new index.
+_pending = None
+
+
+def load_index():
+    index = LSHIndex()
+    rows = Recipe.objects.filter(minhash__isnull=False).values_list(
+        'id', 'minhash')
+    for recipe_id, data in rows.iterator(chunk_size=2000):
+        index.add(recipe_id, unpack(data))
+    return index
+
+
+def _reload():
+    """Load a new index outside ``_lock`` and swap it in.
+
+    Called holding ``_load_lock``, which it releases.
+    """
+    global _index, _loaded_at, _pending
+    try:
+        with _lock:
+            _pending = []
+        index = load_index()
+        with _lock:
+            for recipe_id, sig in _pending:
+                index.add(recipe_id, sig)
+            _index, _loaded_at = index, time.monotonic()
+        return index
+    finally:
+        with _lock:
+            _pending = None
+        _load_lock.release()
+
+
+def _reload_in_background():
+    try:
+        _reload()
+    finally:
+        connections.close_all()
+
+
+def get_index():
+    """The process-wide index, reloaded after ``SIMILARITY_INDEX_TTL``.
+
+    Changes made by this process are applied in place; the periodic
+    reload picks up the ones made by other workers. It runs in a
+    background thread while requests keep using the previous index, so
+    only the very first load is waited for.
+    """
+    with _lock:
+        index, loaded_at = _index, _loaded_at
+    if index is None:
+        _load_lock.acquire()
+        with _lock:
+            index = _index
+        if index is not None:
+            # Loaded by another thread while this one waited.
+            _load_lock.release()
+            return index
+        return _reload()
+    if (time.monotonic() - loaded_at > settings.SIMILARITY_INDEX_TTL
+            and _load_lock.acquire(blocking=False)):
+        threading.Thread(target=_reload_in_background, daemon=True).start()
+    return index
+
+
+def _apply(recipe_id, sig):
+    with _lock:
+        if _index is not None:
+            _index.add(recipe_id, sig)
+        if _pending is not None:
+            _pending.append((recipe_id, sig))
+
+
+def discard(recipe_id):
+    _apply(recipe_id, None)
+
+
+def update_recipe(recipe_id):
+    """Recompute and store the recipe's signature from its ingredients."""
+    sig = signature(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', flat=True))
+    Recipe.objects.filter(id=recipe_id).update(minhash=pack(sig))
+    transaction.on_commit(lambda: _apply(recipe_id, sig))
+    return sig
+
+
+def rebuild(batch_size=1000):
+    """Recompute every stored signature and reset the in-memory index."""
+    global _index
+    ingredients = defaultdict(set)
+    rows = RecipeIngredient.objects.values_list('recipe_id', 'ingredient_id')
+    for recipe_id, ingredient_id in rows.iterator(chunk_size=batch_size):
+        ingredients[recipe_id].add(ingredient_id)
+
+    recipes = [Recipe(id=recipe_id, minhash=pack(signature(ids)))
+               for recipe_id, ids in ingredients.items()]
+    with transaction.atomic():
+        Recipe.objects.exclude(minhash=None).update(minhash=None)
+        Recipe.objects.bulk_update(recipes, ['minhash'],
+                                   batch_size=batch_size)
+    with _lock:
+        _index = None
+    return len(recipes)
+
+
+def similar(recipe_id, limit):
+    """Ids and similarities of the recipes closest to ``recipe_id``."""
+    index = get_index()
+    sig = index.signatures.get(recipe_id)
+    if sig is None:
+        sig = unpack(Recipe.objects.filter(id=recipe_id).values_list(
+            'minhash', flat=True).first())
+        if sig is None:
+            return []
+    return index.query(sig, limit, exclude=recipe_id)
@@ -0,0 +1,50 @@
+"""Content-addressed storage for recipe images.
+
+A file is stored under the SHA-256 of its content, so uploading the same
+photo twice keeps a single copy and a name never refers to different
+bytes, which lets browsers and CDNs cache image URLs forever.
+"""
+import hashlib
+import os
+import posixpath
+import time
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class HashedFileSystemStorage(FileSystemStorage):
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+    def is_recent(self, name):
+        """Whether the file was written or deduplicated lately."""
+        try:
+            modified = os.path.getmtime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return time.time() - modified < settings.MEDIA_GC_GRACE
+
+
+image_storage = HashedFileSystemStorage()
@@ -0,0 +1,9 @@
+"""Background tasks of the recipes app (see ``core.jobs``)."""
+from core.jobs import task
+
+from . import similarity
+
+
+@task
+def update_similarity(recipe_id):
+    similarity.update_recipe(recipe_id)
@@ -0,0 +1,138 @@
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes import purge
+from recipes.models import (
+    Ingredient, RecipeIngredient, ShoppingCartItem, ShoppingList, Tag
+)
+from users.models import CustomUser
+
+# A 1x1 PNG.
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAf'
+         'FcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==')
+
+
+@override_settings(DATABASE_REPLICAS=[], JOB_RUN_INLINE=False)
+class ShoppingCartTotalsTests(TestCase):
+    """The incremental totals against ``check_shopping_cart``."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.cook, self.reader = [
+            CustomUser.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='secret')
+            for name in ('cook', 'reader')
+        ]
+        self.tag = Tag.objects.create(name='soup', color='#FF0000',
+                                      slug='soup')
+        self.salt, self.flour, self.sugar = [
+            Ingredient.objects.create(name=name, measurement_unit='g')
+            for name in ('salt', 'flour', 'sugar')
+        ]
+        self.cook_client, self.reader_client = APIClient(), APIClient()
+        self.cook_client.force_authenticate(self.cook)
+        self.reader_client.force_authenticate(self.reader)
+
+    def recipe_data(self, name, *amounts):
+        return {
+            'name': name, 'image': IMAGE, 'text': 'Cook.',
+            'cooking_time': 10, 'tags': [self.tag.id],
+            'ingredients': [{'id': ingredient.id, 'amount': amount}
+                            for ingredient, amount in amounts],
+        }
+
+    def create_recipe(self, name, *amounts):
+        response = self.cook_client.post(
+            '/api/recipes/', self.recipe_data(name, *amounts), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def toggle(self, client, method, recipe_id):
+        response = getattr(client, method)(
+            f'/api/recipes/{recipe_id}/shopping_cart/')
+        self.assertIn(response.status_code, (200, 201))
+
+    def totals(self, user):
+        return {
+            ingredient: amount for ingredient, amount in
+            ShoppingCartItem.objects.filter(user=user)
+            .values_list('ingredient__name', 'amount')
+        }
+
+    def assertNoDrift(self):
+        out = StringIO()
+        call_command('check_shopping_cart', stdout=out)
+        self.assertIn('consistent', out.getvalue())
+
+    def test_totals_follow_recipe_and_cart_changes(self):
+        soup = self.create_recipe('Soup', (self.salt, 100), (self.flour, 50))
+        cake = self.create_recipe('Cake', (self.flour, 10), (self.sugar, 5))
+        self.toggle(self.reader_client, 'post', soup)
+        self.toggle(self.reader_client, 'post', cake)
+        self.toggle(self.cook_client, 'post', soup)
+        self.assertEqual(self.totals(self.reader),
+                         {'salt': 100, 'flour': 60, 'sugar': 5})
+        self.assertNoDrift()
+
+        # The update clears the ingredients and update_or_creates them.
+        response = self.cook_client.patch(
+            f'/api/recipes/{soup}/',
+            self.recipe_data('Soup', (self.flour, 20), (self.sugar, 30)),
+            format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.totals(self.reader),
+                         {'flour': 30, 'sugar': 35})
+        self.assertEqual(self.totals(self.cook),
+                         {'flour': 20, 'sugar': 30})
+        self.assertNoDrift()
+
+        # Repeated toggles change the totals once.
+        for method in ('delete', 'delete', 'post', 'post', 'delete'):
+            self.toggle(self.reader_client, method, cake)
+        self.assertEqual(self.totals(self.reader),
+                         {'flour': 20, 'sugar': 30})
+        self.assertNoDrift()
+
+        # Ingredient rows edited one by one.
+        row = RecipeIngredient.objects.get(recipe_id=soup,
+                                           ingredient=self.flour)
+        row.amount = 25
+        row.save()
+        row.ingredient = self.salt
+        row.save()
+        RecipeIngredient.objects.get(recipe_id=soup,
+                                     ingredient=self.sugar).delete()
+        self.assertEqual(self.totals(self.cook), {'salt': 25})
+        self.assertNoDrift()
+
+        self.toggle(self.reader_client, 'post', cake)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.cook_client.delete(f'/api/recipes/{soup}/')
+        self.assertEqual(response.status_code, 204)
+        purge.purge_recipe(recipe_id=soup)
+        self.assertEqual(self.totals(self.reader),
+                         {'flour': 10, 'sugar': 5})
+        self.assertEqual(self.totals(self.cook), {})
+        self.assertFalse(ShoppingList.objects.filter(recipe_id=soup)
+                         .exists())
+        self.assertNoDrift()
+
+    def test_drift_is_reported_and_fixed(self):
+        soup = self.create_recipe('Soup', (self.salt, 100))
+        self.toggle(self.reader_client, 'post', soup)
+        ShoppingCartItem.objects.filter(user=self.reader).update(amount=1)
+
+        with self.assertRaises(CommandError):
+            call_command('check_shopping_cart', stdout=StringIO())
+        call_command('check_shopping_cart', '--fix', stdout=StringIO())
+        self.assertEqual(self.totals(self.reader), {'salt': 100})
+        self.assertNoDrift()
@@ -0,0 +1,236 @@
+import re
+from functools import partial
+from unittest import mock
+
+from django.db import OperationalError, connection, transaction
+from django.db.models.signals import post_delete
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.models import Job
+from core.tests.utils import SignalLog, run_concurrently
+from recipes import cart, purge
+from recipes.models import (
+    AuthorFavorites, FavoriteRecipe, Ingredient, IngredientUsage, Recipe,
+    RecipeIngredient, RecipeTag, ShoppingCartItem, ShoppingList, Tag,
+    TagUsage
+)
+from users.models import CustomUser, Subscription
+
+BATCH_SIZE = 2
+BATCH_DELETE = re.compile(r'DELETE FROM (\w+) WHERE id IN \(([^)]*)\)')
+
+
+class PurgeFixture:
+    """Two cooks and a reader who favorite, cart and follow each other."""
+
+    def create_fixture(self):
+        self.cook, self.other, self.reader = [
+            CustomUser.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='secret')
+            for name in ('cook', 'other', 'reader')
+        ]
+        tags = [Tag.objects.create(name=name, color=color, slug=name)
+                for name, color in (('soup', '#FF0000'),
+                                    ('fast', '#00FF00'))]
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='g')
+            for name in ('salt', 'flour', 'sugar')
+        ]
+        self.recipes = [
+            Recipe.objects.create(
+                author=author, name=f'Dish {number}', text='Cook.',
+                image=f'recipes/{number}.png', cooking_time=10)
+            for number, author in enumerate(
+                (self.cook, self.cook, self.cook, self.other))
+        ]
+        for number, recipe in enumerate(self.recipes):
+            for ingredient in ingredients[number % 2:]:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient,
+                    amount=10 * (number + 1))
+            for tag in tags[:number % 2 + 1]:
+                RecipeTag.objects.create(recipe=recipe, tag=tag)
+        for user in (self.cook, self.other, self.reader):
+            for recipe in self.recipes:
+                FavoriteRecipe.objects.add(user.id, recipe.id)
+                ShoppingList.objects.add(user.id, recipe.id)
+        for user, author in ((self.reader, self.cook),
+                             (self.cook, self.other),
+                             (self.other, self.cook)):
+            Subscription.objects.subscribe(user.id, author.id)
+
+    def state(self):
+        """Everything the purge or a cascading delete has to keep right."""
+        return {
+            'cart': cart.stored_totals(),
+            'ingredient usage': set(IngredientUsage.objects.values_list(
+                'day', 'ingredient_id', 'uses')),
+            'tag usage': set(TagUsage.objects.values_list(
+                'day', 'tag_id', 'uses')),
+            'author favorites': set(AuthorFavorites.objects.values_list(
+                'day', 'author_id', 'favorites')),
+            'popularity': {
+                recipe_id: round(score, 9) for recipe_id, score
+                in Recipe.objects.values_list('id', 'popularity')},
+            'rows': {
+                model.__name__: set(model.objects.values_list('id',
+                                                              flat=True))
+                for model in (CustomUser, Recipe, RecipeIngredient,
+                              RecipeTag, FavoriteRecipe, ShoppingList,
+                              Subscription, ShoppingCartItem)},
+        }
+
+    def state_after_delete(self, obj):
+        """``state()`` after a plain ORM delete of ``obj``, rolled back."""
+        with transaction.atomic():
+            # A copy: delete() clears the primary key of the instance.
+            type(obj).objects.get(pk=obj.pk).delete()
+            state = self.state()
+            transaction.set_rollback(True)
+        return state
+
+    def assertConsistent(self):
+        self.assertEqual(list(cart.find_mismatches()), [])
+
+
+@override_settings(PURGE_BATCH_SIZE=BATCH_SIZE, JOB_RUN_INLINE=False,
+                   DATABASE_REPLICAS=[])
+class PurgeTests(PurgeFixture, TestCase):
+
+    def setUp(self):
+        self.create_fixture()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def hide(self, obj):
+        with self.captureOnCommitCallbacks(execute=True):
+            purge.hide(obj)
+
+    def queued(self, func):
+        return list(Job.objects.filter(task=func.task_name)
+                    .values_list('kwargs', flat=True))
+
+    def test_hide_recipe_hides_it_at_once(self):
+        recipe = self.recipes[0]
+        rows = self.state()['rows']
+        self.hide(recipe)
+
+        response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 404)
+        listed = [item['id'] for item in
+                  self.client.get('/api/recipes/').data['results']]
+        self.assertNotIn(recipe.id, listed)
+        self.assertEqual(self.queued(purge.purge_recipe),
+                         [{'recipe_id': recipe.id}])
+        # Nothing is deleted until the job runs.
+        self.assertEqual(self.state()['rows'], rows)
+
+    def test_hide_user_hides_them_at_once(self):
+        rows = self.state()['rows']
+        self.hide(self.cook)
+
+        response = self.client.get(f'/api/users/{self.cook.id}/')
+        self.assertEqual(response.status_code, 404)
+        authors = {item['author']['id'] for item in
+                   self.client.get('/api/recipes/').data['results']}
+        self.assertEqual(authors, {self.other.id})
+        self.cook.refresh_from_db()
+        self.assertFalse(self.cook.is_active)
+        self.assertEqual(self.queued(purge.purge_user),
+                         [{'user_id': self.cook.id}])
+        self.assertEqual(self.state()['rows'], rows)
+
+    def test_purge_recipe_matches_orm_delete(self):
+        recipe = self.recipes[0]
+        expected = self.state_after_delete(recipe)
+        self.hide(recipe)
+        purge.purge_recipe(recipe_id=recipe.id)
+        self.assertEqual(self.state(), expected)
+        self.assertConsistent()
+
+    def test_purge_user_matches_orm_delete(self):
+        expected = self.state_after_delete(self.cook)
+        self.hide(self.cook)
+        with CaptureQueriesContext(connection) as queries:
+            purge.purge_user(user_id=self.cook.id)
+        self.assertEqual(self.state(), expected)
+        self.assertConsistent()
+
+        batches = {}
+        for query in queries:
+            match = BATCH_DELETE.search(query['sql'])
+            if match:
+                table, ids = match.groups()
+                batches.setdefault(table, []).append(len(ids.split(',')))
+        for table, sizes in batches.items():
+            with self.subTest(table=table):
+                self.assertLessEqual(max(sizes), BATCH_SIZE)
+        # 3 cooks' recipes carted by 3 users, deleted 2 at a time.
+        self.assertEqual(batches[ShoppingList._meta.db_table],
+                         [2, 2, 2, 2, 1, 1])
+
+    def test_repeated_purge_changes_nothing(self):
+        expected = self.state_after_delete(self.cook)
+        self.hide(self.cook)
+        purge.purge_user(user_id=self.cook.id)
+        deleted = SignalLog(self, post_delete, ShoppingList)
+        purge.purge_user(user_id=self.cook.id)
+        for model in purge.RECIPE_RELATIONS:
+            purge.delete_rows(model, recipe__author_id=self.cook.id)
+        self.assertEqual(deleted.instances, [])
+        self.assertEqual(self.state(), expected)
+
+    def test_row_deleted_after_select_is_counted_out_once(self):
+        recipe = self.recipes[0]
+        expected = self.state_after_delete(recipe)
+        self.hide(recipe)
+        deleted = SignalLog(self, post_delete, ShoppingList)
+        selected = []
+
+        def select(ids):
+            ids = list(ids)
+            if not selected:
+                # Another purge removes a row between SELECT and DELETE.
+                entry = ShoppingList.objects.get(id=ids[0])
+                ShoppingList.objects.remove(entry.user_id, entry.recipe_id)
+            selected.extend(ids)
+            return ids
+
+        with mock.patch('recipes.purge.list', side_effect=select,
+                        create=True):
+            purge.purge_recipe(recipe_id=recipe.id)
+        entries = [entry.id for entry in deleted.instances]
+        self.assertIn(selected[0], entries)
+        self.assertEqual(len(entries), len(set(entries)))
+        self.assertEqual(self.state(), expected)
+        self.assertConsistent()
+
+    def test_purge_of_shown_object_does_nothing(self):
+        expected = self.state()
+        purge.purge_recipe(recipe_id=self.recipes[0].id)
+        purge.purge_user(user_id=self.cook.id)
+        self.assertEqual(self.state(), expected)
+
+
+@override_settings(PURGE_BATCH_SIZE=BATCH_SIZE, JOB_RUN_INLINE=False)
+class ConcurrentPurgeTests(PurgeFixture, TransactionTestCase):
+    """Workers running the same purge job at once."""
+
+    def setUp(self):
+        self.create_fixture()
+
+    def test_rows_are_counted_out_once(self):
+        expected = self.state_after_delete(self.cook)
+        purge.hide_user(self.cook)
+        results = run_concurrently(
+            *[partial(purge.purge_user, user_id=self.cook.id)] * 4)
+        for result in results:
+            # SQLite may refuse a writer; the job would be retried.
+            if result is not None:
+                self.assertIsInstance(result, OperationalError)
+        purge.purge_user(user_id=self.cook.id)
+        self.assertEqual(self.state(), expected)
+        self.assertConsistent()
@@ -0,0 +1,150 @@
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from recipes import purge, rollups
+from recipes.models import (
+    AuthorFavorites, FavoriteRecipe, Ingredient, IngredientUsage, Recipe,
+    RecipeIngredient, RecipeTag, Tag, TagUsage
+)
+from recipes.transfer import Importer
+from users.models import CustomUser
+
+# A 1x1 PNG.
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAf'
+         'FcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==')
+# Late in the UTC evening: already October 2 in Moscow.
+EVENING = datetime(2023, 10, 1, 23, 30, tzinfo=timezone.utc)
+MORNING = datetime(2023, 10, 3, 8, 0, tzinfo=timezone.utc)
+
+
+# Rollups count by local day, not by UTC day.
+@override_settings(JOB_RUN_INLINE=False, TIME_ZONE='Europe/Moscow')
+class IncrementalRollupsTests(TestCase):
+    """Every kind of change keeps the rollups equal to ``rebuild()``."""
+
+    def setUp(self):
+        self.cook, self.other = [
+            CustomUser.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='secret')
+            for name in ('cook', 'other')
+        ]
+        self.soup, self.fast, self.sweet = [
+            Tag.objects.create(name=name, color=color, slug=name)
+            for name, color in (('soup', '#FF0000'), ('fast', '#00FF00'),
+                                ('sweet', '#0000FF'))
+        ]
+        self.salt, self.flour, self.sugar = [
+            Ingredient.objects.create(name=name, measurement_unit='g')
+            for name in ('salt', 'flour', 'sugar')
+        ]
+
+    def recipe(self, author, pub_date):
+        recipe = Recipe.objects.create(
+            author=author, name='Dish', text='Cook.',
+            image='recipes/dish.png', cooking_time=10)
+        # auto_now_add ignores a pub_date passed to create().
+        Recipe.objects.filter(id=recipe.id).update(pub_date=pub_date)
+        return recipe
+
+    def rollups(self):
+        return {
+            'ingredients': set(IngredientUsage.objects.values_list(
+                'day', 'ingredient_id', 'uses')),
+            'tags': set(TagUsage.objects.values_list(
+                'day', 'tag_id', 'uses')),
+            'authors': set(AuthorFavorites.objects.values_list(
+                'day', 'author_id', 'favorites')),
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollups()
+        with transaction.atomic():
+            rollups.rebuild()
+            rebuilt = self.rollups()
+            transaction.set_rollback(True)
+        self.assertEqual(incremental, rebuilt)
+        return incremental
+
+    def test_model_changes(self):
+        first = self.recipe(self.cook, EVENING)
+        second = self.recipe(self.other, MORNING)
+        RecipeIngredient.objects.create(recipe=first, ingredient=self.salt,
+                                        amount=5)
+        RecipeIngredient.objects.create(recipe=second,
+                                        ingredient=self.salt, amount=5)
+        RecipeTag.objects.create(recipe=first, tag=self.soup)
+        FavoriteRecipe.objects.add(self.other.id, first.id)
+        FavoriteRecipe.objects.create(user=self.cook, recipe=second,
+                                      added_at=EVENING)
+        self.assertNotEqual(self.assertMatchesRebuild()['ingredients'],
+                            set())
+
+        row = RecipeIngredient.objects.get(recipe=first)
+        row.ingredient = self.flour
+        row.save()
+        FavoriteRecipe.objects.remove(self.other.id, first.id)
+        FavoriteRecipe.objects.add(self.other.id, first.id)
+        self.assertMatchesRebuild()
+
+        RecipeTag.objects.filter(recipe=first).delete()
+        FavoriteRecipe.objects.filter(user=self.cook).delete()
+        second.delete()
+        self.assertMatchesRebuild()
+
+    def test_many_to_many_changes(self):
+        recipe = self.recipe(self.cook, EVENING)
+        recipe.tags.add(self.soup, self.fast)
+        recipe.ingredients.add(self.salt, self.flour,
+                               through_defaults={'amount': 3})
+        self.sweet.recipe_set.add(recipe)
+        self.sugar.recipe_set.add(recipe, through_defaults={'amount': 1})
+        self.assertEqual(len(self.assertMatchesRebuild()['tags']), 3)
+
+        recipe.tags.remove(self.soup)
+        recipe.ingredients.remove(self.flour)
+        self.fast.recipe_set.remove(recipe)
+        self.assertMatchesRebuild()
+
+        recipe.tags.set([self.soup, self.sweet])
+        recipe.ingredients.clear()
+        self.assertMatchesRebuild()
+
+    def test_import_and_purge(self):
+        FavoriteRecipe.objects.add(self.other.id,
+                                   self.recipe(self.cook, MORNING).id)
+        records = [
+            {'name': f'Imported {number}', 'text': 'Cook.',
+             'cooking_time': 5, 'pub_date': pub_date.isoformat(),
+             'author': 'cook@example.com', 'tags': tags,
+             'ingredients': [{'name': 'salt', 'measurement_unit': 'g',
+                              'amount': 2},
+                             {'name': 'sugar', 'measurement_unit': 'g',
+                              'amount': 4}],
+             'image': IMAGE}
+            for number, (pub_date, tags) in enumerate(
+                ((EVENING, ['soup']), (MORNING, ['soup', 'sweet']),
+                 (EVENING, [])))
+        ]
+        lines = [(number, json.dumps(record))
+                 for number, record in enumerate(records, 1)]
+        with tempfile.TemporaryDirectory() as media, \
+                override_settings(MEDIA_ROOT=media), \
+                ThreadPoolExecutor(2) as pool:
+            importer = Importer(pool, media)
+            self.assertEqual(importer.import_batch(lines), 3)
+        self.assertEqual(importer.errors, [])
+        imported = self.assertMatchesRebuild()
+        self.assertIn((date(2023, 10, 2), self.soup.id, 1),
+                      imported['tags'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            purge.hide_user(self.cook)
+        purge.purge_user(user_id=self.cook.id)
+        self.assertEqual(self.assertMatchesRebuild(), {
+            'ingredients': set(), 'tags': set(), 'authors': set()})
@@ -0,0 +1,91 @@
+from functools import partial
+
+from django.db.models.signals import post_delete, post_save
+from django.test import TransactionTestCase
+
+from core.tests.utils import SignalLog, run_concurrently
+from recipes.models import FavoriteRecipe, Recipe, ShoppingList
+from users.models import CustomUser
+
+THREADS = 8
+# Only one of the racing calls finds something to change.
+ONE_CHANGE = [True] + [False] * (THREADS - 1)
+
+
+class ConcurrentTogglesTests(TransactionTestCase):
+    """``UserRecipeRelationQuerySet.add``/``remove`` racing each other."""
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user(
+            username='cook', email='cook@example.com', password='secret')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Soup', image='recipes/soup.png',
+            text='Boil.', cooking_time=10)
+
+    def users(self, count):
+        return [
+            CustomUser.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+                password='secret')
+            for number in range(count)
+        ]
+
+    def signals(self, model):
+        return (SignalLog(self, post_save, model),
+                SignalLog(self, post_delete, model))
+
+    def test_same_pair(self):
+        for model in (FavoriteRecipe, ShoppingList):
+            with self.subTest(model=model.__name__):
+                created, deleted = self.signals(model)
+                add = partial(model.objects.add, self.author.id,
+                              self.recipe.id)
+                remove = partial(model.objects.remove, self.author.id,
+                                 self.recipe.id)
+
+                results = run_concurrently(*[add] * THREADS)
+                self.assertCountEqual(results, ONE_CHANGE)
+                self.assertEqual(model.objects.count(), 1)
+                self.assertEqual(len(created.instances), 1)
+
+                results = run_concurrently(*[remove] * THREADS)
+                self.assertCountEqual(results, ONE_CHANGE)
+                self.assertEqual(model.objects.count(), 0)
+                self.assertEqual(len(deleted.instances), 1)
+
+    def test_many_users(self):
+        users = self.users(THREADS)
+        created, _ = self.signals(FavoriteRecipe)
+        results = run_concurrently(*[
+            partial(FavoriteRecipe.objects.add, user.id, self.recipe.id)
+            for user in users
+        ])
+        self.assertEqual(results, [True] * THREADS)
+        self.assertEqual(FavoriteRecipe.objects.count(), THREADS)
+        self.assertEqual(sorted(favorite.user_id for favorite
+                                in created.instances),
+                         [user.id for user in users])
+
+    def test_adds_and_removes_interleaved(self):
+        created, deleted = self.signals(ShoppingList)
+        add = partial(ShoppingList.objects.add, self.author.id,
+                      self.recipe.id)
+        remove = partial(ShoppingList.objects.remove, self.author.id,
+                         self.recipe.id)
+        results = run_concurrently(*[add, remove] * (THREADS // 2))
+        for result in results:
+            self.assertIsInstance(result, bool)
+        added = results[0::2].count(True)
+        removed = results[1::2].count(True)
+        self.assertEqual(len(created.instances), added)
+        self.assertEqual(len(deleted.instances), removed)
+        self.assertEqual(ShoppingList.objects.count(), added - removed)
+
+    def test_missing_recipe(self):
+        results = run_concurrently(*[
+            partial(FavoriteRecipe.objects.add, self.author.id,
+                    self.recipe.id + 1)
+        ] * 2)
+        for result in results:
+            self.assertIsInstance(result, Recipe.DoesNotExist)
+        self.assertEqual(FavoriteRecipe.objects.count(), 0)
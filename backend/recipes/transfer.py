@@ -0,0 +1,230 @@
+"""NDJSON export and import of recipes.
+
+One recipe per line, with its author, tags and ingredients by natural key
+so the file moves between databases::
+
+    {"name": "...", "text": "...", "cooking_time": 30,
+     "pub_date": "2023-10-01T12:00:00+00:00", "author": "cook@example.com",
+     "tags": ["breakfast"],
+     "ingredients": [{"name": "salt", "measurement_unit": "g",
+                      "amount": 5}],
+     "image": "recipes/abc.png"}
+
+``image`` is either a path under MEDIA_ROOT (the media directory is
+copied separately) or an inline ``data:image/...;base64,`` URL.
+"""
+import base64
+import json
+import mimetypes
+import os
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_datetime
+from PIL import Image
+
+from core import changelog
+from core.models import ChangeLog
+from users.models import CustomUser
+from . import rollups, similarity
+from .models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
+
+
+def inline_image(image):
+    content_type = mimetypes.guess_type(image.name)[0] or 'image/png'
+    with image.open('rb') as file:
+        data = base64.b64encode(file.read()).decode()
+    return f'data:{content_type};base64,{data}'
+
+
+def export_recipes(stream, inline_images=False, batch_size=500):
+    """Write every recipe to ``stream``; returns the number written."""
+    recipes = Recipe.objects.select_related('author').prefetch_related(
+        'tags',
+        Prefetch('recipe_ingredients',
+                 queryset=RecipeIngredient.objects.select_related(
+                     'ingredient')),
+    ).order_by('id')
+    count = 0
+    for recipe in recipes.iterator(chunk_size=batch_size):
+        record = {
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'pub_date': recipe.pub_date.isoformat(),
+            'author': recipe.author.email,
+            'tags': [tag.slug for tag in recipe.tags.all()],
+            'ingredients': [
+                {'name': item.ingredient.name,
+                 'measurement_unit': item.ingredient.measurement_unit,
+                 'amount': item.amount}
+                for item in recipe.recipe_ingredients.all()
+            ],
+            'image': (inline_image(recipe.image) if inline_images
+                      else recipe.image.name),
+        }
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def check_image(value, media_root):
+    """Decode and verify one image; runs in a worker process.
+
+    Returns ``(extension, content)`` for inline images, ``(None, None)``
+    for a valid file under ``media_root``, and raises ``ValueError`` for
+    anything that is not a readable image.
+    """
+    if not isinstance(value, str) or not value:
+        raise ValueError('image is required')
+    if value.startswith('data:image'):
+        header, _, data = value.partition(';base64,')
+        content = base64.b64decode(data, validate=True)
+        extension = header.split('/')[-1]
+    else:
+        path = os.path.join(media_root, value)
+        if not os.path.isfile(path):
+            raise ValueError(f'no image file {value}')
+        with open(path, 'rb') as file:
+            content = file.read()
+        extension = None
+    try:
+        Image.open(BytesIO(content)).verify()
+    except Exception as error:
+        raise ValueError(f'invalid image: {error}')
+    if extension is None:
+        return None, None
+    return extension, content
+
+
+def _check_image(args):
+    try:
+        return check_image(*args), None
+    except (ValueError, TypeError) as error:
+        return None, str(error)
+
+
+class Importer:
+    """Create recipes from NDJSON records in batches.
+
+    ``pool`` is an executor (a process pool for real imports) that checks
+    the images of a batch in parallel.
+    """
+
+    def __init__(self, pool, media_root, batch_size=500):
+        self.pool = pool
+        self.media_root = media_root
+        self.batch_size = batch_size
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+        }
+        self.errors = []
+
+    def build(self, record, authors):
+        author_id = authors.get(record.get('author'))
+        if author_id is None:
+            raise ValueError(f"unknown author {record.get('author')}")
+        tag_ids = []
+        for slug in record.get('tags', []):
+            if slug not in self.tags:
+                raise ValueError(f'unknown tag {slug}')
+            tag_ids.append(self.tags[slug])
+        amounts = {}
+        for item in record.get('ingredients', []):
+            key = (item.get('name'), item.get('measurement_unit'))
+            if key not in self.ingredients:
+                raise ValueError(f'unknown ingredient {key[0]}')
+            amounts[self.ingredients[key]] = item.get('amount')
+        if not amounts:
+            raise ValueError('a recipe needs at least one ingredient')
+        recipe = Recipe(
+            author_id=author_id,
+            name=record.get('name'),
+            text=record.get('text'),
+            cooking_time=record.get('cooking_time'),
+            minhash=similarity.pack(similarity.signature(amounts)),
+        )
+        try:
+            recipe.clean_fields(exclude=['author', 'image', 'pub_date'])
+            for ingredient_id, amount in amounts.items():
+                RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                                 amount=amount).clean_fields(
+                    exclude=['recipe', 'ingredient'])
+        except ValidationError as error:
+            raise ValueError('; '.join(error.messages))
+        return recipe, set(tag_ids), amounts
+
+    def import_batch(self, lines, progress=None):
+        """Import ``(line number, text)`` pairs; returns the count.
+
+        ``progress``, an ``ImportProgress``, is moved to the last line in
+        the same transaction as the recipes.
+        """
+        records = []
+        for number, line in lines:
+            try:
+                records.append((number, json.loads(line)))
+            except ValueError as error:
+                self.errors.append((number, f'invalid JSON: {error}'))
+        emails = {record.get('author') for _, record in records}
+        authors = dict(CustomUser.objects.filter(
+            email__in=emails).values_list('email', 'id'))
+        images = self.pool.map(
+            _check_image,
+            [(record.get('image'), self.media_root)
+             for _, record in records],
+            chunksize=max(1, len(records) // 32),
+        )
+
+        rows = []
+        for (number, record), (image, error) in zip(records, images):
+            try:
+                if error is not None:
+                    raise ValueError(error)
+                recipe, tag_ids, amounts = self.build(record, authors)
+            except ValueError as error:
+                self.errors.append((number, str(error)))
+                continue
+            extension, content = image
+            if content is not None:
+                recipe.image.save(f'{recipe.name}.{extension}',
+                                  ContentFile(content), save=False)
+            else:
+                recipe.image.name = record['image']
+            pub_date = parse_datetime(record.get('pub_date') or '')
+            rows.append((recipe, pub_date, tag_ids, amounts))
+
+        with transaction.atomic():
+            if progress is not None:
+                progress.line = lines[-1][0]
+                progress.save(update_fields=['line', 'updated_at'])
+            if not rows:
+                return 0
+            recipes = Recipe.objects.bulk_create(
+                [recipe for recipe, *_ in rows])
+            # auto_now_add overrides pub_date on insert.
+            dated = []
+            for recipe, pub_date, *_ in rows:
+                if pub_date is not None:
+                    recipe.pub_date = pub_date
+                    dated.append(recipe)
+            Recipe.objects.bulk_update(dated, ['pub_date'])
+            RecipeTag.objects.bulk_create([
+                RecipeTag(recipe=recipe, tag_id=tag_id)
+                for recipe, _, tag_ids, _ in rows for tag_id in tag_ids
+            ])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                                 amount=amount)
+                for recipe, _, _, amounts in rows
+                for ingredient_id, amount in amounts.items()
+            ])
+            rollups.add_recipes([recipe.id for recipe in recipes])
+            changelog.record(ChangeLog.RECIPE,
+                             [recipe.id for recipe in recipes])
+        return len(recipes)
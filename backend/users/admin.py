@@ -1,16 +1,21 @@
 from django.contrib import admin
 
+from recipes.admin import BackgroundDeleteMixin
 from .models import CustomUser, Subscription
 
 
 @admin.register(CustomUser)
-class CustomUserAdmin(admin.ModelAdmin):
-    list_display = ('email', 'username')
+class CustomUserAdmin(BackgroundDeleteMixin, admin.ModelAdmin):
+    list_display = ('email', 'username', 'is_active', 'is_staff')
     search_fields = ('email', 'username')
-    list_filter = ('email', 'username')
+    list_filter = ('is_active', 'is_staff', 'is_hidden', 'date_joined')
+    show_full_result_count = False
 
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
     search_fields = ('user__username', 'author__username')
+    autocomplete_fields = ('user', 'author')
+    show_full_result_count = False
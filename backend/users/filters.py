@@ -0,0 +1,24 @@
+from django.db.models import Q
+from django_filters import rest_framework as filters
+
+from .models import CustomUser
+
+
+class UserFilter(filters.FilterSet):
+    search = filters.CharFilter(method='filter_search')
+
+    SEARCH_FIELDS = ('username', 'first_name', 'last_name')
+
+    class Meta:
+        model = CustomUser
+        fields = []
+
+    def filter_search(self, queryset, name, value):
+        # Every word has to start one of the names; prefix lookups are
+        # served by the users_*_prefix_idx indexes on PostgreSQL.
+        for word in value.split():
+            condition = Q()
+            for field in self.SEARCH_FIELDS:
+                condition |= Q(**{f'{field}__istartswith': word})
+            queryset = queryset.filter(condition)
+        return queryset
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.5 on 2026-10-19 10:04
+
+from django.db import migrations
+
+SEARCH_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def create_search_indexes(apps, schema_editor):
+    # Prefix indexes matching the SQL of ``istartswith`` on PostgreSQL,
+    # UPPER(column::text) LIKE UPPER('term%'). Other databases search
+    # without them.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS users_{field}_prefix_idx '
+            f'ON users_customuser (UPPER({field}::text) text_pattern_ops)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            f'DROP INDEX IF EXISTS users_{field}_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_customuser_options_alter_subscription_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='customuser',
+            options={'ordering': ('username',)},
+        ),
+        migrations.AlterModelOptions(
+            name='subscription',
+            options={'ordering': ('user',)},
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-19 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='is_hidden',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
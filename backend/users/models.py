@@ -1,9 +1,16 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, router, transaction
+
+from core.db import (
+    fetch_returning, instance_from_row, returning_columns, send_created,
+    send_deleted
+)
 
 
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
+    # Deleted, waiting for ``recipes.purge`` to remove the account.
+    is_hidden = models.BooleanField(default=False, editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
@@ -12,12 +19,50 @@ class CustomUser(AbstractUser):
         ordering = ('username',)
 
 
+class SubscriptionQuerySet(models.QuerySet):
+    """Idempotent single-statement subscribe/unsubscribe by bare ids."""
+
+    def subscribe(self, user_id, author_id):
+        db = router.db_for_write(self.model)
+        table = self.model._meta.db_table
+        user_table = CustomUser._meta.db_table
+        sql = (
+            f'INSERT INTO {table} (user_id, author_id) '
+            f'SELECT %s, id FROM {user_table} WHERE id = %s '
+            f'ON CONFLICT (user_id, author_id) DO NOTHING '
+            f'RETURNING {returning_columns(self.model)}'
+        )
+        with transaction.atomic(using=db):
+            row = fetch_returning(sql, [user_id, author_id], db)
+            if row is None:
+                if not CustomUser.objects.using(db).filter(
+                        id=author_id).exists():
+                    raise CustomUser.DoesNotExist
+                return False
+            send_created(instance_from_row(self.model, row, db), db)
+        return True
+
+    def unsubscribe(self, user_id, author_id):
+        db = router.db_for_write(self.model)
+        table = self.model._meta.db_table
+        sql = (f'DELETE FROM {table} WHERE user_id = %s AND author_id = %s '
+               f'RETURNING {returning_columns(self.model)}')
+        with transaction.atomic(using=db):
+            row = fetch_returning(sql, [user_id, author_id], db)
+            if row is None:
+                return False
+            send_deleted(instance_from_row(self.model, row, db), db)
+        return True
+
+
 class Subscription(models.Model):
     user = models.ForeignKey(CustomUser, related_name='following',
                              on_delete=models.CASCADE)
     author = models.ForeignKey(CustomUser, related_name='followers',
                                on_delete=models.CASCADE)
 
+    objects = SubscriptionQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['user', 'author'],
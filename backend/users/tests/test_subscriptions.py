@@ -0,0 +1,52 @@
+from functools import partial
+
+from django.db.models.signals import post_delete, post_save
+from django.test import TransactionTestCase
+
+from core.tests.utils import SignalLog, run_concurrently
+from users.models import CustomUser, Subscription
+
+THREADS = 8
+# Only one of the racing calls finds something to change.
+ONE_CHANGE = [True] + [False] * (THREADS - 1)
+
+
+class ConcurrentSubscriptionsTests(TransactionTestCase):
+    """``SubscriptionQuerySet.subscribe``/``unsubscribe`` racing."""
+
+    def setUp(self):
+        self.user, self.author = [
+            CustomUser.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='secret')
+            for name in ('reader', 'cook')
+        ]
+        self.created = SignalLog(self, post_save, Subscription)
+        self.deleted = SignalLog(self, post_delete, Subscription)
+        self.subscribe = partial(Subscription.objects.subscribe,
+                                 self.user.id, self.author.id)
+        self.unsubscribe = partial(Subscription.objects.unsubscribe,
+                                   self.user.id, self.author.id)
+
+    def test_subscribe_then_unsubscribe(self):
+        results = run_concurrently(*[self.subscribe] * THREADS)
+        self.assertCountEqual(results, ONE_CHANGE)
+        self.assertEqual(Subscription.objects.count(), 1)
+        self.assertEqual(len(self.created.instances), 1)
+
+        results = run_concurrently(*[self.unsubscribe] * THREADS)
+        self.assertCountEqual(results, ONE_CHANGE)
+        self.assertEqual(Subscription.objects.count(), 0)
+        self.assertEqual(len(self.deleted.instances), 1)
+
+    def test_interleaved(self):
+        results = run_concurrently(
+            *[self.subscribe, self.unsubscribe] * (THREADS // 2))
+        for result in results:
+            self.assertIsInstance(result, bool)
+        subscribed = results[0::2].count(True)
+        unsubscribed = results[1::2].count(True)
+        self.assertEqual(len(self.created.instances), subscribed)
+        self.assertEqual(len(self.deleted.instances), unsubscribed)
+        self.assertEqual(Subscription.objects.count(),
+                         subscribed - unsubscribed)
@@ -0,0 +1,94 @@
+"""Minimal HTTP load generator for comparing server profiles.
+
+Runs the same request mix with a fixed number of concurrent clients and
+prints throughput, latency percentiles and the response statuses, e.g.:
+
+    python loadtest.py http://localhost:8000 --token <auth_token> \
+        --clients 32 --requests 2000
+
+Only 2xx responses count as successes: a run against a server that
+answers 401 or 404 measures nothing useful, so the script exits with
+status 1 when any request failed. The list endpoints need ``--token``.
+"""
+import argparse
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?ordering=-popular',
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/ingredients/?name=%D1%81',
+    '/api/users/',
+)
+
+
+def fetch(base_url, path, token):
+    request = urllib.request.Request(base_url.rstrip('/') + path)
+    if token:
+        request.add_header('Authorization', f'Token {token}')
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        status = error.code
+    except OSError:
+        status = None
+    return status, time.perf_counter() - started
+
+
+def run(base_url, token, clients, paths):
+    with ThreadPoolExecutor(clients) as pool:
+        return list(pool.map(lambda path: fetch(base_url, path, token),
+                             paths))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base_url')
+    parser.add_argument('--token')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--warmup', type=int, default=100,
+                        help='requests sent, and not measured, first')
+    args = parser.parse_args()
+    if args.clients < 1 or args.requests < 2:
+        parser.error('need at least one client and two requests')
+
+    def mix(count):
+        return [PATHS[i % len(PATHS)] for i in range(count)]
+
+    run(args.base_url, args.token, args.clients, mix(args.warmup))
+    started = time.perf_counter()
+    results = run(args.base_url, args.token, args.clients,
+                  mix(args.requests))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    statuses = Counter(status for status, _ in results)
+    failed = sum(count for status, count in statuses.items()
+                 if status is None or not 200 <= status < 300)
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f'requests: {len(results)}, failed: {failed}, '
+          f'throughput: {len(results) / elapsed:.1f} req/s')
+    print(f'latency p50: {quantiles[49] * 1000:.1f} ms, '
+          f'p95: {quantiles[94] * 1000:.1f} ms, '
+          f'p99: {quantiles[98] * 1000:.1f} ms')
+    print('statuses: ' + ', '.join(
+        f'{status or "no response"}: {count}'
+        for status, count in sorted(statuses.items(),
+                                    key=lambda item: item[0] or 0)))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()